@@ -0,0 +1,228 @@
+"""
+Shared Google credential cache and pooled Storage client.
+
+The desktop tools used to read ``credentials.json`` from the working folder
+on every run and fall back to a browser sign-in when it was missing, and
+each upload built its own ``storage.Client`` (new TLS connections, new token
+exchange). ``CredentialCache`` keeps one authorized-user token file for all
+the tools (``~/.config/noaa_toolbox/google_token.json``, or the path in
+``NOAA_TOKEN_CACHE``), hands out the same in-memory credentials to every
+caller in a process, and refreshes the access token ``refresh_margin``
+seconds before it expires, saving the new token so the next run starts with
+it. An existing ``credentials.json`` is picked up once and copied into the
+cache.
+
+``shared_storage_client`` returns one ``storage.Client`` per process with a
+keep-alive connection pool, so batch jobs, watch-mode waves and repeated
+calls reuse warm connections and a valid token.
+
+The token endpoint comes from the token file (``token_uri``), so tests can
+point it at a local stub server instead of Google.
+
+Google libraries are imported on first use, so importing this module is
+cheap.
+
+The same file ships in jetstream/ and NODD_Desktop_Upload_Tool/. Each tool
+folder is downloaded and built (PyInstaller --onefile) on its own, with no
+shared package or path between them, so each needs its own copy. The copies
+must stay byte-identical; the "Check shared modules" workflow compares them.
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from datetime import timezone
+from typing import Dict, List, Optional
+
+SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
+TOKEN_CACHE_ENV = 'NOAA_TOKEN_CACHE'
+LEGACY_CREDENTIALS_FILE = 'credentials.json'
+CLIENT_SECRETS_FILE = 'client_secret.json'
+
+
+def default_token_path() -> str:
+    return os.environ.get(TOKEN_CACHE_ENV) or os.path.join(
+        os.path.expanduser('~'), '.config', 'noaa_toolbox', 'google_token.json')
+
+
+class CredentialCache:
+    """
+    Authorized-user credentials shared by every caller in the process.
+
+    Args:
+        path: Token file (default: ``default_token_path()``)
+        scopes: OAuth scopes requested at sign-in
+        refresh_margin: Refresh tokens expiring within this many seconds
+        legacy_path: Older per-folder credentials file copied in if no cache exists
+        client_secrets: OAuth client file used by the browser sign-in
+    """
+
+    def __init__(self, path: Optional[str] = None, scopes: List[str] = None, refresh_margin: float = 300,
+                 legacy_path: Optional[str] = LEGACY_CREDENTIALS_FILE, client_secrets: str = CLIENT_SECRETS_FILE):
+        self.path = path or default_token_path()
+        self.scopes = scopes or SCOPES
+        self.refresh_margin = refresh_margin
+        self.legacy_path = legacy_path
+        self.client_secrets = client_secrets
+        self.refreshes = 0
+        self._credentials = None
+        self._saved_token = None
+        self._lock = threading.RLock()
+
+    def _read(self, path: str):
+        from google.oauth2.credentials import Credentials
+        with open(path, 'r') as f:
+            info = json.load(f)
+        credentials = Credentials.from_authorized_user_info(info, self.scopes)
+        # from_authorized_user_info always uses Google's endpoint; keep the file's (e.g. a test stub)
+        if info.get('token_uri') and info['token_uri'] != credentials.token_uri:
+            credentials = credentials.with_token_uri(info['token_uri'])
+        return credentials
+
+    def load(self):
+        """Return cached credentials without any network call; None if there are none yet."""
+        with self._lock:
+            if self._credentials is not None:
+                return self._credentials
+            for path in (self.path, self.legacy_path):
+                if path and os.path.exists(path):
+                    try:
+                        self._credentials = self._read(path)
+                    except (OSError, ValueError, KeyError) as e:
+                        logging.warning("Ignoring unreadable credentials in %s: %s", path, e)
+                        continue
+                    if path != self.path:
+                        logging.info("Copying credentials from %s into the shared cache %s", path, self.path)
+                        self.save()
+                    else:
+                        self._saved_token = self._credentials.token
+                    return self._credentials
+            return None
+
+    def save(self):
+        """Write the current credentials to the token file (owner-only, replaced atomically)."""
+        with self._lock:
+            if self._credentials is None:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(self._credentials.to_json())
+            os.replace(tmp_path, self.path)
+            self._saved_token = self._credentials.token
+
+    def save_if_refreshed(self):
+        """Persist a token the Google client refreshed on its own during the run."""
+        with self._lock:
+            if self._credentials is not None and self._credentials.token != self._saved_token:
+                try:
+                    self.save()
+                except OSError as e:
+                    logging.warning("Could not save refreshed credentials to %s: %s", self.path, e)
+
+    def _expires_soon(self, credentials) -> bool:
+        if not credentials.token:
+            return True
+        if credentials.expiry is None:
+            return False
+        remaining = credentials.expiry.replace(tzinfo=timezone.utc).timestamp() - time.time()
+        return remaining < self.refresh_margin
+
+    def ensure_fresh(self):
+        """Refresh the access token if it expires within ``refresh_margin``; returns the credentials."""
+        with self._lock:
+            credentials = self._credentials
+            if credentials is None or not self._expires_soon(credentials):
+                return credentials
+            from google.auth.transport.requests import Request
+            credentials.refresh(Request())
+            self.refreshes += 1
+            self.save()
+            return credentials
+
+    def authenticate(self):
+        """Run the browser sign-in and cache the result."""
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        flow = InstalledAppFlow.from_client_secrets_file(self.client_secrets, scopes=self.scopes)
+        credentials = flow.run_local_server(port=0)
+        with self._lock:
+            self._credentials = credentials
+            self.save()
+        return credentials
+
+    def get(self, interactive: bool = False):
+        """
+        Fresh credentials from the cache.
+
+        With ``interactive``, a missing cache starts the browser sign-in;
+        otherwise None is returned so the caller can fall back to
+        Application Default Credentials.
+        """
+        with self._lock:
+            if self.load() is None:
+                if not interactive:
+                    return None
+                self.authenticate()
+            return self.ensure_fresh()
+
+
+_caches: Dict[str, CredentialCache] = {}
+_client = None
+_client_pool_size = 0
+_shared_lock = threading.RLock()
+
+
+def shared_cache(path: Optional[str] = None) -> CredentialCache:
+    """The process-wide ``CredentialCache`` for ``path`` (default token file if None)."""
+    path = path or default_token_path()
+    with _shared_lock:
+        if path not in _caches:
+            _caches[path] = CredentialCache(path)
+        return _caches[path]
+
+
+def mount_connection_pool(client, max_connections: int):
+    """Give ``client`` a keep-alive pool of ``max_connections`` HTTPS connections."""
+    import requests
+    # requests keeps 10 connections per host by default; size the pool to the
+    # worker count so every worker reuses a warm TLS connection
+    adapter = requests.adapters.HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+    client._http.mount('https://', adapter)
+
+
+def shared_storage_client(max_connections: int = 12, cache: Optional[CredentialCache] = None):
+    """
+    One ``storage.Client`` for the whole process, authorized from the token cache.
+
+    Falls back to Application Default Credentials (``gcloud auth
+    application-default login``) when the cache is empty. The connection
+    pool grows to the largest ``max_connections`` asked for.
+    """
+    global _client, _client_pool_size
+    from google.cloud import storage
+    with _shared_lock:
+        if _client is None:
+            cache = cache or shared_cache()
+            credentials = cache.get()
+            if credentials is not None:
+                # User credentials carry no project; bucket calls don't need one
+                _client = storage.Client(project=None, credentials=credentials)
+                atexit.register(cache.save_if_refreshed)
+            else:
+                _client = storage.Client()
+        if max_connections > _client_pool_size:
+            mount_connection_pool(_client, max_connections)
+            _client_pool_size = max_connections
+        return _client
+
+
+def reset_shared_client():
+    """Close the shared client's connections and forget it (e.g. after switching accounts)."""
+    global _client, _client_pool_size
+    with _shared_lock:
+        if _client is not None:
+            _client._http.close()
+        _client, _client_pool_size = None, 0
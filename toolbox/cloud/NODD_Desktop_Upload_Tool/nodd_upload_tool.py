@@ -4,41 +4,22 @@ from pathlib import Path
 # to get current date & time
 from datetime import datetime
 from gooey import Gooey, GooeyParser
-import google
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
+from credential_cache import shared_cache
 import logging
 import time
 #import matplotlib.pyplot as plt
 import re
-# Define the scopes that your application needs to access Google Cloud Storage
-SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
 
 def authenticate():
     """Authenticate with Google using the OAuth2 Web Application Flow"""
-    # Set up the OAuth2 flow
-    flow = InstalledAppFlow.from_client_secrets_file(
-        'client_secret.json',  # Path to your client secret file
-        scopes=SCOPES)
-
-    # Start the OAuth2 flow and redirect the user to the Google sign-in page
-    credentials = flow.run_local_server(port=0)
-
-    # Save the credentials to a file (or database) for future use
-    with open('credentials.json', 'w') as f:
-        f.write(credentials.to_json())
-
-    return credentials
+    # Signs in through the browser and saves the token in the cache shared with Jetstream
+    return shared_cache().authenticate()
 
 def get_credentials():
     """Load the stored credentials or authenticate if they do not exist"""
-    try:
-        # Try to load the credentials from the file
-        credentials = Credentials.from_authorized_user_file('credentials.json', SCOPES)
-    except FileNotFoundError:
-        # If the file does not exist, authenticate with Google
-        credentials = authenticate()
-    return credentials
+    # The shared cache also picks up an older credentials.json and refreshes
+    # the token ahead of expiry, so later runs skip the sign-in
+    return shared_cache().get(interactive=True)
 
 def log_and_print(message):
     """Logs the message and also prints it to the console."""
@@ -19,6 +19,12 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 shutdown_event = Event()
 
+# Largest page objects.list returns
+MAX_PAGE_SIZE = 1000
+
+# Only the object fields stored in the metadata table, plus what paging needs
+LIST_FIELDS = 'items(name,size,timeCreated,updated,md5Hash,mediaLink),prefixes,nextPageToken'
+
 def exponential_backoff_retry(func, max_retries=5, initial_delay=1, backoff_factor=2):
     retries = 0
     delay = initial_delay
@@ -32,10 +38,16 @@ def exponential_backoff_retry(func, max_retries=5, initial_delay=1, backoff_fact
             delay *= backoff_factor
     raise Exception(f"Failed after {max_retries} retries")
 
+# Rows written before the writer commits, and the longest they wait for a commit
+COMMIT_ROWS = 50000
+COMMIT_SECONDS = 5
+
 def init_db(db_path):
     if not os.path.exists(os.path.dirname(db_path)):
         os.makedirs(os.path.dirname(db_path))
     conn = sqlite3.connect(db_path, timeout=30)  # Increased timeout
+    # WAL is stored in the database file: the dashboard can read while db_writer commits
+    conn.execute('PRAGMA journal_mode=WAL')
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS metadata (
@@ -86,39 +98,22 @@ def list_folders_with_gsutil(bucket_name, prefix, db_path):
     conn.close()
     logging.info(f"Inserted {len(formatted_prefixes)} folders into the database.")
 
-def store_metadata(db_path, metadata_batch, retry_limit=5):
-    conn = None
-    retries = 0
-    while retries < retry_limit:
-        try:
-            conn = sqlite3.connect(db_path, timeout=30)  # Increased timeout
-            cursor = conn.cursor()
-            insert_query = '''INSERT INTO metadata (path, type, size, time_created, updated, md5Hash, mediaLink) 
-                              VALUES (?, ?, ?, ?, ?, ?, ?)'''
-            cursor.executemany(insert_query, metadata_batch)
-            conn.commit()
-            logging.info(f"Stored {len(metadata_batch)} metadata records in the database.")
-            break
-        except sqlite3.OperationalError as e:
-            if "database is locked" in str(e):
-                retries += 1
-                time.sleep(2)  # Wait before retrying
-            else:
-                raise
-        finally:
-            if conn:
-                conn.close()
-    if retries == retry_limit:
-        logging.error("Failed to write to database after %d attempts due to database lock.", retry_limit)
-        raise sqlite3.OperationalError("Database is locked after multiple retries")
-
-def update_progress(db_path, last_processed_folder):
-    conn = sqlite3.connect(db_path, timeout=30)  # Increased timeout
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM progress')
-    cursor.execute('INSERT INTO progress (last_processed_folder, timestamp) VALUES (?, ?)', (last_processed_folder, time.strftime('%Y-%m-%d %H:%M:%S')))
-    conn.commit()
-    conn.close()
+def connect_writer(db_path):
+    # The one connection db_writer writes through. NORMAL sync only fsyncs at WAL checkpoints
+    # (still safe after a crash in WAL mode); 64 MiB page cache.
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA cache_size=-65536')
+    return conn
+
+def store_metadata(conn, metadata_batch):
+    insert_query = '''INSERT INTO metadata (path, type, size, time_created, updated, md5Hash, mediaLink) 
+                      VALUES (?, ?, ?, ?, ?, ?, ?)'''
+    conn.executemany(insert_query, metadata_batch)
+
+def update_progress(conn, last_processed_folder):
+    conn.execute('DELETE FROM progress')
+    conn.execute('INSERT INTO progress (last_processed_folder, timestamp) VALUES (?, ?)', (last_processed_folder, time.strftime('%Y-%m-%d %H:%M:%S')))
 
 def get_last_processed_folder(db_path):
     conn = sqlite3.connect(db_path, timeout=30)  # Increased timeout
@@ -128,61 +123,105 @@ def get_last_processed_folder(db_path):
     conn.close()
     return row[0] if row else None
 
-def db_writer(db_path, q):
-    while True:
-        try:
-            batch = q.get(timeout=10)  # Timeout to periodically check for termination signal
-        except queue.Empty:
-            if shutdown_event.is_set():
+def db_writer(db_path, q, commit_rows=COMMIT_ROWS, commit_seconds=COMMIT_SECONDS):
+    # The only thread that writes to the database, through one connection. Metadata batches and
+    # finished folders arrive on q in order, so a folder is never marked processed before its records
+    # are committed. Commits happen every commit_rows rows or commit_seconds, whichever comes first.
+    conn = connect_writer(db_path)
+    pending = 0
+    last_commit = time.monotonic()
+
+    def commit():
+        nonlocal pending, last_commit
+        conn.commit()
+        logging.info(f"Committed {pending} metadata records.")
+        pending = 0
+        last_commit = time.monotonic()
+
+    try:
+        while True:
+            try:
+                message = q.get(timeout=1)  # Timeout to commit when idle and check for termination signal
+            except queue.Empty:
+                if pending:
+                    commit()
+                if shutdown_event.is_set():
+                    break
+                continue
+            if message is None:
                 break
-            continue
-        if batch is None:
-            break
-        logging.info(f"Processing batch of {len(batch)} metadata records.")
-        store_metadata(db_path, batch)
-        q.task_done()
+            kind, payload = message
+            if kind == 'metadata':
+                store_metadata(conn, payload)
+                pending += len(payload)
+            elif kind == 'folder_done':
+                update_folder_status(conn, payload, 1)
+                update_progress(conn, payload)
+                pending += 1
+            if pending >= commit_rows or time.monotonic() - last_commit >= commit_seconds:
+                commit()
+            q.task_done()
+    finally:
+        if pending:
+            commit()
+        conn.close()
     logging.info("db_writer thread exiting, no more batches to process.")
 
+def iso_timestamp(value):
+    # '2023-05-14T21:08:31.512Z' -> '2023-05-14T21:08:31.512000+00:00', the form datetime.isoformat() gives
+    if not value:
+        return None
+    seconds, _, fraction = value.rstrip('Z').partition('.')
+    micros = fraction[:6].ljust(6, '0')
+    if int(micros or 0):
+        return f"{seconds}.{micros}+00:00"
+    return f"{seconds}+00:00"
+
+def item_to_metadata(item):
+    name = item['name']
+    time_created = iso_timestamp(item.get('timeCreated'))
+    updated = iso_timestamp(item.get('updated'))
+    if name.endswith('/'):
+        return (name, 'folder', 0, time_created, updated, None, None)
+    folder_path = '/'.join(name.split('/')[:-1]) + '/'
+    size = int(item['size']) if 'size' in item else None
+    return (folder_path, 'file', size, time_created, updated, item.get('md5Hash'), item.get('mediaLink'))
+
 def gather_metadata_with_retry(bucket_name, folder, db_path, batch_size=11000, retry_limit=3, q=None):
     def fetch_blobs():
         client = storage.Client()
-        return client.list_blobs(bucket_name, prefix=folder, delimiter='/')
+        return client.list_blobs(bucket_name, prefix=folder, delimiter='/', page_size=MAX_PAGE_SIZE, fields=LIST_FIELDS)
     
     blobs = exponential_backoff_retry(fetch_blobs, max_retries=retry_limit)
 
+    # Rows are built from each page's JSON items; iterating the blobs would create a Blob object per item
+    items = (item for page in blobs.pages for item in page.raw_page.get('items', ()))
+
     metadata_batch = []
     logging.info("Fetching blobs for folder: %s", folder)
     count = 0
-    for blob in blobs:
+    for item in items:
         if shutdown_event.is_set():
             logging.info("Shutdown event set, exiting gather_metadata")
-            break
+            return
         
         count += 1
-        if blob.name.endswith('/'):
-            metadata_batch.append((blob.name, 'folder', 0, blob.time_created.isoformat() if blob.time_created else None, blob.updated.isoformat() if blob.updated else None, None, None))
-        else:
-            folder_path = '/'.join(blob.name.split('/')[:-1]) + '/'
-            metadata_batch.append((folder_path, 'file', blob.size, blob.time_created.isoformat() if blob.time_created else None, blob.updated.isoformat() if blob.updated else None, blob.md5_hash, blob.media_link))
+        metadata_batch.append(item_to_metadata(item))
 
         if len(metadata_batch) >= batch_size:
-            q.put(metadata_batch)
+            q.put(('metadata', metadata_batch))
             logging.info(f"Queued {len(metadata_batch)} metadata records for folder: {folder}")
             metadata_batch = []
 
     if metadata_batch:
-        q.put(metadata_batch)
+        q.put(('metadata', metadata_batch))
         logging.info(f"Queued {len(metadata_batch)} metadata records for folder: {folder}")
 
     logging.info("Completed fetching %d blobs for folder: %s", count, folder)
-    update_folder_status(db_path, folder, 1)
+    q.put(('folder_done', folder))
 
-def update_folder_status(db_path, folder, status):
-    conn = sqlite3.connect(db_path, timeout=30)
-    cursor = conn.cursor()
-    cursor.execute('UPDATE folders SET processed = ? WHERE folder_path = ?', (status, folder))
-    conn.commit()
-    conn.close()
+def update_folder_status(conn, folder, status):
+    conn.execute('UPDATE folders SET processed = ? WHERE folder_path = ?', (status, folder))
 
 def get_unprocessed_folders(db_path):
     conn = sqlite3.connect(db_path, timeout=30)
@@ -0,0 +1,80 @@
+"""
+Benchmark: folder_stats_v4 crawl throughput against worker count.
+
+Starts a local fake listing server (benchmarks/fake_listing_server.py) with
+a synthetic folder tree and per-request latency, then crawls it with
+folder_stats_v4 at each worker count in --workers into a fresh database.
+Each run checks that every object was stored once and reports objects/sec
+and the speed-up over one worker (one worker lists one prefix at a time,
+like v3). With --quota-rps the server answers 429 above that many requests
+per second, so throughput levels off at the quota instead of growing with
+workers.
+
+No request ever reaches Google.
+
+Usage:
+    python benchmarks/bench_crawl.py [--fanout 6] [--depth 3] [--files 40] [--latency 0.05] [--workers 1 4 16 32]
+"""
+import os
+import sys
+import shutil
+import sqlite3
+import argparse
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import folder_stats_v4  # noqa: E402
+from fake_listing_server import ServerProcess, make_tree  # noqa: E402
+
+BUCKET = 'bench-bucket'
+
+
+def crawl_once(server: ServerProcess, workers: int, work_dir: str, args) -> dict:
+    db_path = os.path.join(work_dir, f"crawl_{workers}.db")
+    server.reset_counters()
+    client = folder_stats_v4.make_client(workers, server.endpoint)
+    totals = folder_stats_v4.gather_metadata(client, BUCKET, '', db_path, workers=workers,
+                                             page_size=args.page_size, max_requests_per_sec=args.max_rps)
+    conn = sqlite3.connect(db_path)
+    totals['stored'] = conn.execute('SELECT COUNT(*) FROM objects').fetchone()[0]
+    conn.close()
+    totals['throttled'] = server.stats()['throttled']
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the concurrent folder_stats crawler')
+    parser.add_argument('--fanout', type=int, default=6, help='Sub-folders per folder')
+    parser.add_argument('--depth', type=int, default=3, help='Folder levels')
+    parser.add_argument('--files', type=int, default=40, help='Files per folder')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds per list request')
+    parser.add_argument('--quota-rps', type=float, default=0, help='Server answers 429 above this many requests/s (0 = no quota)')
+    parser.add_argument('--max-rps', type=float, default=0, help='Crawler request cap (folder_stats_v4 --max-rps)')
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16, 32])
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    objects = make_tree(BUCKET, args.fanout, args.depth, args.files)
+    server = ServerProcess(BUCKET, objects, latency=args.latency, quota_rps=args.quota_rps).start()
+    work_dir = tempfile.mkdtemp(prefix='folder_stats_bench_')
+    print(f"{len(objects)} objects, latency {args.latency * 1000:g} ms"
+          + (f", quota {args.quota_rps:g} requests/s" if args.quota_rps else ''))
+    try:
+        baseline = None
+        for workers in args.workers:
+            totals = crawl_once(server, workers, work_dir, args)
+            rate = totals['objects_per_sec']
+            baseline = baseline or rate
+            check = 'ok' if totals['objects'] == totals['stored'] == len(objects) and not totals['failed_prefixes'] else 'MISMATCH'
+            print(f"  {workers:>3} workers  {totals['seconds']:7.2f}s  {rate:9.1f} objects/s  x{rate / baseline:5.1f}  "
+                  f"{totals['requests']:5d} requests  {totals['throttled']:4d} throttled  stored {totals['stored']} {check}")
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: bytes and parse cost of a list page, full resources vs projected.
+
+Takes one recorded ``objects.list`` page and compares the two ways of
+turning it into metadata rows:
+
+    full        the page as list_blobs fetches it by default (every object
+                field), iterated as Blob objects, rows built from Blob
+                properties (v3, and v4 before field projection)
+    projected   the page with folder_stats_v4.LIST_FIELDS applied, rows
+                built straight from the JSON items (v4)
+
+For each it reports page size in bytes, bytes per object and rows/sec for
+JSON decoding plus row building (best of --repeat runs), which is the
+client CPU a crawler spends on every page.
+
+The page comes from --fixture, a page saved from the real API, e.g.:
+
+    curl -H "Authorization: Bearer $(gcloud auth print-access-token)" \\
+        "https://storage.googleapis.com/storage/v1/b/BUCKET/o?prefix=FOLDER/&delimiter=/&maxResults=1000" > page.json
+
+and the projected page is cut from it locally, keeping the same fields the
+API would return. Without --fixture, a 1000-object page is recorded from the
+local fake listing server (benchmarks/fake_listing_server.py).
+
+Usage:
+    python benchmarks/bench_list_payload.py [--fixture page.json] [--repeat 20]
+"""
+import os
+import sys
+import json
+import base64
+import time
+import argparse
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import folder_stats_v4  # noqa: E402
+from fake_listing_server import FakeListingServer, make_tree, parse_fields, project  # noqa: E402
+from google.cloud import storage  # noqa: E402
+
+BUCKET = 'bench-bucket'
+EPOCH = folder_stats_v4.EPOCH
+MILLISECOND = timedelta(milliseconds=1)
+
+
+def record_page() -> bytes:
+    server = FakeListingServer(BUCKET, make_tree(BUCKET, 1, 1, 0, flat_files=folder_stats_v4.MAX_PAGE_SIZE))
+    try:
+        return server.page_body(prefix='flat/', delimiter='/')
+    finally:
+        server.server_close()
+
+
+def projected_page(full: dict) -> bytes:
+    selected = parse_fields(folder_stats_v4.LIST_FIELDS)
+    page = {key: value for key, value in full.items() if key in selected}
+    if 'items' in page:
+        page['items'] = [project(item, selected['items']) for item in page['items']]
+    return json.dumps(page).encode()
+
+
+def rows_from_blobs(body: bytes, bucket: storage.Bucket) -> list:
+    rows = []
+    for item in json.loads(body).get('items', ()):
+        # What iterating a list_blobs page does for each item
+        blob = storage.Blob(item['name'], bucket=bucket)
+        blob._set_properties(item)
+        folder, name = folder_stats_v4.split_name(blob.name)
+        time_created = (blob.time_created - EPOCH) // MILLISECOND if blob.time_created else None
+        updated = (blob.updated - EPOCH) // MILLISECOND if blob.updated else None
+        rows.append((folder, name, blob.size, time_created, updated,
+                     base64.b64decode(blob.md5_hash) if blob.md5_hash else None, blob.generation))
+    return rows
+
+
+def rows_from_items(body: bytes) -> list:
+    return [folder_stats_v4.item_to_row(item) for item in json.loads(body).get('items', ())]
+
+
+def best_rate(parse, body: bytes, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = parse(body)
+        best = min(best, time.perf_counter() - start)
+    return len(rows) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark list page payload, full vs field-projected')
+    parser.add_argument('--fixture', help='objects.list page (JSON) saved from the real API')
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per parser; the best is reported')
+    args = parser.parse_args()
+
+    if args.fixture:
+        with open(args.fixture, 'rb') as f:
+            full_body = f.read()
+    else:
+        full_body = record_page()
+    full = json.loads(full_body)
+    objects = len(full.get('items', ()))
+    if not objects:
+        sys.exit('The page has no items')
+    projected_body = projected_page(full)
+    bucket = storage.Bucket(client=None, name=full['items'][0].get('bucket', BUCKET))
+
+    if rows_from_blobs(full_body, bucket) != rows_from_items(projected_body):
+        sys.exit('Rows differ between the full and the projected page')
+    print(f"{objects} objects per page ({args.fixture or 'recorded from the fake listing server'})")
+    results = [('full', len(full_body), best_rate(lambda b: rows_from_blobs(b, bucket), full_body, args.repeat)),
+               ('projected', len(projected_body), best_rate(rows_from_items, projected_body, args.repeat))]
+    for label, size, rate in results:
+        print(f"  {label:<10} {size / 1024:8.1f} KB/page  {size / objects:6.0f} bytes/object  "
+              f"{size * 1e6 / objects / 2 ** 30:6.2f} GB per million objects  {rate:9.0f} rows/s")
+    (_, full_size, full_rate), (_, projected_size, projected_rate) = results
+    print(f"  projected: x{full_size / projected_size:.1f} fewer bytes, x{projected_rate / full_rate:.1f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
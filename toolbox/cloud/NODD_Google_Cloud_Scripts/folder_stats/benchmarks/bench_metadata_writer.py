@@ -0,0 +1,154 @@
+"""
+Benchmark: metadata insert rate, connection per batch vs one WAL writer.
+
+Writes --rows metadata rows in pages of --page-rows into a fresh database
+two ways:
+
+    per-batch   v3's metadata table, a new connection per page, one commit
+                per page, default rollback journal and sync (v3's
+                store_metadata, and the 04 Metadata Tool before its single
+                writer)
+    writer      folder_stats_v4.MetadataWriter: the v4 schema, one
+                connection in WAL mode with synchronous=NORMAL, committing
+                every commit_rows rows or commit_seconds
+
+While each run writes, a reader thread repeats the per-folder stats query
+(what the dashboard runs), with a short busy timeout, and counts reads that
+failed with "database is locked". In rollback-journal mode each read also
+holds the writer off until it finishes; --no-reader measures writes alone.
+Reports rows/sec, commits, and reads completed vs locked.
+
+Usage:
+    python benchmarks/bench_metadata_writer.py [--rows 500000] [--page-rows 1000] [--no-reader] [--dir /path/on/target/disk]
+"""
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import folder_stats_v4  # noqa: E402
+
+V3_TABLE = '''CREATE TABLE metadata (id INTEGER PRIMARY KEY, path TEXT, type TEXT, size INTEGER, time_created TEXT,
+                                     updated TEXT, md5Hash TEXT, mediaLink TEXT)'''
+INSERT = '''INSERT INTO metadata (path, type, size, time_created, updated, md5Hash, mediaLink)
+            VALUES (?, ?, ?, ?, ?, ?, ?)'''
+
+
+def make_page(page: int, rows: int) -> list:
+    """One list page of object resources (the fields v4 requests plus mediaLink)."""
+    folder = f"survey/site_{page % 97:03d}/dive_{page:06d}/"
+    return [{'name': f"{folder}IMG_{i:08d}.JPG", 'size': str(1000 + i * 7919 % 500000),
+             'timeCreated': '2023-05-14T21:08:31.512Z', 'updated': '2023-05-14T21:08:31.512Z',
+             'md5Hash': 'oPUXNrYsrfnT6H7xsPzkgQ==', 'generation': str(1684098511512000 + i),
+             'mediaLink': f"https://storage.googleapis.com/download/storage/v1/b/bench/o/"
+                          f"{folder.replace('/', '%2F')}IMG_{i:08d}.JPG?generation={1684098511512000 + i}&alt=media"}
+            for i in range(rows)]
+
+
+def v3_row(item: dict) -> tuple:
+    created = folder_stats_v4.iso_from_ms(folder_stats_v4.epoch_ms(item['timeCreated']))
+    updated = folder_stats_v4.iso_from_ms(folder_stats_v4.epoch_ms(item['updated']))
+    return (folder_stats_v4.folder_of(item['name']), 'file', int(item['size']), created, updated,
+            item['md5Hash'], item['mediaLink'])
+
+
+def write_per_batch(db_path: str, pages: list):
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=DELETE')
+    conn.execute(V3_TABLE)
+    conn.close()
+    for page in pages:
+        rows = [v3_row(item) for item in page]
+        conn = sqlite3.connect(db_path)
+        conn.executemany(INSERT, rows)
+        conn.commit()
+        conn.close()
+    return len(pages)
+
+
+def write_with_writer(db_path: str, pages: list):
+    folder_stats_v4.init_db(db_path, 'bench')
+    writer = folder_stats_v4.MetadataWriter(db_path)
+    writer.start()
+    for page in pages:
+        writer.add_rows([folder_stats_v4.item_to_row(item) for item in page])
+    writer.close()
+    return writer.commits
+
+
+class Reader(threading.Thread):
+    """Runs the stats query over and over until stopped, counting lock errors."""
+
+    def __init__(self, db_path: str, query: str):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.query = query
+        self.reads = 0
+        self.locked = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            conn = sqlite3.connect(self.db_path, timeout=0.05)
+            try:
+                conn.execute(self.query).fetchall()
+                self.reads += 1
+            except sqlite3.OperationalError as e:
+                if 'locked' in str(e):
+                    self.locked += 1
+                elif 'no such table' not in str(e):  # not created yet
+                    raise
+            finally:
+                conn.close()
+            time.sleep(0.05)
+
+
+def run_once(label: str, write, pages: list, work_dir: str, stats_query: str, count_query: str, read: bool):
+    db_path = os.path.join(work_dir, f"{label}.db")
+    reader = Reader(db_path, stats_query)
+    if read:
+        reader.start()
+    start = time.perf_counter()
+    commits = write(db_path, pages)
+    elapsed = time.perf_counter() - start
+    reader.stopped.set()
+    if read:
+        reader.join()
+    rows = sum(len(page) for page in pages)
+    conn = sqlite3.connect(db_path)
+    stored = conn.execute(count_query).fetchone()[0]
+    conn.close()
+    check = 'ok' if stored == rows else f'MISMATCH ({stored} stored)'
+    print(f"  {label:<10} {elapsed:7.2f}s  {rows / elapsed:9.0f} rows/s  {commits:5d} commits  "
+          f"reads {reader.reads:4d} done {reader.locked:4d} locked  {check}")
+    return rows / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark metadata inserts: per-batch connections vs one WAL writer')
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--page-rows', type=int, default=1000, help='Rows handed over at a time (one list page)')
+    parser.add_argument('--no-reader', action='store_true', help='Write without the concurrent stats query')
+    parser.add_argument('--dir', default=None, help='Directory for the test databases (default: system temp)')
+    args = parser.parse_args()
+
+    pages = [make_page(p, args.page_rows) for p in range(max(1, args.rows // args.page_rows))]
+    work_dir = tempfile.mkdtemp(prefix='folder_stats_db_bench_', dir=args.dir)
+    print(f"{len(pages) * args.page_rows} rows in pages of {args.page_rows}, databases in {work_dir}")
+    try:
+        before = run_once('per-batch', write_per_batch, pages, work_dir,
+                          'SELECT path, SUM(size), COUNT(*) FROM metadata GROUP BY path', 'SELECT COUNT(*) FROM metadata', not args.no_reader)
+        after = run_once('writer', write_with_writer, pages, work_dir,
+                         'SELECT prefix_id, SUM(size), COUNT(*) FROM objects GROUP BY prefix_id', 'SELECT COUNT(*) FROM objects', not args.no_reader)
+        print(f"  writer: x{after / before:.1f} rows/s")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
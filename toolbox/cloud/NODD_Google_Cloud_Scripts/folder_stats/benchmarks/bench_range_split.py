@@ -0,0 +1,76 @@
+"""
+Benchmark: listing one huge flat folder serially vs in key ranges.
+
+Starts a local fake listing server (benchmarks/fake_listing_server.py)
+holding a single folder of --files objects with no sub-folders, which
+prefix-level parallelism can't help with, and crawls it with folder_stats_v4
+twice: with range splitting off (--split-parts 1, one page after another)
+and on (the folder is cut into key ranges with start_offset/end_offset and
+idle workers take over parts of slow ranges). Each run checks that every
+object was listed exactly once and stored.
+
+Names follow --naming: ``counter`` (IMG_00012345.JPG, as cameras write
+them) or ``hash`` (hex digests, spread evenly over the key space).
+
+Usage:
+    python benchmarks/bench_range_split.py [--files 200000] [--workers 16] [--latency 0.25] [--naming counter]
+"""
+import os
+import sys
+import shutil
+import sqlite3
+import argparse
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import folder_stats_v4  # noqa: E402
+from fake_listing_server import ServerProcess, make_tree  # noqa: E402
+
+BUCKET = 'bench-bucket'
+
+
+def crawl_once(label: str, server: ServerProcess, expected: int, split_parts: int, work_dir: str, args):
+    db_path = os.path.join(work_dir, f"crawl_{split_parts}.db")
+    server.reset_counters()
+    client = folder_stats_v4.make_client(args.workers, server.endpoint)
+    totals = folder_stats_v4.gather_metadata(client, BUCKET, '', db_path, workers=args.workers,
+                                             page_size=args.page_size, split_parts=split_parts)
+    conn = sqlite3.connect(db_path)
+    stored = conn.execute("SELECT COUNT(*) FROM objects WHERE name != ''").fetchone()[0]
+    conn.close()
+    # Objects are keyed by name, so one listed twice shows up as more listed than stored
+    listed = totals['objects']
+    check = 'ok' if stored == listed == expected else f'MISMATCH ({listed} listed, {stored} stored)'
+    print(f"  {label:<18} {totals['seconds']:7.2f}s  {totals['objects_per_sec']:9.1f} objects/s  "
+          f"{totals['requests']:5d} requests  {totals['ranges_split']:3d} splits  {check}")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark range-split listing of a flat folder')
+    parser.add_argument('--files', type=int, default=200000, help='Objects in the flat folder')
+    parser.add_argument('--naming', choices=['counter', 'hash'], default='counter')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.25, help='Seconds per list request (a full page takes about this long on GCS)')
+    parser.add_argument('--page-size', type=int, default=1000)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    objects = make_tree(BUCKET, depth=0, flat_files=args.files, flat_naming=args.naming)
+    server = ServerProcess(BUCKET, objects, latency=args.latency).start()
+    work_dir = tempfile.mkdtemp(prefix='folder_stats_bench_')
+    print(f"1 folder of {args.files} objects ({args.naming} names), latency {args.latency * 1000:g} ms, "
+          f"{args.workers} workers")
+    try:
+        serial = crawl_once('serial pages', server, args.files, 1, work_dir, args)
+        split = crawl_once('range split', server, args.files, 0, work_dir, args)
+        print(f"  speed-up x{serial['seconds'] / split['seconds']:.1f}")
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
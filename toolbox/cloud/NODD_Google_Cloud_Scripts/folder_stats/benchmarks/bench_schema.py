@@ -0,0 +1,147 @@
+"""
+Benchmark: database size and query latency, v3 metadata table vs v4 schema.
+
+Builds a schema-1 database (v3's metadata table plus the path index v4
+used to add) holding --objects synthetic objects in folders of
+--files-per-folder, converts it with migrate_metadata_db.py, checks that
+the per-folder statistics come out identical, and compares:
+
+    size          database file size
+    stats         the per-folder statistics behind folder_stats.csv and the
+                  dashboard (GROUP BY folder over every object)
+    folder        totals for one folder
+    listing       the objects in one folder (schema 1 only has them as
+                  download links)
+
+Query times are the best of --repeat runs, on a connection that is already
+open (the stats query opens its own, as folder_stats_v4 does).
+
+Usage:
+    python benchmarks/bench_schema.py [--objects 1000000] [--files-per-folder 500] [--dir /path/on/target/disk]
+"""
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import folder_stats_v4  # noqa: E402
+import migrate_metadata_db  # noqa: E402
+
+BUCKET = 'bench-bucket'
+
+V1_STATS = '''
+    SELECT
+        path,
+        SUM(CASE WHEN type = 'file' THEN size ELSE 0 END) AS total_size,
+        COUNT(CASE WHEN type = 'file' THEN 1 END) AS file_count,
+        COUNT(DISTINCT CASE WHEN type = 'folder' THEN path ELSE NULL END) AS folder_count,
+        MIN(time_created) AS earliest_time_created,
+        MAX(updated) AS latest_updated
+    FROM metadata
+    GROUP BY path
+'''
+
+QUERIES = {
+    'folder': (
+        "SELECT SUM(size), COUNT(*) FROM metadata WHERE path = ? AND type = 'file'",
+        "SELECT SUM(size), COUNT(*) FROM objects WHERE prefix_id = (SELECT id FROM prefixes WHERE path = ?) AND name != ''",
+    ),
+    'listing': (
+        "SELECT mediaLink FROM metadata WHERE path = ? AND type = 'file'",
+        "SELECT name, generation FROM objects WHERE prefix_id = (SELECT id FROM prefixes WHERE path = ?) AND name != ''",
+    ),
+}
+
+
+def build_v1(db_path: str, objects: int, per_folder: int):
+    conn = sqlite3.connect(db_path)
+    conn.execute('''CREATE TABLE metadata (id INTEGER PRIMARY KEY, path TEXT, type TEXT, size INTEGER,
+                    time_created TEXT, updated TEXT, md5Hash TEXT, mediaLink TEXT)''')
+    conn.execute('CREATE INDEX idx_metadata_path ON metadata (path)')
+    start = folder_stats_v4.epoch_ms('2019-03-01T00:00:00.000Z')
+    folders = max(1, objects // per_folder)
+    for f in range(folders):
+        path = f"PIFSC/ESD/ARP/site_{f % 40:02d}/survey_{f // 40:04d}/"
+        rows = [(path, 'folder', 0, folder_stats_v4.iso_from_ms(start + f * 3600000), None, None, None)]
+        for i in range(per_folder):
+            created = start + f * 3600000 + i * 1013
+            generation = created * 1000 + 317
+            name = f"{path}IMG_{i:06d}.JPG"
+            rows.append((path, 'file', 2000 + (f * 7919 + i * 104729) % 4000000,
+                         folder_stats_v4.iso_from_ms(created), folder_stats_v4.iso_from_ms(created + 250),
+                         'oPUXNrYsrfnT6H7xsPzkgQ==', folder_stats_v4.media_link(BUCKET, name, generation)))
+        conn.executemany('INSERT INTO metadata (path, type, size, time_created, updated, md5Hash, mediaLink) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def best_time(run, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def query(db_path: str, sql: str, params=()):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare database size and query latency, schema 1 vs 2')
+    parser.add_argument('--objects', type=int, default=1000000)
+    parser.add_argument('--files-per-folder', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--dir', default=None, help='Directory for the test databases (default: system temp)')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='folder_stats_schema_bench_', dir=args.dir)
+    v1_path = os.path.join(work_dir, 'v1.db')
+    v2_path = os.path.join(work_dir, 'v2.db')
+    try:
+        sample_folder = build_v1(v1_path, args.objects, args.files_per_folder)
+        start = time.perf_counter()
+        stats = migrate_metadata_db.migrate(v1_path, v2_path)
+        migrate_seconds = time.perf_counter() - start
+        print(f"{stats['rows']} rows ({stats['prefixes']} prefixes), migrated in {migrate_seconds:.1f}s")
+
+        v1_stats = query(v1_path, V1_STATS)
+        v2_stats = folder_stats_v4.get_counts_and_sizes(v2_path)
+        if v1_stats != v2_stats:
+            sys.exit('Per-folder statistics differ between the two databases')
+        path, name, generation = query(v2_path, '''SELECT p.path, o.name, o.generation FROM objects o
+                                                    JOIN prefixes p ON p.id = o.prefix_id WHERE o.name != '' LIMIT 1''')[0]
+        link = folder_stats_v4.media_link(BUCKET, folder_stats_v4.object_name(path, name), generation)
+        if not query(v1_path, 'SELECT 1 FROM metadata WHERE mediaLink = ?', (link,)):
+            sys.exit('Rebuilt download link not found in the original database')
+
+        v1_size, v2_size = os.path.getsize(v1_path), os.path.getsize(v2_path)
+        print(f"  {'':<8} {'schema 1':>12} {'schema 2':>12}")
+        print(f"  {'size':<8} {v1_size / 2 ** 20:9.1f} MiB {v2_size / 2 ** 20:9.1f} MiB   x{v1_size / v2_size:.1f} smaller")
+        timings = {'stats': (best_time(lambda: query(v1_path, V1_STATS), args.repeat),
+                             best_time(lambda: folder_stats_v4.get_counts_and_sizes(v2_path), args.repeat))}
+        v1, v2 = sqlite3.connect(v1_path), sqlite3.connect(v2_path)
+        for label, (v1_sql, v2_sql) in QUERIES.items():
+            timings[label] = (best_time(lambda: v1.execute(v1_sql, (sample_folder,)).fetchall(), args.repeat),
+                              best_time(lambda: v2.execute(v2_sql, (sample_folder,)).fetchall(), args.repeat))
+        v1.close()
+        v2.close()
+        for label, (v1_time, v2_time) in timings.items():
+            print(f"  {label:<8} {v1_time * 1000:9.2f} ms {v2_time * 1000:9.2f} ms   x{v1_time / v2_time:.1f} speed-up")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""
+Local stand-in for the Cloud Storage JSON API object listing, for benchmarks.
+
+Serves ``GET /storage/v1/b/<bucket>/o`` from an in-memory sorted list of
+object names with ``prefix``, ``delimiter``, ``pageToken``, ``maxResults``
+(capped at 1000 like the real API), ``startOffset`` and ``endOffset``. Every
+request waits ``latency`` seconds first, and with ``quota_rps`` requests
+above that rate get 429 (the client library retries them), which is what
+an over-eager crawler runs into against the real quota. Objects are
+returned as full resources, as the real API does, unless the request has a
+``fields`` partial-response projection such as
+``items(name,size),prefixes,nextPageToken``.
+
+Point a client at it with ``client_options={'api_endpoint': server.endpoint}``
+and anonymous credentials. ``ServerProcess`` runs the server in a child
+process so its CPU time doesn't compete with the crawler being measured.
+"""
+import json
+import time
+import base64
+import bisect
+import hashlib
+import threading
+import multiprocessing
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+MAX_PAGE_SIZE = 1000
+
+
+def make_tree(bucket: str, fanout: int = 6, depth: int = 3, files_per_folder: int = 40,
+              flat_files: int = 0, flat_naming: str = 'counter') -> Dict[str, int]:
+    """
+    Object names and sizes for a synthetic survey archive.
+
+    ``fanout`` sub-folders per folder down to ``depth``, each with
+    ``files_per_folder`` files and a folder placeholder object; with
+    ``flat_files``, one extra folder (``flat/``) holds that many files and no
+    sub-folders, named like camera images (``counter``: ``IMG_00012345.JPG``)
+    or by content hash (``hash``: ``3f9a...c2.jpg``).
+    """
+    objects = {}
+    level = ['']
+    for d in range(depth):
+        next_level = []
+        for parent in level:
+            for i in range(fanout):
+                folder = f"{parent}site_{d}_{i:03d}/"
+                objects[folder] = 0
+                for f in range(files_per_folder):
+                    objects[f"{folder}img_{f:05d}.jpg"] = 1000 + (f * 7919) % 500000
+                next_level.append(folder)
+        level = next_level
+    for f in range(flat_files):
+        if flat_naming == 'hash':
+            name = f"flat/{hashlib.sha1(str(f).encode()).hexdigest()}.jpg"
+        else:
+            name = f"flat/IMG_{f:08d}.JPG"
+        objects[name] = 2000 + (f * 104729) % 4000000
+    return objects
+
+
+def object_resource(bucket: str, name: str, size: int) -> dict:
+    """A full object resource shaped like the API's (noAcl projection)."""
+    digest = hashlib.md5(name.encode()).digest()
+    quoted = quote(name, safe='')
+    generation = str(1700000000000000 + len(name) * 1009 + size % 997)
+    return {
+        'kind': 'storage#object',
+        'id': f"{bucket}/{name}/{generation}",
+        'selfLink': f"https://www.googleapis.com/storage/v1/b/{bucket}/o/{quoted}",
+        'mediaLink': f"https://storage.googleapis.com/download/storage/v1/b/{bucket}/o/{quoted}?generation={generation}&alt=media",
+        'name': name,
+        'bucket': bucket,
+        'generation': generation,
+        'metageneration': '1',
+        'contentType': 'application/x-directory' if name.endswith('/') else 'image/jpeg',
+        'storageClass': 'STANDARD',
+        'size': str(size),
+        'md5Hash': base64.b64encode(digest).decode(),
+        'crc32c': base64.b64encode(digest[:4]).decode(),
+        'etag': base64.b64encode(digest[4:12]).decode(),
+        'timeCreated': '2023-05-14T21:08:31.512Z',
+        'updated': '2023-05-14T21:08:31.512Z',
+        'timeStorageClassUpdated': '2023-05-14T21:08:31.512Z',
+        'metadata': {'goog-reserved-file-mtime': '1684098511'},
+    }
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Dict[str, Optional[Tuple[str, ...]]]]:
+    """
+    A ``fields`` projection as top-level field -> sub-fields kept (None = all).
+
+    Handles the forms a list request uses: ``a,b(c,d),e``. No projection
+    (None) keeps everything.
+    """
+    if not fields:
+        return None
+    selected: Dict[str, Optional[Tuple[str, ...]]] = {}
+    depth, token, sub = 0, '', ''
+    for char in fields + ',':
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            if token.strip():
+                selected[token.strip()] = tuple(f.strip() for f in sub.split(',')) if sub else None
+            token, sub = '', ''
+        elif depth:
+            sub += char
+        else:
+            token += char
+    return selected
+
+
+def project(resource: dict, keep: Optional[Tuple[str, ...]]) -> dict:
+    """``resource`` cut down to the fields in ``keep`` (None = all)."""
+    if keep is None:
+        return resource
+    return {key: resource[key] for key in keep if key in resource}
+
+
+class FakeListingServer(ThreadingHTTPServer):
+    """
+    Args:
+        bucket: Bucket name served
+        objects: Object name -> size
+        latency: Seconds each request waits before answering
+        quota_rps: Requests per second before answering 429 (0 = no quota)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, bucket: str, objects: Dict[str, int], latency: float = 0.05, quota_rps: float = 0):
+        self.bucket = bucket
+        self.names: List[str] = sorted(objects)
+        self.sizes = objects
+        self.latency = latency
+        self.quota_rps = quota_rps
+        self.requests = 0
+        self.throttled = 0
+        self.bytes_sent = 0
+        self._recent = deque()
+        self._item_cache: Dict[Tuple[str, Optional[Tuple[str, ...]]], str] = {}
+        self._lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), _ListingHandler)
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> 'FakeListingServer':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = self.throttled = self.bytes_sent = 0
+
+    def _admit(self) -> bool:
+        """Count a request; False if it is over the quota."""
+        with self._lock:
+            self.requests += 1
+            if not self.quota_rps:
+                return True
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.quota_rps:
+                self.throttled += 1
+                return False
+            self._recent.append(now)
+            return True
+
+    def _select(self, prefix: str, delimiter: Optional[str], page_token: Optional[str], max_results: int,
+                start_offset: Optional[str], end_offset: Optional[str]) -> Tuple[List[str], List[str], Optional[str]]:
+        """Object names, sub-prefixes and next page token for one ``objects.list`` call."""
+        max_results = max(1, min(max_results, MAX_PAGE_SIZE))
+        start = max(prefix, start_offset or '')
+        if page_token:
+            start = max(start, base64.urlsafe_b64decode(page_token.encode()).decode())
+        i = bisect.bisect_left(self.names, start)
+        names, prefixes = [], []
+        while i < len(self.names) and len(names) + len(prefixes) < max_results:
+            name = self.names[i]
+            if not name.startswith(prefix) or (end_offset and name >= end_offset):
+                i = len(self.names)
+                break
+            rest = name[len(prefix):]
+            cut = rest.find(delimiter) if delimiter else -1
+            if cut >= 0:
+                sub = prefix + rest[:cut + len(delimiter)]
+                prefixes.append(sub)
+                # Skip everything under this sub-prefix
+                i = bisect.bisect_left(self.names, sub[:-1] + chr(ord(sub[-1]) + 1))
+                continue
+            names.append(name)
+            i += 1
+        token = None
+        if i < len(self.names) and self.names[i].startswith(prefix) and not (end_offset and self.names[i] >= end_offset):
+            token = base64.urlsafe_b64encode(self.names[i].encode()).decode()
+        return names, prefixes, token
+
+    def _item_json(self, name: str, keep: Optional[Tuple[str, ...]] = None) -> str:
+        # Serialized once per object and projection so the server spends its time waiting, not encoding
+        item = self._item_cache.get((name, keep))
+        if item is None:
+            resource = project(object_resource(self.bucket, name, self.sizes[name]), keep)
+            item = self._item_cache[(name, keep)] = json.dumps(resource)
+        return item
+
+    def list_page(self, prefix: str = '', delimiter: Optional[str] = None, page_token: Optional[str] = None,
+                  max_results: int = MAX_PAGE_SIZE, start_offset: Optional[str] = None,
+                  end_offset: Optional[str] = None, fields: Optional[str] = None) -> dict:
+        """One page of results, as the API's ``objects.list`` returns it."""
+        return json.loads(self.page_body(prefix, delimiter, page_token, max_results, start_offset, end_offset, fields))
+
+    def page_body(self, prefix: str = '', delimiter: Optional[str] = None, page_token: Optional[str] = None,
+                  max_results: int = MAX_PAGE_SIZE, start_offset: Optional[str] = None,
+                  end_offset: Optional[str] = None, fields: Optional[str] = None) -> bytes:
+        """The JSON body of one page."""
+        names, prefixes, token = self._select(prefix, delimiter, page_token, max_results, start_offset, end_offset)
+        selected = parse_fields(fields)
+        wanted = (lambda key: True) if selected is None else selected.__contains__
+        keep = None if selected is None else selected.get('items')
+        parts = ['"kind": "storage#objects"'] if wanted('kind') else []
+        if prefixes and wanted('prefixes'):
+            parts.append(f'"prefixes": {json.dumps(prefixes)}')
+        if names and wanted('items'):
+            parts.append('"items": [' + ', '.join(self._item_json(name, keep) for name in names) + ']')
+        if token and wanted('nextPageToken'):
+            parts.append(f'"nextPageToken": "{token}"')
+        return ('{' + ', '.join(parts) + '}').encode()
+
+
+class _ListingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server: FakeListingServer = self.server
+        url = urlparse(self.path)
+        parts = url.path.split('/')
+        # /storage/v1/b/<bucket>/o
+        if len(parts) != 6 or parts[1:4] != ['storage', 'v1', 'b'] or parts[5] != 'o' or unquote(parts[4]) != server.bucket:
+            return self._send(404, {'error': {'code': 404, 'message': 'Not Found'}})
+        time.sleep(server.latency)
+        if not server._admit():
+            return self._send(429, {'error': {'code': 429, 'message': 'Rate limit exceeded'}})
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = server.page_body(
+            prefix=query.get('prefix', ''),
+            delimiter=query.get('delimiter'),
+            page_token=query.get('pageToken'),
+            max_results=int(query.get('maxResults', MAX_PAGE_SIZE)),
+            start_offset=query.get('startOffset'),
+            end_offset=query.get('endOffset'),
+            fields=query.get('fields'),
+        )
+        self._send(200, body)
+
+    def _send(self, status: int, body):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        with self.server._lock:
+            self.server.bytes_sent += len(data)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(conn, args, kwargs):
+    server = FakeListingServer(*args, **kwargs).start()
+    conn.send(server.endpoint)
+    while True:
+        command = conn.recv()
+        if command == 'stats':
+            conn.send({'requests': server.requests, 'throttled': server.throttled, 'bytes_sent': server.bytes_sent})
+        elif command == 'reset':
+            server.reset_counters()
+            conn.send(True)
+        else:
+            server.stop()
+            conn.send(True)
+            return
+
+
+class ServerProcess:
+    """A ``FakeListingServer`` (same arguments) running in a child process."""
+
+    def __init__(self, *args, **kwargs):
+        self._args = args
+        self._kwargs = kwargs
+        self._conn = None
+        self._process = None
+        self.endpoint = None
+
+    def start(self) -> 'ServerProcess':
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        self._conn, child = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child, self._args, self._kwargs), daemon=True)
+        self._process.start()
+        self.endpoint = self._conn.recv()
+        return self
+
+    def stats(self) -> dict:
+        self._conn.send('stats')
+        return self._conn.recv()
+
+    def reset_counters(self):
+        self._conn.send('reset')
+        self._conn.recv()
+
+    def stop(self):
+        self._conn.send('stop')
+        self._conn.recv()
+        self._process.join(timeout=5)
@@ -0,0 +1,829 @@
+"""
+Folder stats v4: concurrent, prefix-sharded metadata crawler.
+
+v2/v3 list one prefix at a time and recurse, so a bucket with millions of
+objects spends most of the crawl waiting on list-page round trips. v4
+discovers prefixes breadth-first and lists up to ``--workers`` of them at
+once on one shared client (one keep-alive connection per worker). Workers
+only talk to the API; a single writer thread owns the SQLite connection and
+stores every page they send it, so the database is never contended. The
+database is in WAL mode, so it can be queried while a crawl is writing, and
+the writer commits in large transactions (every ``commit_rows`` rows or
+``commit_seconds`` seconds, whichever comes first).
+``--max-rps`` caps list requests per second to stay under the API quota.
+
+Every prefix is recorded in ``crawl_prefixes`` when it is found and marked
+done (together with its sub-prefixes) once fully listed, so an interrupted
+crawl resumes where it stopped: half-listed prefixes are cleared and listed
+again, finished ones are not touched.
+
+List requests ask only for the six object fields the database stores (a
+``fields`` projection) at the largest page size the API allows, and rows
+are built straight from the page JSON without creating ``Blob`` objects.
+
+The database uses a compact schema (``SCHEMA_VERSION`` 2, kept in
+``PRAGMA user_version``):
+
+    prefixes    one row per folder path, with an integer id and its
+                parent's id
+    objects     per object: prefix id, base name ('' for a folder
+                placeholder), size, created/updated as epoch milliseconds,
+                raw 16-byte MD5 and generation; keyed on (prefix id, name)
+                so each folder's objects are stored together
+    store_info  the bucket name, from which ``media_link`` rebuilds an
+                object's download link, and the root prefix crawled; a
+                database is only resumed for the same bucket and root
+
+v3's ``metadata`` table (schema 1, a full path string, ISO timestamps and
+download link on every row) is converted with ``migrate_metadata_db.py``.
+The CSV is the same as v3's.
+
+Usage:
+    python folder_stats_v4.py nmfs_odp_pifsc/PIFSC/ESD/ARP/ --workers 32
+"""
+import os
+import time
+import queue
+import base64
+import bisect
+import string
+import sqlite3
+import logging
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import quote
+from google.cloud import storage
+
+# Set the Google Cloud Project ID
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "YOUR_PROJECT_ID")
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(threadName)s - %(message)s')
+
+# Row layout handed to the writer: (folder path, base name, size, time_created ms, updated ms, md5, generation)
+Row = Tuple[str, str, Optional[int], Optional[int], Optional[int], Optional[bytes], Optional[int]]
+
+# Largest page objects.list returns
+MAX_PAGE_SIZE = 1000
+
+# Partial response for objects.list: the fields a Row needs, plus what paging needs
+LIST_FIELDS = 'items(name,size,timeCreated,updated,md5Hash,generation),prefixes,nextPageToken'
+
+
+# Pragmas for the writer's connection: fsync only at checkpoints (WAL keeps the
+# database consistent after a crash), and a 64 MiB page cache
+WRITER_PRAGMAS = ('PRAGMA synchronous=NORMAL', 'PRAGMA cache_size=-65536')
+
+
+# Database layout written by this version (PRAGMA user_version); v3's metadata table is 1
+SCHEMA_VERSION = 2
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+
+# Function to initialize the SQLite database
+def init_db(db_path, bucket_name: Optional[str] = None):
+    conn = sqlite3.connect(db_path)
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        legacy = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'metadata'").fetchone()
+        if legacy or version > SCHEMA_VERSION:
+            raise RuntimeError(f"{db_path} has schema version {version if version else 1}, this script writes "
+                               f"{SCHEMA_VERSION}; convert it with 'python migrate_metadata_db.py {db_path}' "
+                               "or start over with --restart")
+        # Persistent: readers (the stats query, a dashboard) no longer block the writer or get "database is locked"
+        conn.execute('PRAGMA journal_mode=WAL')
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS prefixes (
+                id INTEGER PRIMARY KEY,
+                parent_id INTEGER REFERENCES prefixes (id),
+                path TEXT NOT NULL UNIQUE
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_prefixes_parent ON prefixes (parent_id)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS objects (
+                prefix_id INTEGER NOT NULL REFERENCES prefixes (id),
+                name TEXT NOT NULL,
+                size INTEGER,
+                time_created INTEGER,
+                updated INTEGER,
+                md5 BLOB,
+                generation INTEGER,
+                PRIMARY KEY (prefix_id, name)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS store_info (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS crawl_prefixes (
+                prefix TEXT PRIMARY KEY,
+                done INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        if bucket_name:
+            # media_link rebuilds every stored object's link from this, so it is never overwritten
+            cursor.execute("INSERT OR IGNORE INTO store_info (key, value) VALUES ('bucket', ?)", (bucket_name,))
+            stored = cursor.execute("SELECT value FROM store_info WHERE key = 'bucket'").fetchone()[0]
+            if stored != bucket_name:
+                raise RuntimeError(f"{db_path} holds objects from bucket {stored}, not {bucket_name}; "
+                                   "use --restart or another --db")
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def folder_of(name: str) -> str:
+    """The folder path a file is counted under (same as v3: everything up to the last '/')."""
+    return '/'.join(name.split('/')[:-1]) + '/'
+
+
+def parent_path(path: str) -> Optional[str]:
+    """The folder path one level up (``'a/b/'`` -> ``'a/'`` -> ``'/'``); None for the root ``'/'``."""
+    if path == '/':
+        return None
+    head, _, _ = path[:-1].rpartition('/')
+    return head + '/'
+
+
+def split_name(name: str) -> Tuple[str, str]:
+    """``(folder path, base name)`` of an object; a folder placeholder is its own folder with name ''."""
+    if name.endswith('/'):
+        return name, ''
+    folder = folder_of(name)
+    return folder, name[len(folder):] if folder != '/' else name
+
+
+def object_name(path: str, name: str) -> str:
+    """The full object name for a ``split_name`` pair."""
+    return name if path == '/' else path + name
+
+
+@lru_cache(maxsize=4096)
+def _day_start_ms(day: str) -> int:
+    # Objects in a folder tend to share a few upload days
+    return (datetime(int(day[0:4]), int(day[5:7]), int(day[8:10])).toordinal() - EPOCH_ORDINAL) * 86400000
+
+
+def epoch_ms(value: Optional[str]) -> Optional[int]:
+    """An API timestamp (``2023-05-14T21:08:31.512Z``) as milliseconds since the epoch, without strptime."""
+    if not value:
+        return None
+    seconds = (int(value[11:13]) * 60 + int(value[14:16])) * 60 + int(value[17:19])
+    fraction = value[20:23] if value[19:20] == '.' else ''
+    return _day_start_ms(value[:10]) + seconds * 1000 + int(fraction.rstrip('Z').ljust(3, '0'))
+
+
+def iso_from_ms(value: Optional[int]) -> Optional[str]:
+    """Epoch milliseconds as v3 stored timestamps (``datetime.isoformat()``, e.g. ``2023-05-14T21:08:31.512000+00:00``)."""
+    if value is None:
+        return None
+    return (EPOCH + timedelta(milliseconds=value)).isoformat()
+
+
+def media_link(bucket_name: str, name: str, generation: int) -> str:
+    """The object's download link, as the API's ``mediaLink`` (reserved characters may be escaped differently)."""
+    return (f"https://storage.googleapis.com/download/storage/v1/b/{bucket_name}/o/"
+            f"{quote(name, safe='')}?generation={generation}&alt=media")
+
+
+def item_to_row(item: dict) -> Row:
+    """A row for the writer from one object resource of a list page."""
+    folder, base = split_name(item['name'])
+    size = item.get('size')
+    md5 = item.get('md5Hash')
+    generation = item.get('generation')
+    return (folder, base, int(size) if size is not None else None, epoch_ms(item.get('timeCreated')),
+            epoch_ms(item.get('updated')), base64.b64decode(md5) if md5 else None,
+            int(generation) if generation is not None else None)
+
+
+class RateLimiter:
+    """Spaces out calls to at most ``per_second`` per second across threads (0 = no limit)."""
+
+    def __init__(self, per_second: float = 0):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait_for = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+
+class MetadataWriter(threading.Thread):
+    """
+    The only thread that touches the database.
+
+    Crawl workers hand it pages of rows and prefix results through a bounded
+    queue (so a slow disk slows the crawl down instead of filling memory).
+    Everything goes through one connection, committed once ``commit_rows``
+    rows are pending or ``commit_seconds`` after the first uncommitted write.
+
+    Args:
+        db_path: SQLite database created by ``init_db``
+        commit_rows: Rows written before a commit
+        commit_seconds: Longest time written rows wait for a commit
+        max_queued: Messages waiting before workers block
+    """
+
+    def __init__(self, db_path: str, commit_rows: int = 50000, commit_seconds: float = 2.0, max_queued: int = 256):
+        super().__init__(name='metadata-writer', daemon=True)
+        self.db_path = db_path
+        self.commit_rows = commit_rows
+        self.commit_seconds = commit_seconds
+        self.rows_written = 0
+        self.commits = 0
+        self.error: Optional[BaseException] = None
+        self._prefix_ids: Dict[str, int] = {}
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queued)
+
+    def add_rows(self, rows: List[Row]):
+        self._put(('rows', rows))
+
+    def prefix_done(self, prefix: str, children: List[str]):
+        """Mark ``prefix`` fully listed and record its sub-prefixes, in one transaction with its rows."""
+        self._put(('done', prefix, children))
+
+    def close(self):
+        """Flush everything, stop the thread and re-raise any database error."""
+        self._queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+    def _put(self, message):
+        if self.error is not None:
+            raise RuntimeError(f"Metadata writer stopped: {self.error}")
+        self._queue.put(message)
+
+    def _prefix_id(self, cursor: sqlite3.Cursor, path: str) -> int:
+        """Id of folder ``path`` in the prefixes table, adding it (and missing parents) if new."""
+        prefix_id = self._prefix_ids.get(path)
+        if prefix_id is None:
+            row = cursor.execute('SELECT id FROM prefixes WHERE path = ?', (path,)).fetchone()
+            if row:
+                prefix_id = row[0]
+            else:
+                parent = parent_path(path)
+                parent_id = self._prefix_id(cursor, parent) if parent is not None else None
+                cursor.execute('INSERT INTO prefixes (parent_id, path) VALUES (?, ?)', (parent_id, path))
+                prefix_id = cursor.lastrowid
+            self._prefix_ids[path] = prefix_id
+        return prefix_id
+
+    def run(self):
+        conn = sqlite3.connect(self.db_path)
+        for pragma in WRITER_PRAGMAS:
+            conn.execute(pragma)
+        cursor = conn.cursor()
+        uncommitted = 0
+        deadline = None
+        try:
+            while True:
+                try:
+                    wait_for = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    message = self._queue.get(timeout=wait_for)
+                except queue.Empty:
+                    # Nothing new before the commit budget ran out
+                    conn.commit()
+                    self.commits += 1
+                    uncommitted, deadline = 0, None
+                    continue
+                if message is None:
+                    break
+                if deadline is None:
+                    deadline = time.monotonic() + self.commit_seconds
+                kind = message[0]
+                if kind == 'rows':
+                    rows = [(self._prefix_id(cursor, row[0]),) + row[1:] for row in message[1]]
+                    cursor.executemany('''INSERT OR REPLACE INTO objects (prefix_id, name, size, time_created, updated, md5, generation)
+                                          VALUES (?, ?, ?, ?, ?, ?, ?)''', rows)
+                    uncommitted += len(message[1])
+                    self.rows_written += len(message[1])
+                elif kind == 'done':
+                    _, prefix, children = message
+                    cursor.execute('UPDATE crawl_prefixes SET done = 1 WHERE prefix = ?', (prefix,))
+                    cursor.executemany('INSERT OR IGNORE INTO crawl_prefixes (prefix) VALUES (?)',
+                                       [(child,) for child in children])
+                    uncommitted += 1
+                if uncommitted >= self.commit_rows or time.monotonic() >= deadline:
+                    conn.commit()
+                    self.commits += 1
+                    uncommitted, deadline = 0, None
+            conn.commit()
+            self.commits += 1
+        except BaseException as e:
+            self.error = e
+            logging.error("Metadata writer failed: %s", e)
+            # Keep draining until close() so workers blocked on a full queue can finish
+            while self._queue.get() is not None:
+                pass
+        finally:
+            conn.close()
+
+
+def check_crawl_target(db_path: str, bucket_name: str, root: str):
+    """
+    Record the bucket and root prefix a database crawls, or refuse another one.
+
+    Crawl progress in ``crawl_prefixes`` only makes sense for the bucket path
+    it was started with; reusing the database for another would resume (or
+    report as complete) the wrong crawl.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        stored = dict(conn.execute("SELECT key, value FROM store_info WHERE key IN ('bucket', 'root')").fetchall())
+        wanted = {'bucket': bucket_name, 'root': root}
+        if any(key in stored and stored[key] != value for key, value in wanted.items()):
+            raise RuntimeError(f"{db_path} holds a crawl of {stored.get('bucket', '?')}/{stored.get('root', '?')}, "
+                               f"not {bucket_name}/{root}; use --restart or another --db")
+        conn.executemany('INSERT OR IGNORE INTO store_info (key, value) VALUES (?, ?)', wanted.items())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def pending_prefixes(db_path: str, root: str) -> List[str]:
+    """
+    Prefixes still to list, preparing the database to resume.
+
+    A fresh database starts from ``root``. Otherwise the prefixes not marked
+    done are returned and any rows a previous run stored for them are
+    removed, since they may be only partly listed.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM crawl_prefixes')
+        if cursor.fetchone()[0] == 0:
+            cursor.execute('INSERT INTO crawl_prefixes (prefix) VALUES (?)', (root,))
+            conn.commit()
+            return [root]
+        cursor.execute('SELECT prefix FROM crawl_prefixes WHERE done = 0 ORDER BY prefix')
+        prefixes = [row[0] for row in cursor.fetchall()]
+        cursor.executemany('DELETE FROM objects WHERE prefix_id = (SELECT id FROM prefixes WHERE path = ?)',
+                           [(p or '/',) for p in prefixes])
+        conn.commit()
+        return prefixes
+    finally:
+        conn.close()
+
+
+def make_client(workers: int, endpoint: Optional[str] = None) -> storage.Client:
+    """
+    One client shared by every worker, with a connection pool sized to match.
+
+    ``endpoint`` points the client at a local emulator or test server
+    (anonymous credentials) instead of Google.
+    """
+    if endpoint:
+        from google.auth.credentials import AnonymousCredentials
+        client = storage.Client(project='test', credentials=AnonymousCredentials(),
+                                client_options={'api_endpoint': endpoint})
+    else:
+        client = storage.Client()
+    import requests
+    # requests keeps 10 connections per host by default; give every worker its own,
+    # plus a couple for the client's own lookups (e.g. bucket metadata)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers + 2, pool_maxsize=workers + 2)
+    client._http.mount('https://', adapter)
+    client._http.mount('http://', adapter)
+    return client
+
+
+# Characters a name position may take when one of the class is seen there
+CHAR_CLASSES = (string.digits, string.ascii_lowercase, string.ascii_uppercase)
+
+
+class KeySpace:
+    """
+    Numbers the names under a prefix so key ranges can be cut into even parts.
+
+    Built from a sample of real names (the last page listed). Positions up
+    to the last one that varies in the sample take any character of the
+    classes seen there (digits, lower or upper case), since a page only
+    shows a small slice of the folder; positions after it (a fixed ending
+    like ``.JPG``) keep the characters seen. ``IMG_00012345.JPG`` thus gives
+    an 8-digit counter with upper-case letters before it. Names are then
+    read as mixed-radix numbers. Only the balance of a split depends on this
+    guess; every range is still listed in full, and ranges that turn out to
+    hold most of the names are split again.
+    """
+
+    def __init__(self, prefix: str, sample: List[str]):
+        self.prefix = prefix
+        tails = [name[len(prefix):] for name in sample if name.startswith(prefix)] or ['']
+        columns = [{t[i] for t in tails if i < len(t)} for i in range(max(len(t) for t in tails))]
+        last_varying = max((i for i, seen in enumerate(columns) if len(seen) > 1), default=-1)
+        self.alphabets: List[str] = []
+        for i, seen in enumerate(columns):
+            if i <= last_varying:
+                for chars in CHAR_CLASSES:
+                    if seen & set(chars):
+                        seen |= set(chars)
+            self.alphabets.append(''.join(sorted(seen)))
+        self.size = 1
+        for alphabet in self.alphabets:
+            self.size *= len(alphabet)
+
+    def to_int(self, name: str) -> int:
+        tail = name[len(self.prefix):] if name.startswith(self.prefix) else ''
+        value = 0
+        for i, alphabet in enumerate(self.alphabets):
+            digit = min(bisect.bisect_left(alphabet, tail[i]), len(alphabet) - 1) if i < len(tail) else 0
+            value = value * len(alphabet) + digit
+        return value
+
+    def from_int(self, value: int) -> str:
+        chars = []
+        for alphabet in reversed(self.alphabets):
+            value, digit = divmod(value, len(alphabet))
+            chars.append(alphabet[digit])
+        return self.prefix + ''.join(reversed(chars))
+
+    def split(self, lo: str, hi: str, parts: int) -> List[str]:
+        """Up to ``parts - 1`` keys spaced evenly between ``lo`` and ``hi`` (both excluded)."""
+        a, b = self.to_int(lo), self.to_int(hi)
+        keys = {self.from_int(a + (b - a) * k // parts) for k in range(1, parts)}
+        return sorted(key for key in keys if lo < key < hi)
+
+
+@dataclass
+class ListTask:
+    """
+    One listing job: a whole prefix, or the key range [start, end) of one.
+
+    ``start`` moves forward as pages are stored, so a retry or a split
+    carries on from there. The crawl loop sets ``split_wanted`` to ask a
+    running task to hand part of its remaining range to idle workers.
+    """
+    prefix: str
+    start: Optional[str] = None
+    end: Optional[str] = None
+    skip: Optional[str] = None  # last object stored, returned again when start is inclusive
+    pages: int = 0
+    pages_at_split: int = 0
+    auto_split: bool = True
+    split_wanted: int = 0
+    children: Set[str] = field(default_factory=set)
+
+
+def resume_key(names: List[str], prefixes: Iterable[str]) -> Tuple[str, Optional[str]]:
+    """Where listing continues after a page: ``(start_offset, name to skip)``."""
+    last_name = names[-1] if names else ''
+    last_prefix = max(prefixes, default='')
+    # Nothing under a sub-prefix is left once it has been returned
+    after_prefix = last_prefix[:-1] + chr(ord(last_prefix[-1]) + 1) if last_prefix else ''
+    if last_name > after_prefix:
+        return last_name, last_name
+    return after_prefix, None
+
+
+class PrefixCrawler:
+    """
+    List a bucket path breadth-first, several prefixes at a time.
+
+    A prefix that is still returning full pages after ``split_after_pages``
+    pages (a flat folder with millions of objects) is cut into
+    ``split_parts`` key ranges listed in parallel with
+    ``start_offset``/``end_offset``. Split points come from a ``KeySpace``
+    over the names on the last page. When workers go idle, the range that
+    has listed the most pages since it was last split is split again
+    (straggler rebalancing), so a guess that put most names in one range
+    corrects itself within a few pages.
+
+    Args:
+        client: Storage client shared by all workers
+        bucket_name: Bucket to crawl
+        writer: Running ``MetadataWriter`` that stores what is listed
+        workers: Prefixes (or ranges) listed at once
+        page_size: Objects requested per list page (at most ``MAX_PAGE_SIZE``)
+        retry_limit: Attempts per task before its prefix is left for the next run
+        max_requests_per_sec: Cap on list requests per second (0 = no cap)
+        split_parts: Ranges a large flat prefix is cut into (default ``workers``; 1 = never split)
+        split_after_pages: Pages listed serially before a prefix is split
+    """
+
+    def __init__(self, client: storage.Client, bucket_name: str, writer: MetadataWriter, workers: int = 16,
+                 page_size: int = MAX_PAGE_SIZE, retry_limit: int = 3, max_requests_per_sec: float = 0,
+                 split_parts: int = 0, split_after_pages: int = 5):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.writer = writer
+        self.workers = max(1, workers)
+        self.page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        self.retry_limit = retry_limit
+        self.limiter = RateLimiter(max_requests_per_sec)
+        self.split_parts = split_parts or self.workers
+        self.split_after_pages = split_after_pages
+        self.objects = 0
+        self.requests = 0
+        self.prefixes_done = 0
+        self.ranges_split = 0
+        self.failed: List[str] = []
+        self._spawned: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _count(self, objects: int = 0):
+        with self._lock:
+            self.objects += objects
+            self.requests += 1
+
+    def _split(self, task: ListTask, parts: int, sample: List[str]) -> List[ListTask]:
+        """Keep the first part of ``task``'s remaining range and return tasks for the rest."""
+        space = KeySpace(task.prefix, sample + [task.start])
+        if space.size <= 1:
+            return []
+        # An open-ended range is cut up to the largest name the key space allows;
+        # the last part stays open-ended and covers anything beyond it
+        high = task.end if task.end is not None else space.from_int(space.size - 1)
+        keys = space.split(task.start, high, parts)
+        if not keys:
+            return []
+        bounds = keys + [task.end]
+        spawned = [ListTask(task.prefix, start=bounds[i], end=bounds[i + 1], auto_split=False)
+                   for i in range(len(keys))]
+        task.end = keys[0]
+        task.auto_split = False
+        with self._lock:
+            self.ranges_split += 1
+        return spawned
+
+    def _list_task(self, task: ListTask):
+        """List ``task`` to its end (or until the crawl is stopped), storing every page and splitting when asked."""
+        while not self._stop.is_set():
+            iterator = self.client.list_blobs(self.bucket_name, prefix=task.prefix or None, delimiter='/',
+                                              start_offset=task.start, end_offset=task.end,
+                                              page_size=self.page_size, fields=LIST_FIELDS)
+            self.limiter.acquire()
+            for page in iterator.pages:
+                # Rows come from the page JSON; iterating the page itself would build a Blob per item
+                items = [item for item in page.raw_page.get('items', ()) if item['name'] != task.skip]
+                self._count(len(items))
+                if items:
+                    self.writer.add_rows([item_to_row(item) for item in items])
+                task.children.update(page.prefixes)
+                task.pages += 1
+                if not iterator.next_page_token or self._stop.is_set():
+                    return
+                names = [item['name'] for item in items]
+                if not names and not page.prefixes:
+                    self.limiter.acquire()
+                    continue
+                task.start, task.skip = resume_key(names, page.prefixes)
+                parts = task.split_wanted
+                if task.auto_split and task.pages >= self.split_after_pages:
+                    task.auto_split = False
+                    parts = max(parts, self.split_parts)
+                if parts > 1:
+                    task.split_wanted = 0
+                    task.pages_at_split = task.pages
+                    spawned = self._split(task, parts, names)
+                    if spawned:
+                        logging.info("Splitting %s at %s into %d ranges", task.prefix or '/', task.start, len(spawned) + 1)
+                        for new_task in spawned:
+                            self._spawned.put(new_task)
+                        break  # carry on with the first range only
+                self.limiter.acquire()
+            else:
+                return
+
+    def run_task(self, task: ListTask) -> bool:
+        """Run one task, retrying from its last stored page; False if it kept failing or the crawl was stopped."""
+        for attempt in range(1, self.retry_limit + 1):
+            try:
+                self._list_task(task)
+                return not self._stop.is_set()
+            except Exception as e:
+                logging.error("Error gathering metadata for %s: %s. Retrying (%d/%d)...", task.prefix, e, attempt, self.retry_limit)
+                if self._stop.wait(min(30, 2 ** attempt)):
+                    return False
+        logging.error("Failed to gather metadata for %s after %d attempts.", task.prefix, self.retry_limit)
+        return False
+
+    def _rebalance(self, pending: dict, idle: int):
+        """Ask the running task that has gone longest without splitting to split for ``idle`` workers."""
+        if self.split_parts <= 1:
+            return
+        candidates = [t for t in pending.values() if not t.split_wanted and t.pages - t.pages_at_split >= 2]
+        if candidates:
+            straggler = max(candidates, key=lambda t: t.pages - t.pages_at_split)
+            straggler.split_wanted = idle + 1
+
+    def crawl(self, prefixes: Iterable[str], progress_seconds: float = 10) -> dict:
+        """
+        Crawl from ``prefixes`` until every sub-prefix is listed; returns totals.
+
+        On Ctrl+C, running tasks stop after the page they are on and queued
+        ones are dropped, so the interrupt is re-raised within about one list
+        request; their prefixes stay unfinished in the database for the next run.
+        """
+        todo = deque(ListTask(prefix) for prefix in prefixes)
+        open_tasks = {task.prefix: 1 for task in todo}
+        children: Dict[str, Set[str]] = {task.prefix: set() for task in todo}
+        failed: Set[str] = set()
+        pending: Dict[object, ListTask] = {}
+        start = last_report = time.time()
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='crawl')
+        try:
+            while todo or pending:
+                while todo and len(pending) < self.workers:
+                    task = todo.popleft()
+                    pending[pool.submit(self.run_task, task)] = task
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                # Ranges split off a task are queued before that task can finish
+                while not self._spawned.empty():
+                    task = self._spawned.get()
+                    open_tasks[task.prefix] += 1
+                    todo.appendleft(task)
+                for future in done:
+                    task = pending.pop(future)
+                    if not future.result():
+                        failed.add(task.prefix)
+                    children[task.prefix] |= task.children
+                    open_tasks[task.prefix] -= 1
+                    if open_tasks[task.prefix]:
+                        continue
+                    del open_tasks[task.prefix]
+                    found = sorted(children.pop(task.prefix))
+                    if task.prefix in failed:
+                        # Left unfinished in the database, so the next run lists it again
+                        self.failed.append(task.prefix)
+                        continue
+                    self.writer.prefix_done(task.prefix, found)
+                    self.prefixes_done += 1
+                    for child in found:
+                        open_tasks[child] = 1
+                        children[child] = set()
+                        todo.append(ListTask(child))
+                if not todo and len(pending) < self.workers:
+                    self._rebalance(pending, self.workers - len(pending))
+                if time.time() - last_report >= progress_seconds:
+                    last_report = time.time()
+                    elapsed = last_report - start
+                    logging.info("Listed %d objects (%.0f/s) in %d prefixes; %d listing, %d queued",
+                                 self.objects, self.objects / elapsed, self.prefixes_done, len(pending), len(todo))
+        except KeyboardInterrupt:
+            self._stop.set()
+            raise
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        elapsed = time.time() - start
+        return {
+            'objects': self.objects,
+            'prefixes': self.prefixes_done,
+            'requests': self.requests,
+            'ranges_split': self.ranges_split,
+            'failed_prefixes': len(self.failed),
+            'seconds': round(elapsed, 3),
+            'objects_per_sec': round(self.objects / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+def gather_metadata(client: storage.Client, bucket_name: str, prefix: str, db_path: str, workers: int = 16,
+                    page_size: int = MAX_PAGE_SIZE, max_requests_per_sec: float = 0, split_parts: int = 0) -> dict:
+    """Crawl ``bucket_name/prefix`` into ``db_path`` (resuming an unfinished crawl); returns totals."""
+    init_db(db_path)
+    check_crawl_target(db_path, bucket_name, prefix)
+    prefixes = pending_prefixes(db_path, prefix)
+    if not prefixes:
+        logging.info("Crawl already complete in %s (use --restart to crawl again)", db_path)
+        return {'objects': 0, 'prefixes': 0, 'requests': 0, 'ranges_split': 0, 'failed_prefixes': 0,
+                'seconds': 0.0, 'objects_per_sec': 0.0}
+    if prefixes != [prefix]:
+        logging.info("Resuming crawl: %d prefixes left to list", len(prefixes))
+    writer = MetadataWriter(db_path)
+    writer.start()
+    crawler = PrefixCrawler(client, bucket_name, writer, workers=workers, page_size=page_size,
+                            max_requests_per_sec=max_requests_per_sec, split_parts=split_parts)
+    try:
+        totals = crawler.crawl(prefixes)
+    finally:
+        writer.close()
+    return totals
+
+
+# Function to get counts and sizes from the database
+def get_counts_and_sizes(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    # Walks objects in primary-key order, so each folder is one contiguous run (no sort, no temp table)
+    cursor.execute('''
+        SELECT
+            p.path,
+            SUM(CASE WHEN o.name != '' THEN o.size ELSE 0 END) AS total_size,
+            COUNT(CASE WHEN o.name != '' THEN 1 END) AS file_count,
+            MAX(o.name = '') AS folder_count,
+            MIN(o.time_created) AS earliest_time_created,
+            MAX(o.updated) AS latest_updated
+        FROM objects o
+        JOIN prefixes p ON p.id = o.prefix_id
+        GROUP BY o.prefix_id
+        ORDER BY p.path
+    ''')
+    result = [(path, size, files, folders, iso_from_ms(created), iso_from_ms(updated))
+              for path, size, files, folders, created, updated in cursor.fetchall()]
+    conn.close()
+    return result
+
+
+def write_stats_csv(db_path: str, csv_path: str):
+    import pandas as pd
+    data = []
+    for row in get_counts_and_sizes(db_path):
+        data.append({
+            'Path': row[0],
+            'Size (Bytes)': row[1],
+            'File Count': row[2],
+            'Folder Count': row[3],
+            'Earliest Time Created': row[4],
+            'Latest Updated': row[5]
+        })
+    df = pd.DataFrame(data)
+    df["Size (GiB)"] = df["Size (Bytes)"] / (1024 ** 3)  # Convert bytes to GiB
+    df.to_csv(csv_path, index=False)
+
+
+# Function to parse the bucket name and prefix from the input
+def parse_bucket_and_prefix(bucket_and_prefix):
+    parts = bucket_and_prefix.split('/', 1)
+    if len(parts) != 2:
+        raise ValueError("Input must be in the format 'bucket_name/prefix'")
+    bucket_name, prefix = parts
+    # Prefixes are listed with delimiter '/', so a folder prefix must end with one
+    if prefix and not prefix.endswith('/'):
+        prefix += '/'
+    return bucket_name, prefix
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gather folder statistics for a bucket path with a concurrent crawler')
+    parser.add_argument('bucket_and_prefix', nargs='?', help="e.g. 'nmfs_odp_pifsc/PIFSC/ESD/ARP/data_management' (prompted for if omitted)")
+    parser.add_argument('--workers', type=int, default=16, help='Prefixes listed at once')
+    parser.add_argument('--page-size', type=int, default=MAX_PAGE_SIZE, help='Objects per list request (at most 1000)')
+    parser.add_argument('--split-parts', type=int, default=0, help='Key ranges a folder with many thousands of files (and no sub-folders to spread over) is listed in at once (default: --workers; 1 = never split)')
+    parser.add_argument('--max-rps', type=float, default=0, help='Maximum list requests per second, to stay under the API quota (0 = no limit)')
+    parser.add_argument('--db', default='metadata.db', help='SQLite database (an unfinished crawl in it is resumed)')
+    parser.add_argument('--csv', default='folder_stats.csv', help='Statistics output')
+    parser.add_argument('--restart', action='store_true', help='Discard the database and crawl from scratch')
+    parser.add_argument('--endpoint', default=None, help='Storage API endpoint, for a local emulator or test server')
+    args = parser.parse_args()
+
+    bucket_and_prefix = args.bucket_and_prefix or input("Enter the bucket name and prefix (e.g., 'nmfs_odp_pifsc/PIFSC/ESD/ARP/data_management'): ")
+    try:
+        bucket_name, prefix = parse_bucket_and_prefix(bucket_and_prefix)
+    except ValueError as e:
+        print(e)
+        return
+
+    if args.restart:
+        for path in (args.db, args.db + '-wal', args.db + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    logging.info("Gathering metadata from Google Cloud Storage with %d workers...", args.workers)
+    try:
+        client = make_client(args.workers, args.endpoint)
+        totals = gather_metadata(client, bucket_name, prefix, args.db, workers=args.workers,
+                                 page_size=args.page_size, max_requests_per_sec=args.max_rps,
+                                 split_parts=args.split_parts)
+    except KeyboardInterrupt:
+        logging.info("Interrupted; run again with the same --db to resume")
+        return
+    except Exception as e:
+        logging.error("An error occurred while gathering metadata: %s", e)
+        return
+    logging.info("Listed %d objects in %d prefixes with %d requests in %.1f s (%.0f objects/s)",
+                 totals['objects'], totals['prefixes'], totals['requests'], totals['seconds'], totals['objects_per_sec'])
+    if totals['failed_prefixes']:
+        logging.error("%d prefixes could not be listed; run again to retry them", totals['failed_prefixes'])
+        return
+
+    logging.info("Metadata gathering completed and stored in database.")
+    write_stats_csv(args.db, args.csv)
+    logging.info("Statistics saved to %s", args.csv)
+
+
+if __name__ == "__main__":
+    main()
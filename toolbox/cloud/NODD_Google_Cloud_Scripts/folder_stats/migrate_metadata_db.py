@@ -0,0 +1,171 @@
+"""
+Convert a metadata database to folder_stats_v4's compact schema.
+
+Reads the ``metadata`` table written by folder_stats v2/v3, v4 before
+schema 2, or the 04 Metadata Tool (schema 1: a path, ISO timestamps, a
+base64 MD5 and the download link on every row) and writes the prefixes /
+objects tables described in folder_stats_v4 (schema 2), so a large
+database shrinks and an unfinished v4 crawl can be resumed with the
+current script.
+
+Schema 1 doesn't keep a file's own name; it, the bucket and the generation
+are taken from the file's ``mediaLink``. Files without a usable link keep
+their row under the name ``<unnamed id>`` and are counted in the summary.
+Rows listed twice (a v3 run that was restarted) become one object. The
+bucket, and the root prefix of a v4 crawl, are recorded in ``store_info`` so
+the converted crawl is only resumed for the same bucket path.
+
+By default the database is converted in place and the original is kept
+next to it as ``<db>.v1``; ``--out`` writes the result to a new file
+instead. The 04 Metadata Tool and v3 can't read the converted database.
+
+Usage:
+    python migrate_metadata_db.py metadata.db
+    python migrate_metadata_db.py metadata.db --out metadata_v2.db
+"""
+import os
+import base64
+import sqlite3
+import logging
+import argparse
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from urllib.parse import unquote, urlsplit, parse_qs
+
+import folder_stats_v4
+from folder_stats_v4 import EPOCH, Row
+
+# Source rows converted per batch handed to the writer
+BATCH_ROWS = 50000
+
+
+def iso_to_ms(value: Optional[str]) -> Optional[int]:
+    """A schema-1 timestamp (``datetime.isoformat()`` text) as epoch milliseconds."""
+    if not value:
+        return None
+    return (datetime.fromisoformat(value) - EPOCH) // timedelta(milliseconds=1)
+
+
+def parse_media_link(link: Optional[str]) -> Optional[Tuple[str, str, Optional[int]]]:
+    """``(bucket, object name, generation)`` from a download link, or None if it isn't one."""
+    if not link:
+        return None
+    url = urlsplit(link)
+    parts = url.path.split('/')
+    # /download/storage/v1/b/<bucket>/o/<quoted name>
+    if len(parts) != 8 or parts[4] != 'b' or parts[6] != 'o':
+        return None
+    generation = parse_qs(url.query).get('generation')
+    return unquote(parts[5]), unquote(parts[7]), int(generation[0]) if generation else None
+
+
+def convert_row(row: tuple, stats: dict) -> Row:
+    """A writer row (see ``folder_stats_v4.Row``) from one schema-1 row."""
+    row_id, path, kind, size, time_created, updated, md5, link = row
+    created_ms, updated_ms = iso_to_ms(time_created), iso_to_ms(updated)
+    md5_bytes = base64.b64decode(md5) if md5 else None
+    if kind == 'folder':
+        return (path, '', size, created_ms, updated_ms, md5_bytes, None)
+    parsed = parse_media_link(link)
+    if parsed is None:
+        stats['unnamed'] += 1
+        return (path, f"<unnamed {row_id}>", size, created_ms, updated_ms, md5_bytes, None)
+    bucket, name, generation = parsed
+    stats.setdefault('bucket', bucket)
+    folder, base = folder_stats_v4.split_name(name)
+    return (folder, base, size, created_ms, updated_ms, md5_bytes, generation)
+
+
+def database_size(db_path: str) -> int:
+    return sum(os.path.getsize(p) for p in (db_path, db_path + '-wal') if os.path.exists(p))
+
+
+def migrate(src_path: str, dst_path: str) -> dict:
+    """Write the schema-1 database ``src_path`` as a new schema-2 database ``dst_path``; returns counts."""
+    src = sqlite3.connect(src_path)
+    try:
+        version = src.execute('PRAGMA user_version').fetchone()[0]
+        if version >= folder_stats_v4.SCHEMA_VERSION:
+            raise RuntimeError(f"{src_path} already has schema version {version}")
+        if not src.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'metadata'").fetchone():
+            raise RuntimeError(f"{src_path} has no metadata table; nothing to convert")
+        has_crawl = src.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'crawl_prefixes'").fetchone()
+
+        stats = {'rows': 0, 'unnamed': 0}
+        folder_stats_v4.init_db(dst_path)
+        writer = folder_stats_v4.MetadataWriter(dst_path)
+        writer.start()
+        try:
+            cursor = src.execute('SELECT id, path, type, size, time_created, updated, md5Hash, mediaLink '
+                                 'FROM metadata ORDER BY id')
+            while True:
+                rows = cursor.fetchmany(BATCH_ROWS)
+                if not rows:
+                    break
+                writer.add_rows([convert_row(row, stats) for row in rows])
+                stats['rows'] += len(rows)
+                logging.info("Converted %d rows", stats['rows'])
+        finally:
+            writer.close()
+        crawl_rows = src.execute('SELECT prefix, done FROM crawl_prefixes').fetchall() if has_crawl else []
+    finally:
+        src.close()
+
+    dst = sqlite3.connect(dst_path)
+    try:
+        dst.executemany('INSERT INTO crawl_prefixes (prefix, done) VALUES (?, ?)', crawl_rows)
+        if 'bucket' in stats:
+            dst.execute("INSERT INTO store_info (key, value) VALUES ('bucket', ?)", (stats['bucket'],))
+        if crawl_rows:
+            # A v4 crawl starts from its root and records prefixes below it, so the root is the shortest
+            root = min((prefix for prefix, _ in crawl_rows), key=len)
+            dst.execute("INSERT INTO store_info (key, value) VALUES ('root', ?)", (root,))
+        dst.commit()
+        stats['objects'] = dst.execute('SELECT COUNT(*) FROM objects').fetchone()[0]
+        stats['prefixes'] = dst.execute('SELECT COUNT(*) FROM prefixes').fetchone()[0]
+        # Rows arrive in crawl order, not key order; rebuild the tables densely packed
+        dst.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        dst.execute('VACUUM')
+    finally:
+        dst.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a metadata.db to folder_stats_v4's compact schema")
+    parser.add_argument('db', help='Database with a v3-style metadata table')
+    parser.add_argument('--out', default=None, help='Write the converted database here instead of replacing db')
+    args = parser.parse_args()
+
+    dst_path = args.out or args.db + '.migrating'
+    if os.path.exists(dst_path):
+        print(f"{dst_path} already exists; remove it or choose another --out")
+        return
+    before = database_size(args.db)
+    try:
+        stats = migrate(args.db, dst_path)
+    except (RuntimeError, sqlite3.Error) as e:
+        print(f"Migration failed: {e}")
+        # Leave nothing half-written behind
+        for path in (dst_path, dst_path + '-wal', dst_path + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+        return
+    if not args.out:
+        backup = args.db + '.v1'
+        os.replace(args.db, backup)
+        os.replace(dst_path, args.db)
+        print(f"Converted {args.db} in place; the original is kept as {backup}")
+    else:
+        print(f"Wrote {args.out}")
+    after = database_size(args.out or args.db)
+    print(f"{stats['rows']} rows -> {stats['objects']} objects in {stats['prefixes']} prefixes; "
+          f"{before / 2 ** 20:.1f} MiB -> {after / 2 ** 20:.1f} MiB")
+    if stats['rows'] > stats['objects']:
+        print(f"{stats['rows'] - stats['objects']} duplicate rows were merged")
+    if stats['unnamed']:
+        print(f"{stats['unnamed']} files had no usable mediaLink and were stored as '<unnamed id>'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Multi-job batch mode for NOAA Jetstream.
+
+Reads a job file listing several source -> destination pairs (each with its
+own patterns), plans every job up front, then runs all of them concurrently
+on one shared worker pool. Free worker slots go to the job with the fewest
+uploads in flight, so one large cruise leg can't starve the others. Large
+files can be given their own lane (see ``lanes.py``) shared by all jobs.
+"""
+import json
+import time
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from lanes import DEFAULT_LARGE_THRESHOLD, LaneScheduler
+from upload_engine import LocalFile, TransferSummary, UploadEngine, MAX_LARGE_BACKLOG
+
+
+@dataclass
+class BatchJob:
+    """One source folder -> bucket path pair from a job file."""
+    name: str
+    source_path: str
+    dest_path: str
+    include_patterns: Optional[List[str]] = None
+    exclude_folders: Optional[List[str]] = None
+    exclude_patterns: Optional[List[str]] = None
+
+
+def load_job_file(filepath: str) -> Tuple[List[BatchJob], dict]:
+    """
+    Load jobs and shared settings from a JSON job file.
+
+    Format::
+
+        {
+          "threads": 24,
+          "jobs": [
+            {"name": "leg1", "copy_from": "D:/HA2301/leg1", "bucket_path": "bucket/HA2301/leg1",
+             "exclude_folders": ["_archive"]}
+          ]
+        }
+
+    Pattern keys left out of a job fall back to the UploadConfig defaults.
+    Everything except ``jobs`` is returned as the settings dict.
+    """
+    with open(filepath, 'r') as f:
+        data = json.load(f)
+    jobs = []
+    for i, entry in enumerate(data.get('jobs', [])):
+        jobs.append(BatchJob(
+            name=entry.get('name') or f"job{i + 1}",
+            source_path=entry['copy_from'],
+            dest_path=entry['bucket_path'],
+            include_patterns=entry.get('include_patterns'),
+            exclude_folders=entry.get('exclude_folders'),
+            exclude_patterns=entry.get('exclude_patterns')
+        ))
+    names = [job.name for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError("Job names in the batch file must be unique")
+    settings = {k: v for k, v in data.items() if k != 'jobs'}
+    return jobs, settings
+
+
+@dataclass
+class _JobState:
+    job: BatchJob
+    engine: UploadEngine
+    queue: deque
+    summary: TransferSummary = field(default_factory=TransferSummary)
+    planned_bytes: int = 0
+    in_flight: int = 0
+
+
+class BatchRunner:
+    """
+    Plan and run several jobs on one worker pool.
+
+    Args:
+        jobs: Jobs to run
+        make_engine: Builds the ``UploadEngine`` for a job; engines should share
+            one limiter and bandwidth cap so the budget is global
+        workers: Size of the shared pool
+        large_lane_workers: Workers in a separate lane for large files (0 = one pool)
+        large_lane_threshold: Files of at least this many bytes use the large lane
+    """
+
+    def __init__(self, jobs: List[BatchJob], make_engine: Callable[[BatchJob], UploadEngine], workers: int = 12,
+                 large_lane_workers: int = 0, large_lane_threshold: int = DEFAULT_LARGE_THRESHOLD):
+        self.jobs = jobs
+        self.make_engine = make_engine
+        self.workers = max(1, workers)
+        self.large_lane_workers = large_lane_workers
+        self.large_lane_threshold = large_lane_threshold
+        self.lane_report: dict = {}
+        self.states: Dict[str, _JobState] = {}
+        self.planning_time = 0.0
+
+    def plan(self):
+        """Walk every source and list its destination before anything uploads."""
+        start = time.time()
+        for job in self.jobs:
+            engine = self.make_engine(job)
+            state = _JobState(job, engine, deque())
+            for local in engine.plan(job.source_path, state.summary):
+                state.queue.append(local)
+                state.planned_bytes += local.size
+            self.states[job.name] = state
+        self.planning_time = time.time() - start
+
+    def _next_job(self) -> Optional[_JobState]:
+        waiting = [s for s in self.states.values() if s.queue]
+        if not waiting:
+            return None
+        return min(waiting, key=lambda s: (s.in_flight, s.summary.bytes_copied))
+
+    def run(self) -> dict:
+        """Run all planned jobs; returns the combined report."""
+        if not self.states:
+            self.plan()
+        start = time.time()
+        pending: Dict[object, Tuple[_JobState, LocalFile]] = {}
+
+        def collect(done):
+            for future in done:
+                state, local = pending.pop(future)
+                state.in_flight -= 1
+                state.engine.finish(future, local, state.summary)
+                state.engine.maybe_checkpoint()
+
+        lanes = LaneScheduler(self.workers, self.large_lane_workers, self.large_lane_threshold)
+        # Large files from every job wait here while the large lane is full
+        backlog: deque = deque()
+
+        def send(lane, state, local):
+            lane.assign(local.size)
+            pending[state.engine.submit(lane, local)] = (state, local)
+
+        def feed_large():
+            while backlog and lanes.large.has_room():
+                send(lanes.large, *backlog.popleft())
+
+        with lanes:
+            while True:
+                feed_large()
+                while lanes.small.has_room() and len(backlog) < MAX_LARGE_BACKLOG:
+                    state = self._next_job()
+                    if state is None:
+                        break
+                    local = state.queue.popleft()
+                    state.in_flight += 1
+                    lane = lanes.lane_for(local.size)
+                    if lane is lanes.small:
+                        send(lane, state, local)
+                    else:
+                        backlog.append((state, local))
+                        feed_large()
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        self.lane_report = lanes.report()
+
+        for state in self.states.values():
+            state.engine.checkpoint()
+        return self.report(time.time() - start)
+
+    def report(self, elapsed: float) -> dict:
+        jobs = []
+        for state in self.states.values():
+            s = state.summary
+            jobs.append({
+                'name': state.job.name,
+                'source': state.job.source_path,
+                'destination': state.job.dest_path,
+                'copied': s.copied,
+                'skipped': s.skipped,
+                'failed': s.failed,
+                'bytes_copied': s.bytes_copied,
+                'planned_bytes': state.planned_bytes,
+                'errors': s.errors,
+            })
+        total_bytes = sum(j['bytes_copied'] for j in jobs)
+        return {
+            'jobs': jobs,
+            'copied': sum(j['copied'] for j in jobs),
+            'skipped': sum(j['skipped'] for j in jobs),
+            'failed': sum(j['failed'] for j in jobs),
+            'bytes_copied': total_bytes,
+            'planning_seconds': round(self.planning_time, 3),
+            'transfer_seconds': round(elapsed, 3),
+            'bytes_per_sec': round(total_bytes / elapsed, 1) if elapsed > 0 else 0.0,
+            'lanes': self.lane_report,
+        }
@@ -0,0 +1,76 @@
+"""
+Benchmark: fixed thread counts vs adaptive concurrency against a fault-injecting fake server.
+
+The fake server adds per-request latency, shares a fixed link speed between
+in-flight requests and answers 429/503 once more than ``--capacity``
+requests are in flight, which is what over-eager thread counts run into.
+
+Usage:
+    python benchmarks/bench_adaptive.py [--files 300] [--size-kb 512] [--capacity 16]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from upload_engine import FakeBucketBackend, UploadEngine  # noqa: E402
+from concurrency import AdaptiveConcurrency, FaultInjectingBackend  # noqa: E402
+
+
+def make_files(folder: str, count: int, size: int):
+    os.makedirs(folder, exist_ok=True)
+    payload = os.urandom(size)
+    for i in range(count):
+        with open(os.path.join(folder, f"file_{i:05d}.bin"), 'wb') as f:
+            f.write(payload)
+
+
+def run_once(label: str, source: str, args, threads: int, adaptive: bool):
+    bucket_root = tempfile.mkdtemp(prefix='jetstream_bench_bucket_')
+    try:
+        backend = FaultInjectingBackend(
+            FakeBucketBackend(bucket_root, 'bench'),
+            latency=args.latency,
+            link_mbit_per_sec=args.link_mbit,
+            capacity=args.capacity,
+            seed=1
+        )
+        limiter = AdaptiveConcurrency(initial=threads, max_limit=args.max_threads, window=0.5) if adaptive else None
+        engine = UploadEngine(backend, 'gs://bench/run', workers=threads, limiter=limiter, max_retries=10)
+        start = time.perf_counter()
+        summary = engine.run(source)
+        elapsed = time.perf_counter() - start
+        mb = summary.bytes_copied / 1e6
+        final = f" final limit {limiter.limit}" if limiter else ''
+        print(f"{label:<16} {elapsed:7.2f}s {mb / elapsed:8.1f} MB/s  "
+              f"{backend.injected_errors:4d} throttled of {backend.requests:5d} requests  "
+              f"{summary.failed} failed{final}")
+    finally:
+        shutil.rmtree(bucket_root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark adaptive upload concurrency')
+    parser.add_argument('--files', type=int, default=300)
+    parser.add_argument('--size-kb', type=int, default=512)
+    parser.add_argument('--capacity', type=int, default=16, help='In-flight requests before the fake server throttles')
+    parser.add_argument('--latency', type=float, default=0.05, help='Per-request latency in seconds')
+    parser.add_argument('--link-mbit', type=float, default=400.0, help='Simulated link speed in Mbit/s')
+    parser.add_argument('--max-threads', type=int, default=64)
+    args = parser.parse_args()
+
+    source = tempfile.mkdtemp(prefix='jetstream_bench_src_')
+    try:
+        make_files(source, args.files, args.size_kb * 1024)
+        for threads in (4, 12, 24, 48):
+            run_once(f"fixed {threads}", source, args, threads, adaptive=False)
+        run_once("adaptive", source, args, 4, adaptive=True)
+    finally:
+        shutil.rmtree(source, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark: per-run credentials and clients vs the shared credential cache.
+
+Starts a local stub of Google's OAuth token endpoint (it answers every
+refresh with a new access token after --token-latency seconds) and writes an
+authorized-user token file that points at it. Then runs --jobs jobs that
+each need an authorized Storage client:
+
+    per-run   reads the token file and builds a new storage.Client every job,
+              as the tools did before; every job exchanges the refresh token
+    shared    CredentialCache + shared_storage_client: one token exchange,
+              one client, reused by every job in the process
+
+A second process is started afterwards to show that the refreshed token
+saved by the shared cache is reused across runs without another exchange.
+No request ever reaches Google.
+
+Usage:
+    python benchmarks/bench_auth.py [--jobs 20] [--token-latency 0.3]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import credential_cache  # noqa: E402
+from credential_cache import CredentialCache, TOKEN_CACHE_ENV  # noqa: E402
+
+
+class TokenStub(ThreadingHTTPServer):
+    """Local stand-in for https://oauth2.googleapis.com/token."""
+
+    def __init__(self, latency: float, expires_in: int = 3600):
+        self.latency = latency
+        self.expires_in = expires_in
+        self.requests = 0
+        self._lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), _TokenHandler)
+
+    @property
+    def token_uri(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/token"
+
+
+class _TokenHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.server._lock:
+            self.server.requests += 1
+            n = self.server.requests
+        time.sleep(self.server.latency)
+        body = json.dumps({'access_token': f'stub-token-{n}', 'expires_in': self.server.expires_in,
+                           'token_type': 'Bearer'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def write_token_file(path: str, token_uri: str):
+    """An authorized-user file with a refresh token and no valid access token yet."""
+    with open(path, 'w') as f:
+        json.dump({'type': 'authorized_user', 'client_id': 'stub-client', 'client_secret': 'stub-secret',
+                   'refresh_token': 'stub-refresh', 'token_uri': token_uri}, f)
+
+
+def per_run_job(token_path: str):
+    from google.auth.transport.requests import Request
+    from google.cloud import storage
+    credentials = CredentialCache(token_path, legacy_path=None)._read(token_path)
+    client = storage.Client(project=None, credentials=credentials)
+    # A fresh client's first request exchanges the refresh token
+    credentials.refresh(Request())
+    client.close()
+
+
+def shared_job(cache: CredentialCache):
+    credential_cache.shared_storage_client(12, cache=cache)
+    cache.ensure_fresh()
+
+
+def timed(label: str, run, jobs: int, stub: TokenStub):
+    before = stub.requests
+    start = time.perf_counter()
+    for _ in range(jobs):
+        run()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<10} {elapsed:>7.2f}s  {elapsed / jobs * 1000:>7.1f} ms/job  "
+          f"{stub.requests - before:>3} token requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark credential and client reuse')
+    parser.add_argument('--jobs', type=int, default=20, help='Jobs that each need an authorized client')
+    parser.add_argument('--token-latency', type=float, default=0.3, help='Seconds the stub takes per token request')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # Second run: the token saved by the first run should still be fresh
+        cache = CredentialCache(args.child, legacy_path=None)
+        cache.get()
+        print(f"  next run   reused saved token: {cache.refreshes == 0}")
+        return
+
+    work_dir = tempfile.mkdtemp(prefix='jetstream_auth_')
+    stub = TokenStub(args.token_latency)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    try:
+        legacy_path = os.path.join(work_dir, 'credentials.json')
+        write_token_file(legacy_path, stub.token_uri)
+        print(f"{args.jobs} jobs, token endpoint latency {args.token_latency * 1000:g} ms:")
+        timed('per-run', lambda: per_run_job(legacy_path), args.jobs, stub)
+
+        cache_path = os.path.join(work_dir, 'google_token.json')
+        os.environ[TOKEN_CACHE_ENV] = cache_path
+        cache = CredentialCache(cache_path, legacy_path=legacy_path)
+        timed('shared', lambda: shared_job(cache), args.jobs, stub)
+        cache.save_if_refreshed()
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--child', cache_path], check=True)
+    finally:
+        credential_cache.reset_shared_client()
+        stub.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
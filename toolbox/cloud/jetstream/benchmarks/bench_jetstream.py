@@ -0,0 +1,319 @@
+"""
+Benchmark: end-to-end native engine runs against a local fake bucket.
+
+Generates a synthetic archive tree (tiny text/CSV/JSON files, JPG and RAW
+images, large videos, deep nesting and folders that should be excluded such
+as ``_archive`` and ``Products``), then runs several scenarios against
+``FakeBucketBackend``:
+
+    cold        empty bucket, everything uploads
+    warm        nothing changed, bucket listed and compared
+    warm_index  nothing changed, change index instead of a listing
+    warm_listing  nothing changed, bucket listing served from the listing cache
+    plan        write a transfer plan (listing + walk + compare only)
+    packed      empty bucket, small files packed into tar shards
+
+Each scenario runs in a fresh process so peak RSS is its own. Reported per
+scenario: files/sec, MB/sec, planning and transfer time, peak RSS. Results
+are saved as JSON under ``benchmarks/results/`` (named by time and git
+commit) so releases can be compared with ``--compare``.
+
+Planning is measured separately by collecting the planned files before
+uploading them, which holds the file list in memory (a normal run streams it).
+
+Usage:
+    python benchmarks/bench_jetstream.py [--tiny-files 5000] [--video-mb 2048] [--latency 0.02]
+    python benchmarks/bench_jetstream.py --compare benchmarks/results/<earlier>.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from upload_engine import FakeBucketBackend, TransferSummary, UploadEngine  # noqa: E402
+from change_index import ChangeIndex  # noqa: E402
+from checksums import ChecksumCache  # noqa: E402
+from listing_cache import ListingCache  # noqa: E402
+from concurrency import FaultInjectingBackend  # noqa: E402
+from resumable_upload import ChunkedUploader, SessionJournal  # noqa: E402
+from tar_shards import ShardPacker  # noqa: E402
+from transfer_plan import write_plan  # noqa: E402
+
+SCENARIOS = ['cold', 'warm', 'warm_index', 'warm_listing', 'plan', 'packed']
+EXCLUDED_FOLDERS = ['_archive', 'Products', 'Corrected', 'MISC', 'DARK']
+DEFAULT_EXCLUDE_FOLDERS = [
+    "_archive", "_YEAR", "ISLAND", "SITE-ID", "SITE_PHOTOS", "Corrected", "corrected", "uncorrected",
+    "MISC", "DARK", "Products", "Thumbs.db", ".DS_Store", "__pycache__"
+]
+DEFAULT_EXCLUDE_PATTERNS = [r'.*\.tmp$', r'.*\.bak$', r'.*~$', r'.*\.pyc$']
+BLOCK = 1024 * 1024
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, if the platform reports it."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / 1e6 if sys.platform == 'darwin' else peak / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / 1e6, 1)
+    except Exception:
+        return None
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True, text=True)
+        return out.stdout.strip() or 'unknown'
+    except OSError:
+        return 'unknown'
+
+
+# -- synthetic tree ---------------------------------------------------------------
+
+def _write(path: str, size: int, block: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            f.write(block[:min(remaining, len(block))])
+            remaining -= len(block)
+
+
+def _folder(rng: random.Random, depth: int, excluded_share: float) -> str:
+    parts = [f"survey_{rng.randrange(4)}"] + [f"level{d}_{rng.randrange(6)}" for d in range(rng.randrange(1, depth + 1))]
+    if rng.random() < excluded_share:
+        parts.insert(rng.randrange(1, len(parts) + 1), rng.choice(EXCLUDED_FOLDERS))
+    return os.path.join(*parts)
+
+
+def generate_tree(root: str, args) -> dict:
+    """Write the synthetic tree under ``root`` and return what was generated."""
+    rng = random.Random(args.seed)
+    block = os.urandom(BLOCK)
+    groups = [
+        ('tiny', args.tiny_files, ('txt', 'csv', 'json'), lambda: rng.randrange(200, 4096)),
+        ('image', args.images, ('jpg', 'JPG', 'png'), lambda: int(args.image_kb * 1024 * rng.uniform(0.5, 1.5))),
+        ('raw', args.raws, ('cr2', 'nef', 'dng'), lambda: int(args.raw_mb * BLOCK * rng.uniform(0.8, 1.2))),
+        ('video', args.videos, ('mp4', 'mov'), lambda: args.video_mb * BLOCK),
+    ]
+    counts = {}
+    total_bytes = 0
+    for name, count, extensions, size_of in groups:
+        for i in range(count):
+            size = size_of()
+            folder = _folder(rng, args.depth, args.excluded_share)
+            # Tiny files vary their content so checksums differ; big ones reuse the block
+            data = os.urandom(size) if size < 4096 else block
+            _write(os.path.join(root, folder, f"{name}_{i:06d}.{rng.choice(extensions)}"), size, data)
+            total_bytes += size
+        counts[name] = count
+    return {'files': counts, 'bytes': total_bytes}
+
+
+# -- scenarios --------------------------------------------------------------------
+
+def _backend(args, bucket_root: str):
+    backend = FakeBucketBackend(bucket_root, 'bench')
+    if args.latency or args.link_mbit:
+        backend = FaultInjectingBackend(backend, latency=args.latency, link_mbit_per_sec=args.link_mbit or 1e6,
+                                        capacity=10 ** 6, seed=1)
+    return backend
+
+
+def _engine(args, backend, work_dir: str, index=None, packer=None, checksum_cache=None,
+            listing_cache=None) -> UploadEngine:
+    journal = SessionJournal(os.path.join(work_dir, 'sessions.db'))
+    return UploadEngine(
+        backend, 'gs://bench/archive',
+        exclude_folders=DEFAULT_EXCLUDE_FOLDERS,
+        exclude_patterns=DEFAULT_EXCLUDE_PATTERNS,
+        workers=args.threads,
+        index=index,
+        chunked_uploader=ChunkedUploader(backend, journal),
+        large_file_threshold=512 * BLOCK,
+        checksum_cache=checksum_cache,
+        packer=packer,
+        listing_cache=listing_cache,
+    )
+
+
+def _timed_run(engine: UploadEngine, source: str) -> dict:
+    summary = TransferSummary()
+    start = time.perf_counter()
+    files = list(engine.plan(source, summary))
+    planned = time.perf_counter()
+    engine.run_files(files, summary)
+    done = time.perf_counter()
+    return {
+        'copied': summary.copied,
+        'skipped': summary.skipped,
+        'failed': summary.failed,
+        'bytes': summary.bytes_copied,
+        'planning_seconds': planned - start,
+        'transfer_seconds': done - planned,
+    }
+
+
+def run_scenario(name: str, args, source: str, bucket_root: str, work_dir: str) -> dict:
+    """Run one scenario; expects ``bucket_root`` to already hold a full upload for the warm ones."""
+    backend = _backend(args, bucket_root)
+    if name in ('cold', 'warm', 'packed'):
+        cache = ChecksumCache(os.path.join(work_dir, f'{name}_checksums.db'))
+        packer = ShardPacker('archive', spool_dir=work_dir) if name == 'packed' else None
+        result = _timed_run(_engine(args, backend, work_dir, packer=packer, checksum_cache=cache), source)
+        cache.close()
+    elif name == 'warm_index':
+        index = ChangeIndex(os.path.join(work_dir, 'index.db'), 'gs://bench/archive')
+        _timed_run(_engine(args, backend, work_dir, index=index), source)  # seeds the index from the listing
+        result = _timed_run(_engine(args, backend, work_dir, index=index), source)
+        index.close()
+    elif name == 'warm_listing':
+        listing_cache = ListingCache(os.path.join(work_dir, 'listings.db'), max_age=3600)
+        _timed_run(_engine(args, backend, work_dir, listing_cache=listing_cache), source)  # fills the cache
+        result = _timed_run(_engine(args, backend, work_dir, listing_cache=listing_cache), source)
+        listing_cache.close()
+    elif name == 'plan':
+        engine = _engine(args, backend, work_dir)
+        start = time.perf_counter()
+        totals = write_plan(os.path.join(work_dir, 'plan.jsonl.gz'), engine, source, 'gs://bench/archive')
+        result = {'copied': 0, 'skipped': totals['skip']['files'] + totals['upload']['files'], 'failed': 0, 'bytes': 0,
+                  'planning_seconds': time.perf_counter() - start, 'transfer_seconds': 0.0}
+    else:
+        raise ValueError(f"Unknown scenario {name}")
+    total = result['planning_seconds'] + result['transfer_seconds']
+    files = result['copied'] + result['skipped']
+    result.update({
+        'scenario': name,
+        'files_per_sec': round(files / total, 1) if total > 0 else 0.0,
+        'mb_per_sec': round(result['bytes'] / 1e6 / result['transfer_seconds'], 1) if result['transfer_seconds'] > 0 else 0.0,
+        'planning_seconds': round(result['planning_seconds'], 3),
+        'transfer_seconds': round(result['transfer_seconds'], 3),
+        'peak_rss_mb': peak_rss_mb(),
+    })
+    return result
+
+
+def _child(queue, name, args, source, bucket_root, work_dir):
+    try:
+        queue.put(run_scenario(name, args, source, bucket_root, work_dir))
+    except Exception as e:  # report instead of hanging the parent
+        queue.put({'scenario': name, 'error': repr(e)})
+
+
+def run_isolated(name: str, args, source: str, bucket_root: str, work_dir: str) -> dict:
+    """Run a scenario in a freshly spawned process so peak RSS isn't shared."""
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_child, args=(queue, name, args, source, bucket_root, work_dir))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+# -- reporting --------------------------------------------------------------------
+
+def print_results(results, previous=None):
+    before = {r['scenario']: r for r in (previous or {}).get('scenarios', [])}
+    print(f"{'scenario':<13} {'files/s':>10} {'MB/s':>8} {'plan s':>8} {'xfer s':>8} {'RSS MB':>8}")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['scenario']:<13} failed: {r['error']}")
+            continue
+        line = (f"{r['scenario']:<13} {r['files_per_sec']:>10.1f} {r['mb_per_sec']:>8.1f} "
+                f"{r['planning_seconds']:>8.2f} {r['transfer_seconds']:>8.2f} {r['peak_rss_mb'] or 0:>8.1f}")
+        old = before.get(r['scenario'])
+        if old and old.get('files_per_sec'):
+            line += f"   files/s {100 * (r['files_per_sec'] / old['files_per_sec'] - 1):+.1f}% vs {previous['commit']}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmark of the Jetstream native engine')
+    parser.add_argument('--tiny-files', type=int, default=5000, help='Small .txt/.csv/.json files')
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--image-kb', type=int, default=2048)
+    parser.add_argument('--raws', type=int, default=20)
+    parser.add_argument('--raw-mb', type=int, default=25)
+    parser.add_argument('--videos', type=int, default=1)
+    parser.add_argument('--video-mb', type=int, default=256, help='Size of each video (use 2048+ for multi-GB)')
+    parser.add_argument('--depth', type=int, default=6, help='Maximum folder nesting')
+    parser.add_argument('--excluded-share', type=float, default=0.1, help='Share of files placed under excluded folders')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--threads', type=int, default=12)
+    parser.add_argument('--latency', type=float, default=0.0, help='Simulated per-request latency of the fake bucket (seconds)')
+    parser.add_argument('--link-mbit', type=float, default=0.0, help='Simulated link speed in Mbit/s (0 = local disk speed)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated scenarios to run')
+    parser.add_argument('--work-dir', default=None, help='Where the tree and fake bucket are written (temp folder by default)')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated tree and bucket')
+    parser.add_argument('--results-dir', default=os.path.join(BENCH_DIR, 'results'))
+    parser.add_argument('--compare', default=None, help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"Unknown scenario {name}; choose from {', '.join(SCENARIOS)}")
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='jetstream_bench_')
+    os.makedirs(work_dir, exist_ok=True)
+    source = os.path.join(work_dir, 'source')
+    bucket_root = os.path.join(work_dir, 'bucket')
+    try:
+        start = time.perf_counter()
+        tree = generate_tree(source, args)
+        print(f"Generated {sum(tree['files'].values()):,} files ({tree['bytes'] / 1e9:.2f} GB) "
+              f"in {time.perf_counter() - start:.1f}s under {source}")
+
+        results = []
+        for name in scenarios:
+            seeded = os.path.isdir(os.path.join(bucket_root, 'bench'))
+            if name in ('warm', 'warm_index', 'warm_listing', 'plan') and not seeded:
+                run_isolated('cold', args, source, bucket_root, work_dir)  # the warm scenarios need a full bucket
+            if name == 'packed' or (name == 'cold' and seeded):
+                target = tempfile.mkdtemp(prefix=f'bucket_{name}_', dir=work_dir)
+            else:
+                target = bucket_root
+            results.append(run_isolated(name, args, source, target, work_dir))
+
+        report = {
+            'commit': git_commit(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'tree': tree,
+            'settings': {k: v for k, v in vars(args).items() if k not in ('compare', 'results_dir', 'work_dir', 'keep')},
+            'scenarios': results,
+        }
+        previous = None
+        if args.compare:
+            with open(args.compare, 'r') as f:
+                previous = json.load(f)
+        print_results(results, previous)
+
+        os.makedirs(args.results_dir, exist_ok=True)
+        out_path = os.path.join(args.results_dir, f"jetstream_{time.strftime('%Y%m%d-%H%M%S')}_{report['commit']}.json")
+        with open(out_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {out_path}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: one upload queue vs separate small- and large-file lanes.
+
+Builds a mixed tree (many small sidecar files plus a few large files whose
+names sort first, so a single queue meets them early) and uploads it to a
+fault-injecting fake server that adds per-request latency and shares a
+fixed link speed between in-flight requests. Each run reports:
+
+    total     wall time for the whole tree
+    small     when the last small file finished, and small files/sec
+    large     MB/sec over the large files
+    lanes     per-lane utilization from the engine's lane report
+
+Usage:
+    python benchmarks/bench_lanes.py [--small-files 3000] [--large-files 12] [--large-mb 24]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from upload_engine import FakeBucketBackend, UploadEngine  # noqa: E402
+from concurrency import FaultInjectingBackend  # noqa: E402
+
+
+def make_tree(folder: str, small_files: int, small_size: int, large_files: int, large_size: int):
+    os.makedirs(folder, exist_ok=True)
+    large = os.urandom(large_size)
+    for i in range(large_files):
+        with open(os.path.join(folder, f"a_video_{i:03d}.mp4"), 'wb') as f:
+            f.write(large)
+    small = os.urandom(small_size)
+    for i in range(small_files):
+        with open(os.path.join(folder, f"b_sidecar_{i:06d}.json"), 'wb') as f:
+            f.write(small)
+
+
+def run_once(label: str, source: str, args, large_lane_workers: int):
+    bucket_root = tempfile.mkdtemp(prefix='jetstream_bench_bucket_')
+    threshold = args.threshold_mb * 1024 * 1024
+    finished = {'small': 0.0, 'large': 0.0}
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def on_result(status, local, error):
+        kind = 'large' if local.size >= threshold else 'small'
+        with lock:
+            finished[kind] = max(finished[kind], time.perf_counter() - start)
+
+    try:
+        backend = FaultInjectingBackend(
+            FakeBucketBackend(bucket_root, 'bench'),
+            latency=args.latency,
+            link_mbit_per_sec=args.link_mbit,
+            capacity=10 ** 6,
+            seed=1
+        )
+        engine = UploadEngine(backend, 'gs://bench/run', workers=args.workers, on_result=on_result,
+                              large_lane_workers=large_lane_workers, large_lane_threshold=threshold)
+        start = time.perf_counter()
+        summary = engine.run(source)
+        elapsed = time.perf_counter() - start
+        large_mb = args.large_files * args.large_mb * 1024 * 1024 / 1e6
+        lanes = ', '.join(f"{name} {lane['utilization'] * 100:.0f}%"
+                          for name, lane in summary.lanes['lanes'].items())
+        print(f"{label:<22} total {elapsed:6.2f}s  small done {finished['small']:6.2f}s "
+              f"({args.small_files / max(finished['small'], 1e-9):7.1f} files/s)  "
+              f"large {large_mb / max(finished['large'], 1e-9):6.1f} MB/s  busy: {lanes}  "
+              f"{summary.failed} failed")
+    finally:
+        shutil.rmtree(bucket_root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark size-aware upload lanes')
+    parser.add_argument('--small-files', type=int, default=3000)
+    parser.add_argument('--small-kb', type=int, default=8)
+    parser.add_argument('--large-files', type=int, default=12)
+    parser.add_argument('--large-mb', type=int, default=24)
+    parser.add_argument('--threshold-mb', type=int, default=16, help='Files at least this large use the large lane')
+    parser.add_argument('--workers', type=int, default=12, help='Workers in the single queue / small lane')
+    parser.add_argument('--latency', type=float, default=0.02, help='Per-request latency in seconds')
+    parser.add_argument('--link-mbit', type=float, default=1000.0, help='Simulated link speed in Mbit/s')
+    args = parser.parse_args()
+
+    source = tempfile.mkdtemp(prefix='jetstream_bench_src_')
+    try:
+        make_tree(source, args.small_files, args.small_kb * 1024, args.large_files, args.large_mb * 1024 * 1024)
+        print(f"{args.small_files} x {args.small_kb} KB + {args.large_files} x {args.large_mb} MB, "
+              f"{args.workers} workers, {args.link_mbit:g} Mbit/s link, {args.latency * 1000:g} ms latency")
+        run_once("one queue", source, args, 0)
+        for large_workers in (1, 2, 4):
+            run_once(f"lanes (+{large_workers} large)", source, args, large_workers)
+    finally:
+        shutil.rmtree(source, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
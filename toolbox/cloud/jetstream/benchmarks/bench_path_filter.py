@@ -0,0 +1,70 @@
+"""
+Benchmark: gsutil-style exclude regex vs PathFilter on a synthetic path list.
+
+Builds an in-memory tree of relative paths (default 1,000,000) where a share
+of the files sit under excluded folders such as ``_archive`` and ``Products``,
+then reports paths/sec for both filters. No files are written to disk.
+
+Usage:
+    python benchmarks/bench_path_filter.py [--paths 1000000]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from path_filter import PathFilter  # noqa: E402
+
+EXCLUDE_FOLDERS = [
+    "_archive", "_YEAR", "ISLAND", "SITE-ID", "SITE_PHOTOS",
+    "Corrected", "corrected", "uncorrected", "MISC", "DARK",
+    "Products", "Thumbs.db", ".DS_Store", "__pycache__"
+]
+EXCLUDE_PATTERNS = [r'.*\.tmp$', r'.*\.bak$', r'.*~$', r'.*\.pyc$']
+EXTENSIONS = ['jpg', 'JPG', 'png', 'cr2', 'mp4', 'txt', 'csv', 'json', 'tmp', 'bak']
+
+
+def synthetic_paths(count: int, excluded_share: float = 0.2, seed: int = 7):
+    """Return ``count`` relative paths, roughly ``excluded_share`` under excluded folders."""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        parts = [f"survey_{rng.randrange(20)}", f"site_{rng.randrange(200)}", f"day_{rng.randrange(30)}"]
+        if rng.random() < excluded_share:
+            parts.insert(rng.randrange(len(parts) + 1), rng.choice(EXCLUDE_FOLDERS[:11]))
+        parts.append(f"IMG_{i:07d}.{rng.choice(EXTENSIONS)}")
+        paths.append('/'.join(parts))
+    return paths
+
+
+def gsutil_style_filter():
+    folder_patterns = [f'.*{folder}.*' for folder in EXCLUDE_FOLDERS]
+    exclude_re = re.compile('|'.join(folder_patterns + EXCLUDE_PATTERNS))
+    return lambda p: exclude_re.match(p) is None
+
+
+def run(name, accept, paths):
+    start = time.perf_counter()
+    kept = sum(1 for p in paths if accept(p))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24} {len(paths) / elapsed:>14,.0f} paths/sec   kept {kept:,} of {len(paths):,}")
+    return kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Jetstream path filtering')
+    parser.add_argument('--paths', type=int, default=1_000_000, help='Number of synthetic paths')
+    args = parser.parse_args()
+
+    print(f"Generating {args.paths:,} synthetic paths...")
+    paths = synthetic_paths(args.paths)
+    path_filter = PathFilter(None, EXCLUDE_FOLDERS, EXCLUDE_PATTERNS)
+    run('gsutil-style regex', gsutil_style_filter(), paths)
+    run('PathFilter', path_filter.accepts, paths)
+
+
+if __name__ == '__main__':
+    main()
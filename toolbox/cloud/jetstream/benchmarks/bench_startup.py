@@ -0,0 +1,98 @@
+"""
+Benchmark: how long the headless CLI takes to start.
+
+Runs ``python -X importtime -c "import jetstream"`` in fresh interpreters
+and reads the cumulative import time of ``jetstream`` (median of --runs),
+then times ``python jetstream.py --cli --help`` end to end. The slowest
+modules jetstream pulls in are listed so a regression is easy to trace.
+
+Exits with status 1 if the median import time is over --budget-ms, or if
+any module that only the GUI or the OAuth sign-in needs (gooey, wx,
+google_auth_oauthlib, google-cloud-storage, ...) is loaded at import, so
+it can guard scripted and CI runs.
+
+Usage:
+    python benchmarks/bench_startup.py [--budget-ms 250] [--runs 5]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from typing import List, Tuple
+
+JETSTREAM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded lazily by the GUI, the OAuth flow or GCSBackend; never on plain import
+DEFERRED_MODULES = ('gooey', 'wx', 'google_auth_oauthlib', 'google.oauth2.credentials',
+                    'google.cloud.storage', 'requests')
+
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, int, str]]:
+    """Return ``(depth, self_us, cumulative_us, module)`` for each ``-X importtime`` line."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((depth, int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+
+def import_jetstream() -> List[Tuple[int, int, int, str]]:
+    """Import jetstream in a fresh interpreter; returns jetstream and everything it imported."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import jetstream'],
+                            cwd=JETSTREAM_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import jetstream failed:\n{result.stderr[-2000:]}")
+    rows = parse_importtime(result.stderr)
+    end = next(i for i, row in enumerate(rows) if row[0] == 0 and row[3] == 'jetstream')
+    start = end
+    # Output is in completion order, so jetstream's imports come right before it
+    while start > 0 and rows[start - 1][0] > 0:
+        start -= 1
+    return rows[start:end + 1]
+
+
+def time_cli_help() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, 'jetstream.py', '--cli', '--help'], cwd=JETSTREAM_DIR,
+                   capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Jetstream CLI start-up time')
+    parser.add_argument('--budget-ms', type=float, default=250, help='Fail if importing jetstream takes longer (median)')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to measure')
+    parser.add_argument('--top', type=int, default=10, help='Slowest imported modules to list')
+    args = parser.parse_args()
+
+    samples = [import_jetstream() for _ in range(max(1, args.runs))]
+    import_ms = statistics.median(rows[-1][2] for rows in samples) / 1000
+    help_s = min(time_cli_help() for _ in range(max(1, args.runs)))
+
+    print(f"import jetstream      {import_ms:>8.1f} ms (median of {len(samples)}, budget {args.budget_ms:g} ms)")
+    print(f"jetstream.py --cli --help {help_s * 1000:>6.1f} ms wall (best of {len(samples)})")
+    print(f"slowest modules imported by jetstream (self time):")
+    for _, self_us, cumulative_us, name in sorted(samples[-1][:-1], key=lambda r: -r[1])[:args.top]:
+        print(f"  {name:<40} {self_us / 1000:>7.1f} ms  ({cumulative_us / 1000:.1f} ms with its imports)")
+
+    loaded = {row[3] for rows in samples for row in rows}
+    deferred = [name for name in DEFERRED_MODULES if name in loaded]
+    ok = True
+    if deferred:
+        print(f"FAIL: loaded at import but should be deferred: {', '.join(deferred)}")
+        ok = False
+    if import_ms > args.budget_ms:
+        print(f"FAIL: import took {import_ms:.1f} ms, over the {args.budget_ms:g} ms budget")
+        ok = False
+    if ok:
+        print("OK")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
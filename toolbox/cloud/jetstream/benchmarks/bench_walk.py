@@ -0,0 +1,175 @@
+"""
+Benchmark: os.walk + stat vs PathFilter.walk vs ParallelWalker.
+
+Writes a synthetic tree of empty files (default 20,000 files in nested
+survey/site/day folders, some under excluded folders such as ``_archive``)
+and times three walkers that each collect ``(path, size, mtime)`` for every
+file that would be uploaded:
+
+    os.walk      os.walk + os.stat per file, filtering afterwards (gsutil-like)
+    serial       PathFilter.walk (single thread, excluded folders pruned)
+    parallel     ParallelWalker with --workers threads
+
+Run once on local disk and once with ``--latency`` to simulate a network
+share: every directory listing and every stat then waits that many seconds,
+as a round trip to an SMB/NFS server would.
+
+Usage:
+    python benchmarks/bench_walk.py [--files 20000] [--workers 16] [--latency 0.002]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from path_filter import PathFilter  # noqa: E402
+from parallel_walk import ParallelWalker  # noqa: E402
+
+EXCLUDE_FOLDERS = ["_archive", "Products", "Corrected", "MISC", "DARK", "Thumbs.db", "__pycache__"]
+EXCLUDE_PATTERNS = [r'.*\.tmp$', r'.*\.bak$']
+
+
+def make_tree(root: str, files: int, excluded_share: float = 0.1, seed: int = 7):
+    rng = random.Random(seed)
+    for i in range(files):
+        parts = [f"survey_{rng.randrange(5)}", f"site_{rng.randrange(40)}", f"day_{rng.randrange(10)}"]
+        if rng.random() < excluded_share:
+            parts.insert(rng.randrange(1, len(parts) + 1), rng.choice(EXCLUDE_FOLDERS[:5]))
+        folder = os.path.join(root, *parts)
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"IMG_{i:06d}.{rng.choice(['jpg', 'txt', 'tmp'])}"), 'wb'):
+            pass
+
+
+class _SlowEntry:
+    """``os.DirEntry`` stand-in whose ``stat`` costs a round trip."""
+
+    def __init__(self, entry, latency: float):
+        self._entry = entry
+        self._latency = latency
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks=True):
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+    def __getattr__(self, name):
+        return getattr(self._entry, name)
+
+    def stat(self, follow_symlinks=True):
+        time.sleep(self._latency)
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+
+class _SlowScandir:
+    def __init__(self, path, latency: float):
+        time.sleep(latency)
+        self._entries = iter([_SlowEntry(e, latency) for e in _real_scandir(path)])
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._entries)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_real_scandir = os.scandir
+_real_stat = os.stat
+
+
+def inject_latency(latency: float):
+    """Make every directory listing and stat wait ``latency`` seconds (0 restores the real calls)."""
+    if latency <= 0:
+        os.scandir, os.stat = _real_scandir, _real_stat
+        return
+
+    def slow_stat(path, *args, **kwargs):
+        time.sleep(latency)
+        return _real_stat(path, *args, **kwargs)
+
+    os.scandir = lambda path='.': _SlowScandir(path, latency)
+    os.stat = slow_stat
+
+
+def walk_os(root: str, path_filter: PathFilter):
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(path, root).replace(os.sep, '/')
+            if not path_filter.accepts(rel_path):
+                continue
+            st = os.stat(path)
+            found.append((path, st.st_size, int(st.st_mtime)))
+    return found
+
+
+def walk_serial(root: str, path_filter: PathFilter):
+    return [(path, st.st_size, int(st.st_mtime)) for path, _, st in path_filter.walk(root)]
+
+
+def walk_parallel(root: str, path_filter: PathFilter, workers: int):
+    walker = ParallelWalker(path_filter, workers=workers)
+    return [(path, size, mtime) for batch in walker.walk_batches(root) for path, _, size, mtime in batch]
+
+
+def run(name, walk, total_files):
+    start = time.perf_counter()
+    found = walk()
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<10} {elapsed:>8.2f}s {total_files / elapsed:>12,.0f} files/sec   kept {len(found):,}")
+    return sorted(p for p, _, _ in found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Jetstream source walking')
+    parser.add_argument('--files', type=int, default=20_000, help='Files in the synthetic tree')
+    parser.add_argument('--workers', type=int, default=16, help='ParallelWalker threads')
+    parser.add_argument('--latency', type=float, default=0.002,
+                        help='Simulated seconds per listing/stat for the network share run (0 skips it)')
+    parser.add_argument('--work-dir', default=None, help='Where the tree is written (temp folder by default)')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='jetstream_walk_', dir=args.work_dir)
+    try:
+        make_tree(root, args.files)
+        path_filter = PathFilter(None, EXCLUDE_FOLDERS, EXCLUDE_PATTERNS)
+        runs = [('local disk', 0.0)]
+        if args.latency > 0:
+            runs.append((f'network share ({args.latency * 1000:g} ms per call)', args.latency))
+        for label, latency in runs:
+            print(f"{label}:")
+            inject_latency(latency)
+            try:
+                expected = run('os.walk', lambda: walk_os(root, path_filter), args.files)
+                serial = run('serial', lambda: walk_serial(root, path_filter), args.files)
+                parallel = run('parallel', lambda: walk_parallel(root, path_filter, args.workers), args.files)
+            finally:
+                inject_latency(0)
+            if not expected == serial == parallel:
+                print("  WARNING: walkers found different files")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
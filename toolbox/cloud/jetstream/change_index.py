@@ -0,0 +1,115 @@
+"""
+Persistent local change index for NOAA Jetstream.
+
+Records the size, mtime, checksum and uploaded generation of every file the
+native engine has transferred, so later runs can skip unchanged files without
+listing the bucket. The index is a SQLite database kept in the log directory.
+"""
+import os
+import time
+import sqlite3
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+INDEX_FILENAME = 'jetstream_state.db'
+
+
+@dataclass
+class IndexEntry:
+    """What the index remembers about one uploaded file."""
+    rel_path: str
+    size: int
+    mtime: int
+    checksum: Optional[str]
+    generation: Optional[int]
+
+
+class ChangeIndex:
+    """
+    SQLite index of uploaded files, keyed by destination and relative path.
+
+    One database can serve several destinations; every lookup is scoped to the
+    ``dest_path`` the index was opened for. Writes are committed every
+    ``commit_every`` records and on ``close``.
+    """
+
+    def __init__(self, db_path: str, dest_path: str, commit_every: int = 1000, conn: Optional[sqlite3.Connection] = None):
+        self.db_path = db_path
+        self.dest_path = dest_path
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        self._owns_conn = conn is None
+        self.conn = conn or sqlite3.connect(db_path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                dest TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                checksum TEXT,
+                generation INTEGER,
+                uploaded_at INTEGER,
+                PRIMARY KEY (dest, path)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    @classmethod
+    def for_log_directory(cls, log_directory: str, dest_path: str) -> 'ChangeIndex':
+        """Open (or create) the index stored next to the transfer logs."""
+        return cls(os.path.join(log_directory, INDEX_FILENAME), dest_path)
+
+    def for_destination(self, dest_path: str) -> 'ChangeIndex':
+        """Another view of the same database, scoped to ``dest_path`` and sharing this connection."""
+        return ChangeIndex(self.db_path, dest_path, self.commit_every, conn=self.conn)
+
+    def lookup(self, rel_path: str) -> Optional[IndexEntry]:
+        """Return the indexed entry for ``rel_path``, if any."""
+        row = self.conn.execute(
+            'SELECT size, mtime, checksum, generation FROM files WHERE dest = ? AND path = ?',
+            (self.dest_path, rel_path)
+        ).fetchone()
+        return IndexEntry(rel_path, *row) if row else None
+
+    def is_empty(self) -> bool:
+        """True if nothing has been recorded for this destination yet."""
+        row = self.conn.execute('SELECT 1 FROM files WHERE dest = ? LIMIT 1', (self.dest_path,)).fetchone()
+        return row is None
+
+    def is_unchanged(self, rel_path: str, size: int, mtime: int) -> bool:
+        """True if ``rel_path`` was uploaded before with the same size and mtime."""
+        entry = self.lookup(rel_path)
+        return entry is not None and entry.size == size and entry.mtime == mtime
+
+    def record(self, rel_path: str, size: int, mtime: int, checksum: Optional[str] = None, generation: Optional[int] = None):
+        """Remember a completed upload."""
+        self.conn.execute(
+            'INSERT OR REPLACE INTO files (dest, path, size, mtime, checksum, generation, uploaded_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (self.dest_path, rel_path, size, mtime, checksum, generation, int(time.time()))
+        )
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def forget(self, rel_path: str):
+        """Drop ``rel_path`` so the next run uploads it again."""
+        self.conn.execute('DELETE FROM files WHERE dest = ? AND path = ?', (self.dest_path, rel_path))
+        self._uncommitted += 1
+
+    def entries(self) -> Iterator[IndexEntry]:
+        """Iterate over every entry for this destination."""
+        cursor = self.conn.execute(
+            'SELECT path, size, mtime, checksum, generation FROM files WHERE dest = ?', (self.dest_path,)
+        )
+        for row in cursor:
+            yield IndexEntry(*row)
+
+    def commit(self):
+        self.conn.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        if self._owns_conn:
+            self.conn.close()
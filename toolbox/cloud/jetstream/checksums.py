@@ -0,0 +1,251 @@
+"""
+Hash-while-upload helpers for NOAA Jetstream.
+
+``HashingReader`` computes MD5 and CRC32C in the same pass that streams a
+file to the bucket, so a file is read once per upload. ``ChecksumCache``
+remembers those hashes by local path, size and mtime, so later syncs and
+integrity checks can compare against the bucket's ``md5Hash``/``crc32c``
+without reading unchanged files from slow USB/NAS volumes again.
+"""
+import os
+import time
+import base64
+import struct
+import hashlib
+import sqlite3
+from typing import Optional, Tuple
+try:
+    import google_crc32c  # installed with google-cloud-storage; C implementation
+    CRC32C_AVAILABLE = True
+except Exception:
+    CRC32C_AVAILABLE = False
+
+CACHE_FILENAME = 'jetstream_state.db'
+_CRC32C_POLY = 0x82F63B78  # Castagnoli, reflected
+_CRC32C_TABLE = []
+for _i in range(256):
+    _crc = _i
+    for _ in range(8):
+        _crc = (_crc >> 1) ^ _CRC32C_POLY if _crc & 1 else _crc >> 1
+    _CRC32C_TABLE.append(_crc)
+
+
+def crc32c_extend(crc: int, data: bytes) -> int:
+    """Continue a CRC32C over ``data``."""
+    if CRC32C_AVAILABLE:
+        return google_crc32c.extend(crc, data)
+    # Pure-Python fallback; correct but slow, only used without google-crc32c
+    crc ^= 0xFFFFFFFF
+    for byte in data:
+        crc = _CRC32C_TABLE[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+def _gf2_times(matrix, vec: int) -> int:
+    total = 0
+    i = 0
+    while vec:
+        if vec & 1:
+            total ^= matrix[i]
+        vec >>= 1
+        i += 1
+    return total
+
+
+def _gf2_square(matrix):
+    return [_gf2_times(matrix, matrix[n]) for n in range(32)]
+
+
+def crc32c_combine(crc1: int, crc2: int, len2: int) -> int:
+    """
+    CRC32C of two concatenated blocks from the CRCs of each block.
+
+    Same algorithm as zlib's ``crc32_combine``, with the Castagnoli polynomial.
+    Lets a composite upload's checksum be built from its parts.
+    """
+    if len2 <= 0:
+        return crc1
+    odd = [_CRC32C_POLY] + [1 << n for n in range(31)]  # operator for one zero bit
+    even = _gf2_square(odd)  # two zero bits
+    odd = _gf2_square(even)  # four zero bits
+    while True:
+        even = _gf2_square(odd)
+        if len2 & 1:
+            crc1 = _gf2_times(even, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+        odd = _gf2_square(even)
+        if len2 & 1:
+            crc1 = _gf2_times(odd, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+    return crc1 ^ crc2
+
+
+class ChecksumMismatch(Exception):
+    """The stored object's checksum doesn't match the bytes that were sent."""
+
+
+def encode_md5(digest: bytes) -> str:
+    """GCS ``md5Hash`` format: base64 of the raw digest."""
+    return base64.b64encode(digest).decode('ascii')
+
+
+def encode_crc32c(crc: int) -> str:
+    """GCS ``crc32c`` format: base64 of the big-endian 32-bit value."""
+    return base64.b64encode(struct.pack('>I', crc)).decode('ascii')
+
+
+class HashingReader:
+    """
+    File wrapper that updates MD5 and CRC32C as bytes are read.
+
+    Hashes are only meaningful for a single front-to-back pass. A seek back to
+    the start (as an upload retry does) resets them; any other seek away from
+    the read position marks the reader ``complete = False`` so callers fall
+    back to hashing the file separately.
+    """
+
+    def __init__(self, raw, md5: bool = True):
+        self._raw = raw
+        self._md5 = hashlib.md5() if md5 else None
+        self.crc32c = 0
+        self.bytes_read = 0
+        self.complete = True
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._raw.read(size)
+        if data:
+            if self._md5 is not None:
+                self._md5.update(data)
+            self.crc32c = crc32c_extend(self.crc32c, data)
+            self.bytes_read += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET):
+        position = self._raw.seek(offset, whence)
+        if position == 0:
+            self._md5 = hashlib.md5() if self._md5 is not None else None
+            self.crc32c = 0
+            self.bytes_read = 0
+            self.complete = True
+        elif position != self.bytes_read:
+            self.complete = False
+        return position
+
+    @property
+    def md5_b64(self) -> Optional[str]:
+        return encode_md5(self._md5.digest()) if self._md5 is not None else None
+
+    @property
+    def crc32c_b64(self) -> str:
+        return encode_crc32c(self.crc32c)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+def hash_file(path: str, chunk_size: int = 4 * 1024 * 1024) -> Tuple[str, str]:
+    """Read ``path`` once and return its ``(md5, crc32c)`` in GCS format."""
+    with open(path, 'rb') as f:
+        reader = HashingReader(f)
+        while reader.read(chunk_size):
+            pass
+    return reader.md5_b64, reader.crc32c_b64
+
+
+class ChecksumCache:
+    """
+    SQLite cache of local file hashes keyed by absolute path.
+
+    An entry is only trusted while the file's size and mtime are unchanged.
+    Kept in the same database as the change index; pass the index's ``conn``
+    so both write through one connection. Writes are committed every
+    ``commit_every`` records and on ``close``.
+
+    Set ``metrics`` to a ``TransferMetrics`` to time the files it hashes.
+    """
+
+    metrics = None
+
+    def __init__(self, db_path: str, commit_every: int = 1000, conn: Optional[sqlite3.Connection] = None):
+        self.db_path = db_path
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        self._owns_conn = conn is None
+        self.conn = conn or sqlite3.connect(db_path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS checksums (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                md5 TEXT,
+                crc32c TEXT
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    @classmethod
+    def for_log_directory(cls, log_directory: str) -> 'ChecksumCache':
+        return cls(os.path.join(log_directory, CACHE_FILENAME))
+
+    def lookup(self, path: str, size: int, mtime: int) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """Return cached ``(md5, crc32c)`` if the file hasn't changed since it was hashed."""
+        row = self.conn.execute(
+            'SELECT md5, crc32c FROM checksums WHERE path = ? AND size = ? AND mtime = ?', (path, size, mtime)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def record(self, path: str, size: int, mtime: int, md5: Optional[str], crc32c: Optional[str]):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO checksums (path, size, mtime, md5, crc32c) VALUES (?, ?, ?, ?, ?)',
+            (path, size, mtime, md5, crc32c)
+        )
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def get_or_compute(self, path: str, size: int, mtime: int) -> Tuple[Optional[str], Optional[str]]:
+        """Cached hashes, or hash the file now and cache the result."""
+        cached = self.lookup(path, size, mtime)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        md5, crc32c = hash_file(path)
+        if self.metrics is not None:
+            self.metrics.add_phase('hash', time.perf_counter() - start)
+        self.record(path, size, mtime, md5, crc32c)
+        return md5, crc32c
+
+    def matches(self, path: str, size: int, mtime: int, md5: Optional[str], crc32c: Optional[str],
+                compute: bool = False) -> Optional[bool]:
+        """
+        Compare the local file's hashes with a remote object's ``md5``/``crc32c``.
+
+        MD5 is preferred; composite objects only carry CRC32C. Without
+        ``compute`` only cached hashes are used and None means "unknown";
+        with it an uncached file is read once and the result cached.
+        """
+        if md5 is None and crc32c is None:
+            return None
+        hashes = self.get_or_compute(path, size, mtime) if compute else self.lookup(path, size, mtime)
+        if hashes is None:
+            return None
+        local_md5, local_crc32c = hashes
+        if md5 is not None and local_md5 is not None:
+            return local_md5 == md5
+        if crc32c is not None and local_crc32c is not None:
+            return local_crc32c == crc32c
+        return None
+
+    def commit(self):
+        self.conn.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        if self._owns_conn:
+            self.conn.close()
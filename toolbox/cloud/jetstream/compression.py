@@ -0,0 +1,144 @@
+"""
+Opt-in gzip compression of text-like files for NOAA Jetstream uploads.
+
+Data files such as ``.txt``, ``.csv``, ``.json``, ``.xml`` and ``.log``
+usually shrink 5-10x, which matters on satellite links. ``Compressor``
+gzips files whose extension has a compression level in the policy, and the
+engine uploads them with ``Content-Encoding: gzip`` and their original
+``Content-Type``. Google Cloud Storage then decompresses them for readers
+that don't ask for gzip (decompressive transcoding), so downloads look the
+same as before.
+
+Each file is compressed into a temporary file first, because the object's
+metadata (original size and checksums, used by later syncs to compare the
+bucket copy with the local file) must be known before the upload starts.
+Files that don't shrink by at least ``min_saving`` are uploaded unchanged.
+"""
+import os
+import gzip
+import time
+import shutil
+import tempfile
+import mimetypes
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from checksums import HashingReader
+
+# Object metadata holding the uncompressed size and checksums
+RAW_SIZE_METADATA_KEY = 'jetstream-raw-size'
+RAW_MD5_METADATA_KEY = 'jetstream-raw-md5'
+RAW_CRC32C_METADATA_KEY = 'jetstream-raw-crc32c'
+
+DEFAULT_LEVELS = {'.txt': 6, '.csv': 6, '.json': 6, '.xml': 6, '.log': 6}
+
+
+@dataclass
+class CompressedFile:
+    """A gzip copy of a local file, ready to upload from ``path``."""
+    path: str
+    size: int
+    raw_size: int
+    raw_md5: str
+    raw_crc32c: str
+    content_type: str
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CompressionStats:
+    """Thread-safe totals for the compression report."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files = 0
+        self.skipped = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.cpu_seconds = 0.0
+
+    def add(self, raw_size: int, compressed_size: int, cpu_seconds: float, used: bool):
+        with self._lock:
+            self.cpu_seconds += cpu_seconds
+            if used:
+                self.files += 1
+                self.raw_bytes += raw_size
+                self.compressed_bytes += compressed_size
+            else:
+                self.skipped += 1
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.raw_bytes - self.compressed_bytes
+
+    def report(self) -> dict:
+        return {
+            'files': self.files,
+            'not_worth_compressing': self.skipped,
+            'raw_bytes': self.raw_bytes,
+            'compressed_bytes': self.compressed_bytes,
+            'bytes_saved': self.bytes_saved,
+            'cpu_seconds': round(self.cpu_seconds, 3),
+        }
+
+    def summary_line(self) -> str:
+        saved_pct = 100 * self.bytes_saved / self.raw_bytes if self.raw_bytes else 0.0
+        return (f"Compressed: {self.files} files, {self.raw_bytes} -> {self.compressed_bytes} bytes "
+                f"(saved {self.bytes_saved} bytes, {saved_pct:.0f}%), {self.cpu_seconds:.2f}s CPU"
+                + (f", {self.skipped} not worth compressing" if self.skipped else ''))
+
+
+class Compressor:
+    """
+    Decide which files to gzip and compress them.
+
+    Args:
+        levels: File extension (lowercase, with dot) -> gzip level 1-9; other
+            extensions, or level 0, are uploaded as they are
+        min_size: Files smaller than this many bytes are not compressed
+        min_saving: Compressed copy must be at least this fraction smaller
+        spool_dir: Where compressed copies are staged (system temp by default)
+    """
+
+    def __init__(self, levels: Optional[Dict[str, int]] = None, min_size: int = 4096,
+                 min_saving: float = 0.1, spool_dir: Optional[str] = None):
+        self.levels = {ext.lower(): level for ext, level in (levels if levels is not None else DEFAULT_LEVELS).items()}
+        self.min_size = min_size
+        self.min_saving = min_saving
+        self.spool_dir = spool_dir
+        self.stats = CompressionStats()
+
+    def level_for(self, rel_path: str, size: int) -> int:
+        if size < self.min_size:
+            return 0
+        return self.levels.get(os.path.splitext(rel_path)[1].lower(), 0)
+
+    def compress(self, local_path: str, rel_path: str, size: int) -> Optional[CompressedFile]:
+        """Return a gzip copy of the file, or None if it shouldn't or didn't compress well."""
+        level = self.level_for(rel_path, size)
+        if not level:
+            return None
+        fd, tmp_path = tempfile.mkstemp(suffix='.gz', prefix='jetstream_', dir=self.spool_dir)
+        cpu_start = time.thread_time()
+        try:
+            with open(local_path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                reader = HashingReader(src)
+                # mtime=0 keeps the output identical for identical input
+                with gzip.GzipFile(filename='', mode='wb', fileobj=dst, compresslevel=level, mtime=0) as gz:
+                    shutil.copyfileobj(reader, gz, 1024 * 1024)
+            compressed_size = os.path.getsize(tmp_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        cpu_seconds = time.thread_time() - cpu_start
+        used = compressed_size <= reader.bytes_read * (1 - self.min_saving)
+        self.stats.add(reader.bytes_read, compressed_size, cpu_seconds, used)
+        if not used:
+            os.remove(tmp_path)
+            return None
+        content_type = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+        return CompressedFile(tmp_path, compressed_size, reader.bytes_read, reader.md5_b64, reader.crc32c_b64, content_type)
+
@@ -0,0 +1,226 @@
+"""
+Adaptive concurrency and bandwidth control for NOAA Jetstream transfers.
+
+``AdaptiveConcurrency`` adjusts how many uploads are in flight (AIMD style)
+from the throughput, latency and retryable error rate it observes, instead of
+relying on a fixed thread count. ``BandwidthCap`` is a token bucket that holds
+total upload speed under a hard Mbit/s limit. ``FaultInjectingBackend`` wraps
+any storage backend with latency, a capacity limit and 429/503 errors so the
+controller can be exercised offline.
+"""
+import os
+import time
+import random
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+
+class TransientError(Exception):
+    """A retryable server response, carrying its HTTP status like google.api_core errors."""
+
+    def __init__(self, code: int, message: str = ''):
+        super().__init__(message or f"HTTP {code}")
+        self.code = code
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for throttling, server-side, connection and checksum errors worth retrying."""
+    if getattr(error, 'code', None) in RETRYABLE_STATUS_CODES:
+        return True
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) in RETRYABLE_STATUS_CODES:
+        return True
+    return isinstance(error, (ConnectionError, TimeoutError)) or type(error).__name__ in ('ConnectionError', 'Timeout', 'ReadTimeout', 'ChecksumMismatch')
+
+
+def backoff_delay(attempt: int, initial: float = 1.0, maximum: float = 32.0) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(maximum, initial * (2 ** attempt)))
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on in-flight requests.
+
+    Completed requests are grouped into windows of ``window`` seconds. At the
+    end of each window the limit is:
+      - halved if the retryable error rate exceeded ``error_threshold``
+      - lowered by one if throughput fell, or latency rose past
+        ``latency_tolerance`` times the best seen, compared with the last window
+      - otherwise raised by one, up to ``max_limit``
+    """
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 64, window: float = 2.0,
+                 error_threshold: float = 0.02, latency_tolerance: float = 3.0):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial))
+        self.window = window
+        self.error_threshold = error_threshold
+        self.latency_tolerance = latency_tolerance
+        self.history: List[Tuple[float, int, float, float]] = []  # (time, limit, bytes/sec, error rate)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._last_throughput: Optional[float] = None
+        self._best_latency: Optional[float] = None
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_start = time.monotonic()
+        self._bytes = 0
+        self._completions = 0
+        self._errors = 0
+        self._latency_total = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self):
+        """Block until another request may start."""
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, nbytes: int = 0, latency: float = 0.0, error: bool = False):
+        """Report a finished request; ``error`` marks a retryable failure."""
+        with self._cond:
+            self._in_flight -= 1
+            if error:
+                self._errors += 1
+            else:
+                self._completions += 1
+                self._bytes += nbytes
+                self._latency_total += latency
+            if time.monotonic() - self._window_start >= self.window and (self._completions or self._errors):
+                self._adjust()
+            self._cond.notify_all()
+
+    def _adjust(self):
+        elapsed = max(1e-6, time.monotonic() - self._window_start)
+        throughput = self._bytes / elapsed
+        error_rate = self._errors / (self._completions + self._errors)
+        latency = self._latency_total / self._completions if self._completions else None
+        if latency is not None:
+            self._best_latency = latency if self._best_latency is None else min(self._best_latency, latency)
+
+        old_limit = self.limit
+        if error_rate > self.error_threshold:
+            self.limit = max(self.min_limit, self.limit // 2)
+        elif self._last_throughput is not None and throughput < self._last_throughput * 0.9:
+            self.limit = max(self.min_limit, self.limit - 1)
+        elif latency is not None and latency > self._best_latency * self.latency_tolerance:
+            self.limit = max(self.min_limit, self.limit - 1)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+
+        if self.limit != old_limit:
+            logging.info("Concurrency %d -> %d (%.1f MB/s, %.1f%% retryable errors)",
+                         old_limit, self.limit, throughput / 1e6, error_rate * 100)
+        self.history.append((time.time(), self.limit, throughput, error_rate))
+        self._last_throughput = throughput
+        self._reset_window()
+
+
+class BandwidthCap:
+    """Token bucket limiting total upload speed to ``mbit_per_sec``."""
+
+    def __init__(self, mbit_per_sec: float, burst_seconds: float = 1.0):
+        self.rate = mbit_per_sec * 1_000_000 / 8  # bytes/sec
+        self.capacity = self.rate * burst_seconds
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes: int):
+        """Block until ``nbytes`` may be sent."""
+        while nbytes > 0:
+            take = min(nbytes, self.capacity)
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= take:
+                    self._tokens -= take
+                    nbytes -= take
+                    continue
+                wait = (take - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ThrottledReader:
+    """File wrapper that draws from a ``BandwidthCap`` as it is read."""
+
+    def __init__(self, raw, cap: BandwidthCap):
+        self._raw = raw
+        self._cap = cap
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._raw.read(size)
+        self._cap.consume(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class FaultInjectingBackend:
+    """
+    Wrap a storage backend with simulated network behaviour.
+
+    Each request waits ``latency`` seconds plus transfer time at
+    ``link_mbit_per_sec`` shared by all in-flight requests. Above ``capacity``
+    concurrent requests the server answers 429/503 with probability
+    ``overload_error_rate``; ``error_rate`` adds background failures.
+    """
+
+    def __init__(self, inner, latency: float = 0.05, link_mbit_per_sec: float = 200.0, capacity: int = 16,
+                 error_rate: float = 0.0, overload_error_rate: float = 0.5, seed: Optional[int] = None):
+        self.inner = inner
+        self.latency = latency
+        self.link_rate = link_mbit_per_sec * 1_000_000 / 8
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.overload_error_rate = overload_error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.requests = 0
+        self.injected_errors = 0
+
+    def _simulate(self, nbytes: int):
+        with self._lock:
+            self._in_flight += 1
+            self.requests += 1
+            in_flight = self._in_flight
+            roll = self._random.random()
+        try:
+            time.sleep(self.latency)
+            overloaded = in_flight > self.capacity
+            if roll < self.error_rate or (overloaded and roll < self.overload_error_rate):
+                with self._lock:
+                    self.injected_errors += 1
+                raise TransientError(self._random.choice((429, 503)), 'Injected throttling error')
+            time.sleep(nbytes * in_flight / self.link_rate)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def upload_file(self, local_path: str, object_name: str, mtime: int):
+        self._simulate(os.path.getsize(local_path))
+        return self.inner.upload_file(local_path, object_name, mtime)
+
+    def upload_compressed(self, compressed, object_name: str, mtime: int):
+        self._simulate(compressed.size)
+        return self.inner.upload_compressed(compressed, object_name, mtime)
+
+    def upload_chunk(self, session: str, data: bytes, offset: int, size: int) -> int:
+        self._simulate(len(data))
+        return self.inner.upload_chunk(session, data, offset, size)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
@@ -6,21 +6,30 @@ import json
 from pathlib import Path
 # to get current date & time
 from datetime import datetime
-from gooey import Gooey, GooeyParser
-try:
-    import wx  # Gooey GUI backend
-    WX_AVAILABLE = True
-except Exception:
-    WX_AVAILABLE = False
-import google
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
+# gooey, wx and the Google auth libraries are imported where they are used,
+# so --cli runs start without loading the GUI and OAuth stacks
 import logging
 import time
 import re
+import contextlib
 from typing import List, Dict, Optional
-# Define the scopes that your application needs to access Google Cloud Storage
-SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
+from upload_engine import UploadEngine, make_backend
+from change_index import ChangeIndex
+from checksums import ChecksumCache
+from resumable_upload import ChunkedUploader, SessionJournal
+from concurrency import AdaptiveConcurrency, BandwidthCap
+from batch_jobs import BatchRunner, load_job_file
+from upload_engine import split_bucket_path
+from transfer_log import TransferTracker, GOOEY_PROGRESS_REGEX
+from tar_shards import ShardPacker
+from listing_cache import ListingCache
+from transfer_plan import execute_plan, format_totals, parse_shard, read_plan, write_plan
+from watch_mode import watch_folder
+from transfer_journal import TransferJournal
+from compression import DEFAULT_LEVELS, Compressor
+from lanes import format_lane_report
+from transfer_metrics import Profiler, TransferMetrics
+from credential_cache import shared_cache
 
 class UploadConfig:
     """Configuration class for upload patterns and settings."""
@@ -45,6 +54,22 @@ class UploadConfig:
             r'.*~$',      # Editor backup files
             r'.*\.pyc$',  # Python compiled files
         ]
+
+        # Native engine: files at least this large upload as parallel resumable parts
+        self.large_file_threshold_mb = 512
+        self.part_size_mb = 256
+        self.chunk_size_mb = 16
+        self.parallel_parts = 4
+        # Native engine with small-file packing: files under this size go into tar shards
+        self.pack_threshold_kb = 256
+        self.shard_size_mb = 1024
+        # Native engine with --compress: gzip level per file extension, for files of at least compress_min_kb
+        self.compress_levels = dict(DEFAULT_LEVELS)
+        self.compress_min_kb = 4
+        # Native engine: files at least large_lane_threshold_mb upload on their own lane of
+        # large_lane_workers workers so they don't hold up small files (0 workers = one queue)
+        self.large_lane_threshold_mb = 64
+        self.large_lane_workers = 2
     
     @classmethod
     def from_json_file(cls, filepath: str) -> 'UploadConfig':
@@ -57,6 +82,16 @@ class UploadConfig:
                     config.default_include_patterns = data.get('include_patterns', config.default_include_patterns)
                     config.default_exclude_folders = data.get('exclude_folders', config.default_exclude_folders)
                     config.default_exclude_patterns = data.get('exclude_patterns', config.default_exclude_patterns)
+                    config.large_file_threshold_mb = data.get('large_file_threshold_mb', config.large_file_threshold_mb)
+                    config.part_size_mb = data.get('part_size_mb', config.part_size_mb)
+                    config.chunk_size_mb = data.get('chunk_size_mb', config.chunk_size_mb)
+                    config.parallel_parts = data.get('parallel_parts', config.parallel_parts)
+                    config.pack_threshold_kb = data.get('pack_threshold_kb', config.pack_threshold_kb)
+                    config.shard_size_mb = data.get('shard_size_mb', config.shard_size_mb)
+                    config.compress_levels = data.get('compress_levels', config.compress_levels)
+                    config.compress_min_kb = data.get('compress_min_kb', config.compress_min_kb)
+                    config.large_lane_threshold_mb = data.get('large_lane_threshold_mb', config.large_lane_threshold_mb)
+                    config.large_lane_workers = data.get('large_lane_workers', config.large_lane_workers)
             except (json.JSONDecodeError, FileNotFoundError) as e:
                 print(f"Warning: Could not load config from {filepath}: {e}")
         return config
@@ -66,7 +101,17 @@ class UploadConfig:
         data = {
             'include_patterns': self.default_include_patterns,
             'exclude_folders': self.default_exclude_folders,
-            'exclude_patterns': self.default_exclude_patterns
+            'exclude_patterns': self.default_exclude_patterns,
+            'large_file_threshold_mb': self.large_file_threshold_mb,
+            'part_size_mb': self.part_size_mb,
+            'chunk_size_mb': self.chunk_size_mb,
+            'parallel_parts': self.parallel_parts,
+            'pack_threshold_kb': self.pack_threshold_kb,
+            'shard_size_mb': self.shard_size_mb,
+            'compress_levels': self.compress_levels,
+            'compress_min_kb': self.compress_min_kb,
+            'large_lane_threshold_mb': self.large_lane_threshold_mb,
+            'large_lane_workers': self.large_lane_workers
         }
         with open(filepath, 'w') as f:
             json.dump(data, f, indent=2)
@@ -112,35 +157,25 @@ class BucketPathManager:
 
 def authenticate():
     """Authenticate with Google using the OAuth2 Web Application Flow"""
-    # Set up the OAuth2 flow
-    flow = InstalledAppFlow.from_client_secrets_file(
-        'client_secret.json',  # Path to your client secret file
-        scopes=SCOPES)
-
-    # Start the OAuth2 flow and redirect the user to the Google sign-in page
-    credentials = flow.run_local_server(port=0)
-
-    # Save the credentials to a file (or database) for future use
-    with open('credentials.json', 'w') as f:
-        f.write(credentials.to_json())
-
-    return credentials
+    # Signs in through the browser and saves the token in the shared cache
+    return shared_cache().authenticate()
 
 def get_credentials():
     """Load the stored credentials or authenticate if they do not exist"""
-    try:
-        # Try to load the credentials from the file
-        credentials = Credentials.from_authorized_user_file('credentials.json', SCOPES)
-    except FileNotFoundError:
-        # If the file does not exist, authenticate with Google
-        credentials = authenticate()
-    return credentials
+    # The shared cache also picks up an older credentials.json and refreshes
+    # the token ahead of expiry, so later runs skip the sign-in
+    return shared_cache().get(interactive=True)
 
 def log_and_print(message):
     """Logs the message and also prints it to the console."""
     logging.info(message)
     print(message)
 
+def transfer_log_path(log_path: str) -> str:
+    """Path of the JSON-lines transfer log for a run starting now."""
+    current_datetime = datetime.now().strftime("%m_%d_%Y_%H%M")
+    return os.path.join(log_path, current_datetime + "_jetstream_transfer.jsonl")
+
 # Preflight verification helpers removed per request
     
 def generate_gsutil_command(
@@ -231,10 +266,14 @@ def do_the_copy(
     dry_run: bool = False,
     threads: int = 12,
     enable_multi: bool = False,
-    recursive: bool = True
+    recursive: bool = True,
+    progress_in_place: bool = False
 ) -> bool:
     """
     Run the gsutil command for copying files based on the provided parameters.
+
+    gsutil output is read line by line as it arrives and parsed into per-file
+    events for the JSON-lines transfer log and the live progress line.
     
     Returns:
         bool: True if successful, False otherwise
@@ -256,7 +295,8 @@ def do_the_copy(
     print(gsutil_command)
     print("=" * 50)
     
-    # Run gsutil command and capture output
+    # Run gsutil command and stream its output
+    tracker = TransferTracker(transfer_log_path(log_path), in_place=progress_in_place)
     start_time = time.time()
     try:
         process = subprocess.Popen(
@@ -264,31 +304,464 @@ def do_the_copy(
             shell=True, 
             stdout=subprocess.PIPE, 
             stderr=subprocess.STDOUT,
-            universal_newlines=True
+            universal_newlines=True,
+            bufsize=1
         )
-        output, _ = process.communicate()
+        for line in process.stdout:
+            line = line.rstrip()
+            event = tracker.handle_gsutil_line(line)
+            if event is not None and event.event == 'progress':
+                continue
+            logging.info(line)
+            if event is None or event.event in ('failed', 'failed_total'):
+                tracker.end_line()
+                print(line)
+        process.wait()
         elapsed_time = time.time() - start_time
+        summary = tracker.close()
         
         if process.returncode == 0:
             log_and_print('---- Copy Process Successful ----')
-            log_and_print(f'Elapsed Time: {elapsed_time:.2f} seconds')
-            log_and_print('Output:')
-            log_and_print(output)
-            return True
         else:
             log_and_print('---- Copy Process Failed ----')
-            log_and_print(f'Elapsed Time: {elapsed_time:.2f} seconds')
-            log_and_print('Error:')
-            log_and_print(output)
-            return False
+        log_and_print(f'Elapsed Time: {elapsed_time:.2f} seconds')
+        log_and_print(f"Copied: {summary['files_copied']} files ({summary['bytes_done']} bytes), "
+                      f"Skipped: {summary['files_skipped']}, Failed: {summary['files_failed']}")
+        return process.returncode == 0
             
     except Exception as e:
+        tracker.close()
         log_and_print(f'---- Exception occurred during copy process ----')
         log_and_print(f'Error: {str(e)}')
         return False
+
+def do_the_native_copy(
+    source_path: str,
+    dest_path: str,
+    log_path: str,
+    include_patterns: List[str] = None,
+    exclude_folders: List[str] = None,
+    exclude_patterns: List[str] = None,
+    dry_run: bool = False,
+    threads: int = 12,
+    recursive: bool = True,
+    fake_bucket_root: Optional[str] = None,
+    use_state_index: bool = False,
+    full_verify: bool = False,
+    progress_in_place: bool = False,
+    config: Optional[UploadConfig] = None,
+    adaptive: bool = False,
+    max_threads: int = 64,
+    bandwidth_cap_mbps: float = 0,
+    pack_small_files: bool = False,
+    plan_out: Optional[str] = None,
+    execute_plan_path: Optional[str] = None,
+    plan_shard: str = '0/1',
+    delete: bool = False,
+    listing_max_age_minutes: float = 0,
+    walk_threads: int = 8,
+    watch: bool = False,
+    stable_seconds: float = 30,
+    wave_seconds: float = 15,
+    watch_polling: bool = False,
+    compress: bool = False,
+    metrics_textfile: Optional[str] = None,
+    large_lane_workers: Optional[int] = None
+) -> bool:
+    """
+    Copy files with the in-process upload engine instead of gsutil.
+
+    Pattern defaults match generate_gsutil_command. Include patterns are only
+    applied when given explicitly, since the gsutil path never applies them.
+    With use_state_index, a SQLite change index in log_path lets re-runs skip
+    unchanged files without listing the bucket; full_verify checks the index
+    against the bucket as well. Files over config.large_file_threshold_mb
+    upload as parallel resumable parts journaled in log_path, so an
+    interrupted run resumes them mid-file, and every upload's start and
+    completion is written to a transfer journal in log_path, so a run that
+    dies is replayed on the next start and its finished files are skipped
+    straight away. With adaptive, threads is only the
+    starting point: in-flight uploads are tuned between 1 and max_threads from
+    measured throughput and 429/503 rates. bandwidth_cap_mbps (Mbit/s, 0 for
+    none) caps total upload speed. MD5/CRC32C are computed while uploading and
+    cached in log_path, so checksum comparisons don't re-read unchanged files.
+    With pack_small_files, files under config.pack_threshold_kb are packed into
+    indexed tar shards of about config.shard_size_mb (read back with tar_shards.py).
+
+    With plan_out, nothing is transferred: the files to upload, skip and (with
+    delete) delete are written to a plan file. execute_plan_path applies
+    such a plan exactly, optionally only shard plan_shard ("INDEX/COUNT").
+
+    Bucket listings are cached in log_path. By default (listing_max_age_minutes
+    0) everything is listed every run; otherwise each top-level folder under
+    the destination is listed again only once its cached listing is older
+    than listing_max_age_minutes, and a warning is printed whenever a cached
+    listing is used. Uploads and deletes made here are written through to
+    the cache.
+
+    The source folder is walked with walk_threads directory listings in
+    flight (1 walks it serially), which matters on network shares.
+
+    With watch, the folder is synced once and then watched (inotify, or
+    polling with watch_polling or where inotify is unavailable): files are
+    uploaded in waves every wave_seconds once unchanged for stable_seconds,
+    until the user presses Ctrl+C.
+
+    With compress, files whose extension is in config.compress_levels (and of
+    at least config.compress_min_kb) are gzipped on the way up and stored with
+    Content-Encoding: gzip when that makes them at least 10% smaller.
+
+    Time per phase (list, walk, filter, hash, upload, retry, verify) and
+    histograms of per-file upload latency and size are logged as JSON at the
+    end; metrics_textfile also writes them for the Prometheus node_exporter.
+
+    Files of at least config.large_lane_threshold_mb (and packed shards)
+    upload on a separate lane of large_lane_workers workers (default
+    config.large_lane_workers; 0 puts everything on one queue), so a few huge
+    files don't hold up thousands of small ones. Each lane's files/sec,
+    MB/sec and utilization are printed and logged at the end.
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    config = config or UploadConfig()
+    if large_lane_workers is None:
+        large_lane_workers = config.large_lane_workers
+    if exclude_folders is None:
+        exclude_folders = config.default_exclude_folders
+    if exclude_patterns is None:
+        exclude_patterns = config.default_exclude_patterns
+
+    print("Running In-Process Sync:")
+    print("=" * 50)
+    print(f"{source_path} -> {dest_path} ({threads} workers{', dry run' if dry_run else ''})")
+    print("=" * 50)
+
+    index = None
+    journal = None
+    transfer_journal = None
+    checksum_cache = None
+    listing_cache = None
+    metrics = TransferMetrics()
+    tracker = TransferTracker(transfer_log_path(log_path), in_place=progress_in_place)
+    try:
+        listing_cache = ListingCache.for_log_directory(log_path, max_age=listing_max_age_minutes * 60, warn=lambda message: log_and_print(f'Warning: {message}'))
+        if use_state_index:
+            index = ChangeIndex.for_log_directory(log_path, dest_path)
+            checksum_cache = ChecksumCache(index.db_path, conn=index.conn)
+        else:
+            checksum_cache = ChecksumCache.for_log_directory(log_path)
+        backend = make_backend(dest_path, workers=threads, fake_bucket_root=fake_bucket_root)
+        if bandwidth_cap_mbps:
+            backend.bandwidth_cap = BandwidthCap(bandwidth_cap_mbps)
+        limiter = AdaptiveConcurrency(initial=threads, max_limit=max(threads, max_threads)) if adaptive else None
+        tracker.limiter = limiter
+        journal = SessionJournal.for_log_directory(log_path)
+        chunked_uploader = ChunkedUploader(
+            backend,
+            journal,
+            chunk_size=config.chunk_size_mb * 1024 * 1024,
+            part_size=config.part_size_mb * 1024 * 1024,
+            parallel_parts=config.parallel_parts
+        )
+        packer = None
+        if pack_small_files:
+            _, prefix = split_bucket_path(dest_path)
+            packer = ShardPacker(prefix, threshold=config.pack_threshold_kb * 1024, shard_size=config.shard_size_mb * 1024 * 1024)
+        if not plan_out and not dry_run:
+            transfer_journal = TransferJournal.for_log_directory(log_path, dest_path)
+        compressor = Compressor(config.compress_levels, min_size=config.compress_min_kb * 1024) if compress else None
+        engine = UploadEngine(
+            backend,
+            dest_path,
+            include_patterns=include_patterns,
+            exclude_folders=exclude_folders,
+            exclude_patterns=exclude_patterns,
+            workers=threads,
+            dry_run=dry_run,
+            recursive=recursive,
+            index=index,
+            full_verify=full_verify,
+            on_result=lambda status, local, error: tracker.record(status, local.rel_path, local.size, error),
+            chunked_uploader=chunked_uploader,
+            large_file_threshold=config.large_file_threshold_mb * 1024 * 1024,
+            limiter=limiter,
+            checksum_cache=checksum_cache,
+            packer=packer,
+            listing_cache=listing_cache,
+            walk_workers=walk_threads,
+            transfer_journal=transfer_journal,
+            compressor=compressor,
+            metrics=metrics,
+            large_lane_workers=large_lane_workers,
+            large_lane_threshold=config.large_lane_threshold_mb * 1024 * 1024
+        )
+        try:
+            resumed, interrupted = engine.recover()
+            if resumed or interrupted:
+                log_and_print(f'Resuming an interrupted run: {resumed} files already done, {interrupted} to send again')
+            if plan_out:
+                totals = write_plan(plan_out, engine, source_path, dest_path, delete=delete)
+                log_and_print(f'Plan saved to {plan_out}')
+                for line in format_totals(totals):
+                    log_and_print(line)
+                return True
+            if execute_plan_path:
+                summary = execute_plan(execute_plan_path, engine, *parse_shard(plan_shard))
+            elif watch:
+                def report_wave(wave, wave_summary):
+                    label = 'Initial sync' if wave == 0 else f'Wave {wave}'
+                    tracker.end_line()
+                    log_and_print(f'{label}: Copied {wave_summary.copied} files ({wave_summary.bytes_copied} bytes), '
+                                  f'Skipped: {wave_summary.skipped}, Failed: {wave_summary.failed}')
+                    if wave == 0:
+                        log_and_print(f'Watching {source_path} for new files (press Ctrl+C to stop)')
+
+                summary = watch_folder(engine, source_path, stable_seconds=stable_seconds, wave_seconds=wave_seconds,
+                                       polling=watch_polling, on_wave=report_wave)
+            else:
+                summary = engine.run(source_path)
+            if summary.lanes:
+                tracker.note('lanes', summary.lanes)
+        finally:
+            backend.close()
+    except Exception as e:
+        log_and_print(f'---- Exception occurred during copy process ----')
+        log_and_print(f'Error: {str(e)}')
+        return False
+    finally:
+        tracker.close()
+        if checksum_cache is not None:
+            checksum_cache.close()
+        if listing_cache is not None:
+            listing_cache.close()
+        if index is not None:
+            index.close()
+        if journal is not None:
+            journal.close()
+        if transfer_journal is not None:
+            transfer_journal.close()
+
+    log_and_print('---- Copy Process Successful ----' if summary.ok else '---- Copy Process Failed ----')
+    log_and_print(f'Elapsed Time: {summary.elapsed:.2f} seconds')
+    log_and_print(f'Copied: {summary.copied} files ({summary.bytes_copied} bytes), Skipped: {summary.skipped}, Failed: {summary.failed}')
+    if summary.deleted:
+        log_and_print(f'Deleted: {summary.deleted} objects')
+    if compressor is not None:
+        log_and_print(compressor.stats.summary_line())
+        logging.info("Compression report: %s", json.dumps(compressor.stats.report()))
+    report_lanes(summary.lanes)
+    report_metrics(metrics, metrics_textfile, {'destination': dest_path})
+    for rel_path, error in summary.errors:
+        log_and_print(f'Failed: {rel_path}: {error}')
+    return summary.ok
+
+def report_lanes(lanes: dict):
+    """Print per-lane throughput and utilization and log the lane report as JSON."""
+    if not lanes:
+        return
+    for line in format_lane_report(lanes):
+        log_and_print(line)
+    logging.info("Lane report: %s", json.dumps(lanes))
+
+def report_metrics(metrics: TransferMetrics, textfile: Optional[str] = None, labels: Optional[dict] = None):
+    """Print the phase times, log the full metrics as JSON and optionally write a Prometheus textfile."""
+    log_and_print(metrics.summary_line())
+    logging.info("Transfer metrics: %s", json.dumps(metrics.report()))
+    if textfile:
+        try:
+            metrics.write_prometheus(textfile, labels)
+        except OSError as e:
+            log_and_print(f'Warning: Could not write metrics to {textfile}: {e}')
+
+def do_the_batch_copy(
+    job_file: str,
+    log_path: str,
+    dry_run: bool = False,
+    threads: int = 12,
+    fake_bucket_root: Optional[str] = None,
+    use_state_index: bool = False,
+    progress_in_place: bool = False,
+    config: Optional[UploadConfig] = None,
+    adaptive: bool = False,
+    max_threads: int = 64,
+    bandwidth_cap_mbps: float = 0,
+    listing_max_age_minutes: float = 0,
+    walk_threads: int = 8,
+    compress: bool = False,
+    metrics_textfile: Optional[str] = None,
+    large_lane_workers: Optional[int] = None
+) -> bool:
+    """
+    Run every job in a batch job file on one shared worker pool (native engine).
+
+    Settings in the job file (threads, adaptive, max_threads, bandwidth_cap)
+    override the arguments. All jobs are planned first, then uploaded
+    together under one worker and bandwidth budget, and a combined report is
+    printed and saved as JSON in log_path. With compress, text-like files
+    are gzipped on upload as in do_the_native_copy. Phase timings cover the
+    whole batch and go into the report (and metrics_textfile, if given).
+    Large files from every job share one large-file lane, as in
+    do_the_native_copy; the report includes each lane's throughput.
+
+    Every job gets the same checks as a single run before anything starts: a
+    job whose source folder doesn't exist or whose bucket path is invalid is
+    not run and is listed in the report with its error.
+
+    Returns:
+        bool: True if every job succeeded, False otherwise
+    """
+    config = config or UploadConfig()
+    if large_lane_workers is None:
+        large_lane_workers = config.large_lane_workers
+    try:
+        jobs, settings = load_job_file(job_file)
+    except (OSError, ValueError, KeyError) as e:
+        log_and_print(f'Error: Could not load batch file {job_file}: {e}')
+        return False
+    threads = settings.get('threads', threads)
+    adaptive = settings.get('adaptive', adaptive)
+    max_threads = settings.get('max_threads', max_threads)
+    bandwidth_cap_mbps = settings.get('bandwidth_cap', bandwidth_cap_mbps)
+
+    # A missing source folder would otherwise be walked as empty and "succeed"
+    invalid = {}
+    for job in jobs:
+        if not os.path.isdir(job.source_path):
+            invalid[job.name] = f'copy_from is not a directory: {job.source_path}'
+        elif not BucketPathManager.validate_bucket_path(BucketPathManager.normalize_bucket_path(job.dest_path)):
+            invalid[job.name] = f'bucket_path format is invalid: "{job.dest_path}"'
+    job_order = [job.name for job in jobs]
+    invalid_jobs = [job for job in jobs if job.name in invalid]
+    jobs = [job for job in jobs if job.name not in invalid]
+
+    print("Running Batch Sync:")
+    print("=" * 50)
+    for job in jobs:
+        print(f"{job.name}: {job.source_path} -> {BucketPathManager.normalize_bucket_path(job.dest_path)}")
+    for job in invalid_jobs:
+        log_and_print(f"Error: {job.name}: {invalid[job.name]}; this job will not run")
+    print("=" * 50)
+
+    backends = {}
+    indexes = []
+    transfer_journals = []
+    # All jobs share one index connection so their writes don't lock each other out
+    base_index = ChangeIndex.for_log_directory(log_path, '') if use_state_index else None
+    if base_index is not None:
+        checksum_cache = ChecksumCache(base_index.db_path, conn=base_index.conn)
+    else:
+        checksum_cache = ChecksumCache.for_log_directory(log_path)
+    listing_cache = ListingCache.for_log_directory(log_path, max_age=listing_max_age_minutes * 60, warn=lambda message: log_and_print(f'Warning: {message}'))
+    tracker = TransferTracker(transfer_log_path(log_path), in_place=progress_in_place)
+    journal = SessionJournal.for_log_directory(log_path)
+    cap = BandwidthCap(bandwidth_cap_mbps) if bandwidth_cap_mbps else None
+    limiter = AdaptiveConcurrency(initial=threads, max_limit=max(threads, max_threads)) if adaptive else None
+    tracker.limiter = limiter
+    compressor = Compressor(config.compress_levels, min_size=config.compress_min_kb * 1024) if compress else None
+    metrics = TransferMetrics()
+
+    def make_engine(job):
+        dest_path = BucketPathManager.normalize_bucket_path(job.dest_path)
+        bucket_name, _ = split_bucket_path(dest_path)
+        if bucket_name not in backends:
+            backend = make_backend(dest_path, workers=max(threads, max_threads), fake_bucket_root=fake_bucket_root)
+            backend.bandwidth_cap = cap
+            backends[bucket_name] = (backend, ChunkedUploader(
+                backend,
+                journal,
+                chunk_size=config.chunk_size_mb * 1024 * 1024,
+                part_size=config.part_size_mb * 1024 * 1024,
+                parallel_parts=config.parallel_parts
+            ))
+        backend, chunked_uploader = backends[bucket_name]
+        index = base_index.for_destination(dest_path) if base_index is not None else None
+        if index is not None:
+            indexes.append(index)
+        transfer_journal = None
+        if not dry_run:
+            transfer_journal = TransferJournal.for_log_directory(log_path, dest_path)
+            transfer_journals.append(transfer_journal)
+        return UploadEngine(
+            backend,
+            dest_path,
+            include_patterns=job.include_patterns,
+            exclude_folders=job.exclude_folders if job.exclude_folders is not None else config.default_exclude_folders,
+            exclude_patterns=job.exclude_patterns if job.exclude_patterns is not None else config.default_exclude_patterns,
+            workers=threads,
+            dry_run=dry_run,
+            index=index,
+            on_result=lambda status, local, error: tracker.record(status, f"{job.name}/{local.rel_path}", local.size, error),
+            chunked_uploader=chunked_uploader,
+            large_file_threshold=config.large_file_threshold_mb * 1024 * 1024,
+            limiter=limiter,
+            checksum_cache=checksum_cache,
+            listing_cache=listing_cache,
+            walk_workers=walk_threads,
+            transfer_journal=transfer_journal,
+            compressor=compressor,
+            metrics=metrics
+        )
+
+    try:
+        runner = BatchRunner(jobs, make_engine, workers=limiter.max_limit if limiter else threads,
+                             large_lane_workers=large_lane_workers,
+                             large_lane_threshold=config.large_lane_threshold_mb * 1024 * 1024)
+        runner.plan()
+        log_and_print(f'Planned {len(jobs)} jobs in {runner.planning_time:.2f} seconds')
+        report = runner.run()
+        tracker.note('lanes', report['lanes'])
+    except Exception as e:
+        log_and_print(f'---- Exception occurred during batch process ----')
+        log_and_print(f'Error: {str(e)}')
+        return False
+    finally:
+        tracker.close()
+        for backend, _ in backends.values():
+            backend.close()
+        checksum_cache.close()
+        listing_cache.close()
+        for index in indexes:
+            index.close()
+        if base_index is not None:
+            base_index.close()
+        journal.close()
+        for transfer_journal in transfer_journals:
+            transfer_journal.close()
+
+    for job in invalid_jobs:
+        report['jobs'].append({'name': job.name, 'source': job.source_path, 'destination': job.dest_path,
+                               'copied': 0, 'skipped': 0, 'failed': 0, 'bytes_copied': 0, 'planned_bytes': 0,
+                               'errors': [], 'error': invalid[job.name]})
+    report['jobs'].sort(key=lambda job: job_order.index(job['name']))
+    succeeded = report['failed'] == 0 and not invalid_jobs
+    if compressor is not None:
+        report['compression'] = compressor.stats.report()
+    report['metrics'] = metrics.report()
+    report_path = transfer_log_path(log_path).replace('_transfer.jsonl', '_batch_report.json')
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    log_and_print('---- Batch Process Successful ----' if succeeded else '---- Batch Process Failed ----')
+    for job in report['jobs']:
+        if 'error' in job:
+            log_and_print(f"{job['name']}: Not run: {job['error']}")
+            continue
+        log_and_print(f"{job['name']}: Copied {job['copied']} files ({job['bytes_copied']} bytes), "
+                      f"Skipped: {job['skipped']}, Failed: {job['failed']}")
+        for rel_path, error in job['errors']:
+            log_and_print(f"Failed: {job['name']}/{rel_path}: {error}")
+    log_and_print(f"Total: Copied {report['copied']} files ({report['bytes_copied']} bytes) in "
+                  f"{report['transfer_seconds']:.2f} seconds, Skipped: {report['skipped']}, Failed: {report['failed']}")
+    if compressor is not None:
+        log_and_print(compressor.stats.summary_line())
+    report_lanes(report['lanes'])
+    report_metrics(metrics, metrics_textfile)
+    log_and_print(f'Report saved to {report_path}')
+    return succeeded
         
 def parse_args():
     """Parses command-line arguments for the GUI."""
+    from gooey import GooeyParser
     parser = GooeyParser(description='NOAA Jetstream — Cloud upload for Google Cloud Storage with custom patterns')
 
     # Main Options - Clean Layout
@@ -303,6 +776,16 @@ def parse_args():
     transfer_group.add_argument('--enable-multi', action='store_true', default=True, help='Enable multi-threading for faster transfers')
     transfer_group.add_argument('--recursive-copy', action='store_true', default=True, help='Recursively copy all subfolders and files')
     transfer_group.add_argument('--print-command', action='store_true', help='Show the gsutil command that will be run (no transfer performed)')
+    transfer_group.add_argument('--engine', choices=['gsutil', 'native'], default='gsutil', widget='Dropdown', help='Transfer engine: gsutil rsync or the in-process uploader')
+    transfer_group.add_argument('--adaptive', action='store_true', help='Native engine: tune parallel uploads automatically (Threads is the starting point)')
+    transfer_group.add_argument('--max-threads', dest='max_threads', type=int, default=64, widget='IntegerField', help='Native engine: upper limit for adaptive parallel uploads')
+    transfer_group.add_argument('--bandwidth-cap', dest='bandwidth_cap', type=float, default=0, widget='DecimalField', help='Native engine: maximum upload speed in Mbit/s (0 = no limit)')
+    transfer_group.add_argument('--state-index', action='store_true', help='Native engine: remember uploaded files in the log folder so re-runs skip unchanged files without listing the bucket')
+    transfer_group.add_argument('--full-verify', action='store_true', help='Native engine: also check the remembered files against the bucket')
+    transfer_group.add_argument('--pack-small-files', action='store_true', help='Native engine: pack small files into ~1 GB tar shards with an index (faster for many tiny files)')
+    transfer_group.add_argument('--walk-threads', dest='walk_threads', type=int, default=8, widget='IntegerField', help='Native engine: folders scanned at once (higher helps on network shares, 1 = one at a time)')
+    transfer_group.add_argument('--compress', action='store_true', help='Native engine: gzip text-like files (.txt, .csv, .json, .xml, .log) on upload; readers still get the original file')
+    transfer_group.add_argument('--large-lane-workers', dest='large_lane_workers', type=int, default=None, widget='IntegerField', help='Native engine: workers for large files (config large_lane_threshold_mb, default 64 MB) so they don\'t hold up small ones; 0 = one queue')
 
     # Preflight checks UI removed
 
@@ -322,15 +805,50 @@ def parse_args():
 def parse_args_cli():
     """Parses command-line arguments for CLI mode (no GUI)."""
     parser = argparse.ArgumentParser(description='NOAA Jetstream (CLI mode)')
-    parser.add_argument('--copy-from', dest='copy_from', required=True, help='Local folder to upload')
-    parser.add_argument('--bucket-path', dest='bucket_path', required=True, help='Google Cloud Storage bucket path (gs://bucket/path or bucket/path)')
+    parser.add_argument('--copy-from', dest='copy_from', help='Local folder to upload (required unless --batch is used)')
+    parser.add_argument('--bucket-path', dest='bucket_path', help='Google Cloud Storage bucket path (gs://bucket/path or bucket/path; required unless --batch is used)')
+    parser.add_argument('--batch', dest='batch_file', default=None, help='JSON job file with several copy-from/bucket-path pairs to run together (native engine)')
     parser.add_argument('--log-directory', dest='log_directory', required=True, help='Folder to save transfer logs')
     parser.add_argument('--dry-run', action='store_true', help='Preview transfer without copying files (safe test mode)')
     parser.add_argument('--threads', type=int, default=12, help='Number of parallel threads (1-24)')
     parser.add_argument('--enable-multi', action='store_true', default=True, help='Enable multi-threading for faster transfers')
     parser.add_argument('--recursive-copy', action='store_true', default=True, help='Recursively copy all subfolders and files')
     parser.add_argument('--print-command', action='store_true', help='Show the gsutil command that will be run (no transfer performed)')
-    return parser.parse_args()
+    parser.add_argument('--engine', choices=['gsutil', 'native'], default='gsutil', help='Transfer engine: gsutil rsync or the in-process uploader')
+    parser.add_argument('--adaptive', action='store_true', help='Native engine: tune parallel uploads automatically (--threads is the starting point)')
+    parser.add_argument('--max-threads', dest='max_threads', type=int, default=64, help='Native engine: upper limit for adaptive parallel uploads')
+    parser.add_argument('--bandwidth-cap', dest='bandwidth_cap', type=float, default=0, help='Native engine: maximum upload speed in Mbit/s (0 = no limit)')
+    parser.add_argument('--state-index', action='store_true', help='Native engine: remember uploaded files in the log folder so re-runs skip unchanged files without listing the bucket')
+    parser.add_argument('--full-verify', action='store_true', help='Native engine: also check the remembered files against the bucket')
+    parser.add_argument('--pack-small-files', action='store_true', help='Native engine: pack small files into ~1 GB tar shards with an index (faster for many tiny files)')
+    parser.add_argument('--walk-threads', dest='walk_threads', type=int, default=8, help='Native engine: folders scanned at once (higher helps on network shares, 1 = one at a time)')
+    parser.add_argument('--compress', action='store_true', help='Native engine: gzip text-like files (.txt, .csv, .json, .xml, .log) on upload; readers still get the original file')
+    parser.add_argument('--large-lane-workers', dest='large_lane_workers', type=int, default=None, help='Native engine: workers for large files (config large_lane_threshold_mb, default 64 MB) so they don\'t hold up small ones; 0 = one queue (default from config: 2)')
+    parser.add_argument('--metrics-textfile', dest='metrics_textfile', default=None, help='Native engine: also write phase timings and histograms to this Prometheus textfile (e.g. for node_exporter)')
+    parser.add_argument('--profile', action='store_true', help='Native engine: run under cProfile and save <date>_jetstream_profile.prof in the log directory')
+    parser.add_argument('--load-config', dest='load_config', default=None, help='Load patterns and large-file settings from a JSON configuration file')
+    parser.add_argument('--fake-bucket', dest='fake_bucket', default=None, help='Local folder standing in for the bucket (native engine, offline testing)')
+    parser.add_argument('--plan-out', dest='plan_out', default=None, help='Native engine: write a plan of files to upload/skip/delete to this file instead of transferring')
+    parser.add_argument('--execute-plan', dest='execute_plan', default=None, help='Native engine: apply a plan file written by --plan-out (source and bucket path come from the plan)')
+    parser.add_argument('--plan-shard', dest='plan_shard', default='0/1', help='With --execute-plan: only apply shard INDEX/COUNT of the plan, e.g. 0/4')
+    parser.add_argument('--delete', action='store_true', help='With --plan-out: plan deletion of bucket objects that no longer exist locally')
+    parser.add_argument('--listing-max-age', dest='listing_max_age', type=float, default=0, help='Native engine: minutes a cached bucket listing (per top-level folder) is reused before listing it again (default 0 = always list; objects changed by other tools in that window are not seen)')
+    parser.add_argument('--watch', action='store_true', help='Native engine: after syncing, keep watching the folder and upload new or changed files until Ctrl+C')
+    parser.add_argument('--stable-seconds', dest='stable_seconds', type=float, default=30, help='With --watch: upload a file once it has not changed for this many seconds')
+    parser.add_argument('--wave-seconds', dest='wave_seconds', type=float, default=15, help='With --watch: upload waves start at most this often (seconds)')
+    parser.add_argument('--watch-poll', dest='watch_poll', action='store_true', help='With --watch: poll folders instead of using inotify (needed for network shares written by other machines)')
+    args = parser.parse_args()
+    if not args.batch_file and not args.execute_plan and not (args.copy_from and args.bucket_path):
+        parser.error('--copy-from and --bucket-path are required unless --batch or --execute-plan is used')
+    if args.plan_out and args.execute_plan:
+        parser.error('--plan-out and --execute-plan cannot be used together')
+    if args.watch and (args.batch_file or args.plan_out or args.execute_plan):
+        parser.error('--watch cannot be used with --batch, --plan-out or --execute-plan')
+    try:
+        parse_shard(args.plan_shard)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
 
 def parse_patterns_from_text(text: str) -> List[str]:
     """Parse patterns from textarea input, filtering out empty lines."""
@@ -338,7 +856,7 @@ def parse_patterns_from_text(text: str) -> List[str]:
         return []
     return [line.strip() for line in text.split('\n') if line.strip()]
 
-@Gooey(
+GOOEY_OPTIONS = dict(
     program_name='NOAA Jetstream',
     default_size=(800, 900),
     image_dir='./_icons',
@@ -358,16 +876,28 @@ def parse_patterns_from_text(text: str) -> List[str]:
         }]
     }],
     show_success_modal=True,
-    show_failure_modal=True
+    show_failure_modal=True,
+    progress_regex=GOOEY_PROGRESS_REGEX,
+    progress_expr='percent',
+    hide_progress_msg=True,
+    timing_options={'show_time_remaining': True, 'hide_time_remaining_on_complete': True}
 )
+
 def main_gui():
+    """Start the Gooey GUI; gooey and wx are only loaded here."""
     # If GUI backend is missing, exit with instructions (avoid CLI fallback)
-    if not WX_AVAILABLE:
+    try:
+        import wx  # noqa: F401  Gooey GUI backend
+    except Exception:
         print("Gooey GUI requires wxPython, which is not installed.")
         print("Install it in your environment, then re-run this app.")
         print("Conda:  conda install -c conda-forge wxpython")
         print("Pip:    pip install -U wxPython")
         return
+    from gooey import Gooey
+    Gooey(**GOOEY_OPTIONS)(run_gui)()
+
+def run_gui():
     """Main function to handle the upload process (GUI)."""
     args = parse_args()
     current_datetime = datetime.now().strftime("%m_%d_%Y_%H%M")
@@ -439,6 +969,30 @@ def main_gui():
             recursive=args.recursive_copy
         )
         print(gsutil_command)
+    elif getattr(args, 'engine', 'gsutil') == 'native':
+        do_the_native_copy(
+            source_path=pathvalue1,
+            dest_path=normalized_bucket,
+            log_path=pathvalue3,
+            include_patterns=include_patterns_list,
+            exclude_folders=exclude_folders_list,
+            exclude_patterns=exclude_patterns_list,
+            dry_run=args.dry_run,
+            threads=args.threads,
+            recursive=args.recursive_copy,
+            use_state_index=args.state_index,
+            full_verify=args.full_verify,
+            config=UploadConfig.from_json_file(args.load_config) if args.load_config else None,
+            adaptive=args.adaptive,
+            max_threads=args.max_threads,
+            bandwidth_cap_mbps=args.bandwidth_cap,
+            pack_small_files=args.pack_small_files,
+            walk_threads=args.walk_threads,
+            compress=args.compress,
+            large_lane_workers=args.large_lane_workers
+        )
+        log_and_print('-------------------------------------------------')
+        log_and_print('---- Copy Process Complete ----')
     else:
         do_the_copy(
             source_path=pathvalue1,
@@ -455,6 +1009,14 @@ def main_gui():
         log_and_print('-------------------------------------------------')
         log_and_print('---- Copy Process Complete ----')
 
+def profiled(enabled: bool, log_directory: str, run_name: str):
+    """cProfile the block into the log directory when enabled; otherwise do nothing."""
+    if not enabled:
+        return contextlib.nullcontext()
+    path = os.path.join(log_directory, run_name + "_jetstream_profile.prof")
+    print(f"Profiling to {path}")
+    return Profiler(path)
+
 def cli_main():
     """Non-GUI CLI entrypoint with explicit flags."""
     args = parse_args_cli()
@@ -466,9 +1028,37 @@ def cli_main():
         if len(p) > 3:
             p = p.rstrip('\\/')
         return p
+    pathvalue3 = sanitize_local_path(args.log_directory)
+    if args.batch_file:
+        if not os.path.isdir(pathvalue3):
+            print(f"Error: LOG_DIRECTORY is not a directory: {pathvalue3}")
+            return
+        LOG_FILENAME_PATH = os.path.join(pathvalue3, current_datetime + "_jetstream_transfer.log")
+        logging.basicConfig(filename=LOG_FILENAME_PATH, level=logging.INFO, format='%(asctime)s [%(levelname)s]: %(message)s')
+        with profiled(args.profile, pathvalue3, current_datetime):
+            do_the_batch_copy(sanitize_local_path(args.batch_file), pathvalue3, args.dry_run, args.threads, args.fake_bucket, args.state_index,
+                              progress_in_place=True,
+                              config=UploadConfig.from_json_file(args.load_config) if args.load_config else None,
+                              adaptive=args.adaptive, max_threads=args.max_threads, bandwidth_cap_mbps=args.bandwidth_cap,
+                              listing_max_age_minutes=args.listing_max_age, walk_threads=args.walk_threads,
+                              compress=args.compress, metrics_textfile=args.metrics_textfile,
+                              large_lane_workers=args.large_lane_workers)
+        log_and_print('-------------------------------------------------')
+        log_and_print('---- Batch Process Complete ----')
+        return
+    if args.plan_out or args.watch:
+        args.engine = 'native'
+    if args.execute_plan:
+        try:
+            header, _, totals = read_plan(sanitize_local_path(args.execute_plan))
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read plan {args.execute_plan}: {e}")
+            return
+        args.engine = 'native'
+        args.copy_from, args.bucket_path = header['source'], header['destination']
+        print('\n'.join(format_totals(totals)))
     pathvalue1 = sanitize_local_path(args.copy_from)
     pathvalue2 = BucketPathManager.normalize_bucket_path(args.bucket_path)
-    pathvalue3 = sanitize_local_path(args.log_directory)
     if not os.path.isdir(pathvalue1):
         print(f"Error: COPY_FROM is not a directory: {pathvalue1}")
         return
@@ -488,12 +1078,26 @@ def cli_main():
         cmd = generate_gsutil_command(pathvalue1, pathvalue2, [include_pattern], exclude_folders_list, None, args.dry_run, args.threads, args.enable_multi, args.recursive_copy)
         print(cmd)
         return
-    do_the_copy(pathvalue1, pathvalue2, pathvalue3, None, None, None, args.dry_run, args.threads, args.enable_multi, args.recursive_copy)
+    if args.engine == 'native':
+        with profiled(args.profile, pathvalue3, current_datetime):
+            do_the_native_copy(pathvalue1, pathvalue2, pathvalue3, None, None, None, args.dry_run, args.threads, args.recursive_copy, args.fake_bucket, args.state_index, args.full_verify, progress_in_place=True,
+                               config=UploadConfig.from_json_file(args.load_config) if args.load_config else None,
+                               adaptive=args.adaptive, max_threads=args.max_threads, bandwidth_cap_mbps=args.bandwidth_cap,
+                               pack_small_files=args.pack_small_files, plan_out=args.plan_out,
+                               execute_plan_path=args.execute_plan, plan_shard=args.plan_shard, delete=args.delete,
+                               listing_max_age_minutes=args.listing_max_age, walk_threads=args.walk_threads,
+                               watch=args.watch, stable_seconds=args.stable_seconds, wave_seconds=args.wave_seconds,
+                               watch_polling=args.watch_poll, compress=args.compress, metrics_textfile=args.metrics_textfile,
+                               large_lane_workers=args.large_lane_workers)
+    else:
+        do_the_copy(pathvalue1, pathvalue2, pathvalue3, None, None, None, args.dry_run, args.threads, args.enable_multi, args.recursive_copy, progress_in_place=True)
     log_and_print('-------------------------------------------------')
     log_and_print('---- Copy Process Complete ----')
 
 if __name__ == '__main__':
     if '--cli' in sys.argv:
+        # --cli only selects the mode; the CLI parser doesn't know it
+        sys.argv.remove('--cli')
         cli_main()
     else:
         main_gui()
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""
+Size-aware upload lanes for NOAA Jetstream.
+
+A sync that mixes hundreds of thousands of tiny sidecar files with a few
+30 GB videos does badly on one queue: either every worker ends up streaming
+a video while the small files wait, or the videos wait behind the small
+files. ``LaneScheduler`` keeps two worker pools:
+
+    small   many workers, one request per file; files/sec bound
+    large   a few workers for files of at least ``threshold`` bytes, each
+            uploading in parallel parts (ChunkedUploader); bytes/sec bound
+
+Large files that arrive while their lane is full wait in a backlog instead
+of blocking the small lane. Each lane counts its files, bytes and busy
+worker time, so the report shows how close each lane ran to saturation.
+With ``large_workers`` of 0 everything shares the small lane (one queue).
+"""
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+SMALL, LARGE = 'small', 'large'
+DEFAULT_LARGE_THRESHOLD = 64 * 1024 * 1024
+
+
+class Lane:
+    """A worker pool with its own limit on queued work and its own counters."""
+
+    def __init__(self, name: str, workers: int, max_in_flight: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_in_flight = max(self.workers, max_in_flight)
+        self.files = 0
+        self.bytes = 0
+        self.busy_seconds = 0.0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f'jetstream-upload-{name}')
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def has_room(self) -> bool:
+        return self._in_flight < self.max_in_flight
+
+    def assign(self, nbytes: int):
+        """Count a file (or shard) handed to this lane."""
+        with self._lock:
+            self.files += 1
+            self.bytes += nbytes
+
+    def _timed(self, fn, args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.busy_seconds += time.perf_counter() - start
+                self._in_flight -= 1
+
+    def submit(self, fn, *args) -> Future:
+        """Run ``fn(*args)`` on this lane (same call shape as ``Executor.submit``)."""
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return self._pool.submit(self._timed, fn, args)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+
+    def report(self, elapsed: float) -> dict:
+        elapsed = max(elapsed, 1e-9)
+        return {
+            'workers': self.workers,
+            'files': self.files,
+            'bytes': self.bytes,
+            'files_per_sec': round(self.files / elapsed, 2),
+            'bytes_per_sec': round(self.bytes / elapsed, 1),
+            # Share of the lane's worker time spent uploading; near 1.0 means saturated
+            'utilization': round(min(1.0, self.busy_seconds / (self.workers * elapsed)), 3),
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+class LaneScheduler:
+    """
+    Route uploads to a small-file lane or a large-file lane by size.
+
+    Args:
+        small_workers: Workers in the small-file lane
+        large_workers: Workers in the large-file lane (0 = no separate lane)
+        threshold: Files of at least this many bytes use the large lane
+        small_queue: Uploads queued or running in the small lane before the
+            caller should wait (default ``small_workers``)
+    """
+
+    def __init__(self, small_workers: int, large_workers: int = 2, threshold: int = DEFAULT_LARGE_THRESHOLD,
+                 small_queue: int = 0):
+        self.threshold = threshold
+        self.small = Lane(SMALL, small_workers, small_queue or small_workers)
+        self.split = large_workers > 0 and threshold > 0
+        self.large = Lane(LARGE, large_workers, large_workers * 2) if self.split else self.small
+        self._started = time.monotonic()
+
+    def lane_for(self, size: int) -> Lane:
+        return self.large if self.split and size >= self.threshold else self.small
+
+    @property
+    def lanes(self) -> List[Lane]:
+        return [self.small, self.large] if self.split else [self.small]
+
+    def report(self) -> dict:
+        elapsed = time.monotonic() - self._started
+        return {
+            'threshold_bytes': self.threshold if self.split else None,
+            'elapsed': round(elapsed, 3),
+            'lanes': {lane.name: lane.report(elapsed) for lane in self.lanes},
+        }
+
+    def shutdown(self):
+        for lane in self.lanes:
+            lane.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        return False
+
+
+def format_lane_report(report: dict) -> List[str]:
+    """Human-readable lines for a ``LaneScheduler.report()``."""
+    lines = []
+    for name, lane in report.get('lanes', {}).items():
+        lines.append(f"Lane {name}: {lane['files']} files, {lane['bytes']} bytes, "
+                     f"{lane['files_per_sec']:.1f} files/s, {lane['bytes_per_sec'] / 1e6:.1f} MB/s, "
+                     f"{lane['workers']} workers {lane['utilization'] * 100:.0f}% busy")
+    return lines
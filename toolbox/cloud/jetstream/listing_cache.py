@@ -0,0 +1,213 @@
+"""
+Persisted, incrementally refreshed destination listings for NOAA Jetstream.
+
+Listing a large bucket prefix is the slowest part of planning a sync, and
+most of it rarely changes. ``ListingCache`` keeps object name, size, mtime,
+md5, crc32c and generation for every listed object in a SQLite database in
+the log directory, split by sub-prefix:
+
+- The top ``depth`` levels under the requested prefix are listed with a
+  ``/`` delimiter on every refresh. That is one cheap request per level, and
+  it shows which sub-prefixes exist now.
+- Each sub-prefix below that is listed in full only when its cached listing
+  is older than ``max_age``, or when it is new. Sub-prefixes that disappeared
+  are dropped. ``max_age`` defaults to 0 (always list): a cached listing
+  doesn't see objects other tools changed or deleted since, so reusing one
+  is opt-in, and every listing served partly from the cache ends with a
+  warning naming how many sub-prefixes were reused and how old they were.
+  With ``max_age`` 0 the cache is bypassed and the prefix is listed flat.
+- Uploads and deletes made by Jetstream itself are written through with
+  ``record``/``forget``, so the runs that change a prefix don't make it stale.
+"""
+import os
+import time
+import sqlite3
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from upload_engine import RemoteObject
+
+LISTING_DB_FILENAME = 'jetstream_listings.db'
+
+
+def _range(prefix: str) -> Tuple[str, str]:
+    """Bounds of the names under ``prefix`` (everything for '') for a ``>= AND <`` query."""
+    if not prefix:
+        return '', '\U0010ffff'
+    return prefix + '/', prefix + '0'  # '0' sorts right after '/'
+
+
+class ListingCache:
+    """
+    Cached listing of bucket prefixes, refreshed one sub-prefix at a time.
+
+    Args:
+        db_path: SQLite database file
+        max_age: Seconds a sub-prefix listing stays valid; 0 always lists again
+        depth: Levels of sub-prefixes under the requested prefix that are
+            tracked (and refreshed) separately
+        warn: Called with the warning when cached listings are used (default: logged)
+    """
+
+    def __init__(self, db_path: str, max_age: float = 0, depth: int = 1,
+                 warn: Optional[Callable[[str], None]] = None):
+        self.db_path = db_path
+        self.max_age = max_age
+        self.depth = max(0, depth)
+        self.warn = warn
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS objects (
+                bucket TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime INTEGER,
+                md5 TEXT,
+                crc32c TEXT,
+                generation INTEGER,
+                listed_under TEXT NOT NULL,
+                PRIMARY KEY (bucket, name)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS objects_listed_under ON objects (bucket, listed_under)')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS prefixes (
+                bucket TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                parent TEXT,
+                listed_at REAL NOT NULL,
+                PRIMARY KEY (bucket, prefix)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+        self.requests = 0  # listing calls made, for reporting
+        self._reused: List[float] = []  # ages of the cached listings used by the current list_objects
+
+    @classmethod
+    def for_log_directory(cls, log_directory: str, max_age: float = 0, depth: int = 1,
+                          warn: Optional[Callable[[str], None]] = None) -> 'ListingCache':
+        return cls(os.path.join(log_directory, LISTING_DB_FILENAME), max_age, depth, warn)
+
+    # -- refresh ----------------------------------------------------------------------
+
+    def _store(self, bucket: str, listed_under: str, objects: Iterable[RemoteObject]):
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO objects (bucket, name, size, mtime, md5, crc32c, generation, listed_under) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            ((bucket, o.name, o.size, o.mtime, o.md5, o.crc32c, o.generation, listed_under) for o in objects)
+        )
+
+    def _drop_prefix(self, bucket: str, prefix: str):
+        """Forget a sub-prefix and everything cached beneath it."""
+        low, high = _range(prefix)
+        self.conn.execute('DELETE FROM objects WHERE bucket = ? AND (listed_under = ? OR (listed_under >= ? AND listed_under < ?))',
+                          (bucket, prefix, low, high))
+        self.conn.execute('DELETE FROM prefixes WHERE bucket = ? AND (prefix = ? OR (prefix >= ? AND prefix < ?))',
+                          (bucket, prefix, low, high))
+
+    def _listed_at(self, bucket: str, prefix: str) -> Optional[float]:
+        row = self.conn.execute('SELECT listed_at FROM prefixes WHERE bucket = ? AND prefix = ?', (bucket, prefix)).fetchone()
+        return row[0] if row else None
+
+    def _mark_listed(self, bucket: str, prefix: str, parent: Optional[str]):
+        self.conn.execute('INSERT OR REPLACE INTO prefixes (bucket, prefix, parent, listed_at) VALUES (?, ?, ?, ?)',
+                          (bucket, prefix, parent, time.time()))
+
+    def _refresh_leaf(self, backend, bucket: str, prefix: str, parent: Optional[str], force: bool):
+        listed_at = self._listed_at(bucket, prefix)
+        if not force and listed_at is not None and time.time() - listed_at <= self.max_age:
+            self._reused.append(time.time() - listed_at)
+            return
+        objects = backend.list_objects(prefix)
+        self.requests += 1
+        self.conn.execute('DELETE FROM objects WHERE bucket = ? AND listed_under = ?', (bucket, prefix))
+        self._store(bucket, prefix, objects.values())
+        self._mark_listed(bucket, prefix, parent)
+
+    def _refresh_level(self, backend, bucket: str, prefix: str, parent: Optional[str], depth: int, force: bool):
+        if depth == 0:
+            self._refresh_leaf(backend, bucket, prefix, parent, force)
+            return
+        objects, subprefixes = backend.list_level(prefix)
+        self.requests += 1
+        # Objects directly in this level come with the delimiter listing, so they are always current
+        self.conn.execute('DELETE FROM objects WHERE bucket = ? AND listed_under = ?', (bucket, prefix))
+        self._store(bucket, prefix, objects.values())
+        self._mark_listed(bucket, prefix, parent)
+        cached = {row[0] for row in self.conn.execute(
+            'SELECT prefix FROM prefixes WHERE bucket = ? AND parent = ?', (bucket, prefix))}
+        for gone in cached - set(subprefixes):
+            self._drop_prefix(bucket, gone)
+        for sub in subprefixes:
+            self._refresh_level(backend, bucket, sub, prefix, depth - 1, force)
+
+    def list_objects(self, backend, bucket: str, prefix: str, refresh: bool = False) -> Dict[str, RemoteObject]:
+        """
+        Return every object under ``prefix``, listing only the parts of it that are stale.
+
+        ``refresh`` lists everything again regardless of age. With ``max_age`` 0
+        nothing would ever be read back from the cache, so the prefix is listed
+        in one flat, paginated request instead of level by level.
+        """
+        start = time.time()
+        requests = self.requests
+        self._reused = []
+        if self.max_age <= 0:
+            objects = backend.list_objects(prefix)
+            self.requests += 1
+        else:
+            self._refresh_level(backend, bucket, prefix, None, self.depth, refresh)
+            self.conn.commit()
+            low, high = _range(prefix)
+            rows = self.conn.execute(
+                'SELECT name, size, mtime, md5, crc32c, generation FROM objects WHERE bucket = ? AND name >= ? AND name < ?',
+                (bucket, low, high)
+            )
+            objects = {row[0]: RemoteObject(*row) for row in rows}
+        logging.info("Listing of gs://%s/%s: %d objects, %d listing requests, %.2fs",
+                     bucket, prefix, len(objects), self.requests - requests, time.time() - start)
+        if self._reused:
+            message = (f"{len(self._reused)} folder(s) of gs://{bucket}/{prefix} came from the listing cache "
+                       f"(up to {max(self._reused) / 60:.0f} min old); objects changed or deleted since by other "
+                       "tools are not seen. Use --listing-max-age 0 or Full Verify to list everything.")
+            if self.warn is not None:
+                self.warn(message)
+            else:
+                logging.warning(message)
+        return objects
+
+    # -- write-through -----------------------------------------------------------------
+
+    def _owner(self, bucket: str, name: str) -> Optional[str]:
+        """The deepest cached prefix containing ``name``, if any."""
+        parts = name.split('/')[:-1]
+        for i in range(len(parts), -1, -1):
+            candidate = '/'.join(parts[:i])
+            if self._listed_at(bucket, candidate) is not None:
+                return candidate
+        return None
+
+    def record(self, bucket: str, remote: RemoteObject):
+        """Add or update an object Jetstream just uploaded."""
+        owner = self._owner(bucket, remote.name)
+        if owner is not None:
+            self._store(bucket, owner, [remote])
+
+    def forget(self, bucket: str, names: List[str]):
+        """Remove objects Jetstream just deleted."""
+        self.conn.executemany('DELETE FROM objects WHERE bucket = ? AND name = ?', ((bucket, n) for n in names))
+
+    def invalidate(self, bucket: str, prefix: str):
+        """Make every sub-prefix under ``prefix`` stale so the next listing refreshes it."""
+        low, high = _range(prefix)
+        self.conn.execute('UPDATE prefixes SET listed_at = 0 WHERE bucket = ? AND (prefix = ? OR (prefix >= ? AND prefix < ?))',
+                          (bucket, prefix, low, high))
+        self.conn.commit()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
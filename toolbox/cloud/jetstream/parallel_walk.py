@@ -0,0 +1,97 @@
+"""
+Parallel source walker for NOAA Jetstream.
+
+On network shares (SMB/NFS, USB hubs behind a NAS) every directory listing
+and ``stat`` is a round trip, so a single-threaded walk spends most of its
+time waiting. ``ParallelWalker`` lists directories with ``os.scandir`` on a
+thread pool: each directory is one task, its subdirectories are queued as
+new tasks, and folders excluded by the ``PathFilter`` are pruned before they
+are queued. Files are streamed to the caller in batches of
+``(path, rel_path, size, mtime)`` as directories finish, so planning starts
+before the walk is done. Order is not deterministic.
+"""
+import os
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterator, List, Optional, Tuple
+
+from path_filter import PathFilter
+
+WalkEntry = Tuple[str, str, int, int]  # (path, rel_path, size, mtime)
+
+
+class ParallelWalker:
+    """
+    Walk a folder with several directory listings in flight at once.
+
+    Args:
+        path_filter: Decides which folders are entered and which files are kept
+        workers: Directories listed at the same time
+        batch_size: Files per batch handed to the caller
+    """
+
+    def __init__(self, path_filter: PathFilter, workers: int = 8, batch_size: int = 1000):
+        self.path_filter = path_filter
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+
+    def _scan_dir(self, dirpath: str, rel_dir: Optional[str], recursive: bool
+                  ) -> Tuple[List[WalkEntry], List[Tuple[str, str]]]:
+        """List one directory; returns its accepted files and the subdirectories to walk next."""
+        files: List[WalkEntry] = []
+        subdirs: List[Tuple[str, str]] = []
+        try:
+            entries = list(os.scandir(dirpath))
+        except OSError as e:
+            logging.warning("Could not list %s: %s", dirpath, e)
+            return files, subdirs
+        for entry in entries:
+            if entry.name in self.path_filter.excluded_names:
+                continue
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=True):
+                    if recursive:
+                        subdirs.append((entry.path, rel_path))
+                    continue
+                if not self.path_filter.matches(rel_path):
+                    continue
+                st = entry.stat()
+            except OSError as e:
+                logging.warning("Could not stat %s: %s", entry.path, e)
+                continue
+            files.append((entry.path, rel_path, st.st_size, int(st.st_mtime)))
+        return files, subdirs
+
+    def walk_batches(self, source_path: str, recursive: bool = True) -> Iterator[List[WalkEntry]]:
+        """Yield lists of up to ``batch_size`` accepted files under ``source_path``."""
+        queued = deque([(source_path, None)])
+        pending = set()
+        batch: List[WalkEntry] = []
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='jetstream-walk')
+        try:
+            while queued or pending:
+                # A few listings beyond the worker count keep the pool busy while we hand out batches
+                while queued and len(pending) < self.workers * 2:
+                    dirpath, rel_dir = queued.popleft()
+                    pending.add(pool.submit(self._scan_dir, dirpath, rel_dir, recursive))
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    queued.extend(subdirs)
+                    for entry in files:
+                        batch.append(entry)
+                        if len(batch) >= self.batch_size:
+                            yield batch
+                            batch = []
+            if batch:
+                yield batch
+        finally:
+            # Stops queued listings if the caller gives up early
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def walk(self, source_path: str, recursive: bool = True) -> Iterator[WalkEntry]:
+        """Yield accepted files one by one (still listed in parallel)."""
+        for batch in self.walk_batches(source_path, recursive):
+            yield from batch
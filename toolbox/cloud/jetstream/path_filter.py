@@ -0,0 +1,113 @@
+"""
+Compiled path filter for NOAA Jetstream.
+
+The gsutil path turns every excluded folder into a ``.*{folder}.*`` regex and
+matches one big alternation against each full path, after gsutil has already
+walked the excluded trees. ``PathFilter`` instead checks folder names with a
+set lookup so excluded subtrees are pruned before they are walked, and merges
+the include and exclude regexes into a single precompiled matcher.
+"""
+import os
+import re
+import logging
+from typing import Iterator, List, Optional, Tuple
+
+
+class PathFilter:
+    """
+    Decide which relative paths to upload.
+
+    Args:
+        include_patterns: Regexes a file must match (any of) to be uploaded;
+            empty or None means every file is included
+        exclude_folders: Folder (or file) names to skip wherever they appear
+            as a path component
+        exclude_patterns: Regexes for files to skip
+
+    Regexes are applied with ``re.match`` to the posix path relative to the
+    source folder, as gsutil ``-x`` does. Exclude names are matched exactly
+    against each path component.
+    """
+
+    def __init__(
+        self,
+        include_patterns: List[str] = None,
+        exclude_folders: List[str] = None,
+        exclude_patterns: List[str] = None
+    ):
+        self.include_patterns = list(include_patterns or [])
+        self.exclude_patterns = list(exclude_patterns or [])
+        self.excluded_names = frozenset(exclude_folders or [])
+        self._combined = None
+        self._exclude_re = None
+        self._include_res = []
+        try:
+            self._combined = self._compile_combined(self.include_patterns, self.exclude_patterns)
+        except re.error:
+            # Patterns with numbered backreferences or inline flags can't be merged
+            self._exclude_re = re.compile('|'.join(self.exclude_patterns)) if self.exclude_patterns else None
+            self._include_res = [re.compile(p) for p in self.include_patterns]
+
+    @classmethod
+    def from_config(cls, config) -> 'PathFilter':
+        """Build a filter from an ``UploadConfig``."""
+        return cls(config.default_include_patterns, config.default_exclude_folders, config.default_exclude_patterns)
+
+    @staticmethod
+    def _compile_combined(include_patterns: List[str], exclude_patterns: List[str]):
+        # Excludes come first so a path matching both sides is reported as excluded
+        branches = []
+        if exclude_patterns:
+            branches.append('(?P<x>' + '|'.join(f'(?:{p})' for p in exclude_patterns) + ')')
+        if include_patterns:
+            branches.append('(?P<i>' + '|'.join(f'(?:{p})' for p in include_patterns) + ')')
+        return re.compile('|'.join(branches)) if branches else None
+
+    def matches(self, rel_path: str) -> bool:
+        """Apply only the include/exclude regexes to ``rel_path``."""
+        if self._combined is not None:
+            m = self._combined.match(rel_path)
+            if m is None:
+                return not self.include_patterns
+            return m.lastgroup == 'i'
+        if self._exclude_re is not None and self._exclude_re.match(rel_path):
+            return False
+        if self._include_res and not any(r.match(rel_path) for r in self._include_res):
+            return False
+        return True
+
+    def accepts(self, rel_path: str) -> bool:
+        """True if ``rel_path`` (posix, relative to the source) should be uploaded."""
+        if self.excluded_names and not self.excluded_names.isdisjoint(rel_path.split('/')):
+            return False
+        return self.matches(rel_path)
+
+    def walk(self, source_path: str, recursive: bool = True) -> Iterator[Tuple[str, str, os.stat_result]]:
+        """
+        Yield ``(path, rel_path, stat)`` for every accepted file under ``source_path``.
+
+        Excluded folders are never entered, so their contents cost nothing.
+        """
+        stack: List[Tuple[str, Optional[str]]] = [(source_path, None)]
+        while stack:
+            dirpath, rel_dir = stack.pop()
+            try:
+                entries = list(os.scandir(dirpath))
+            except OSError as e:
+                logging.warning("Could not list %s: %s", dirpath, e)
+                continue
+            for entry in entries:
+                if entry.name in self.excluded_names:
+                    continue
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=True):
+                        if recursive:
+                            stack.append((entry.path, rel_path))
+                        continue
+                    if not self.matches(rel_path):
+                        continue
+                    yield entry.path, rel_path, entry.stat()
+                except OSError as e:
+                    logging.warning("Could not stat %s: %s", entry.path, e)
+                    continue
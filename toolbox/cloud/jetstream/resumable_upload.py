@@ -0,0 +1,249 @@
+"""
+Resumable, chunked uploads of very large files for NOAA Jetstream.
+
+A large file is split into up to 32 parts that upload in parallel as
+temporary objects and are then composed into the final object (a parallel
+composite upload). Every part is sent through a resumable session in
+``chunk_size`` pieces; session URIs and confirmed offsets are persisted in a
+SQLite journal in the log directory, so a restarted run continues each part
+from its last confirmed byte instead of from zero.
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+from upload_engine import SessionExpired
+from checksums import ChecksumMismatch, crc32c_combine, crc32c_extend, encode_crc32c
+
+JOURNAL_FILENAME = 'jetstream_sessions.db'
+# GCS requires resumable chunks (except the last) to be multiples of 256 KiB
+CHUNK_ALIGNMENT = 256 * 1024
+# Largest number of sources a single compose request accepts
+MAX_COMPOSE_PARTS = 32
+
+
+@dataclass
+class PartState:
+    """Journal row for one part of a large file."""
+    object_name: str
+    part_index: int
+    part_name: str
+    offset: int
+    length: int
+    session: Optional[str]
+    bytes_sent: int
+    done: bool
+    crc32c: Optional[int] = 0  # CRC32C of the first bytes_sent bytes; None if unknown
+
+
+def align_up(value: int, alignment: int = CHUNK_ALIGNMENT) -> int:
+    return max(alignment, (value + alignment - 1) // alignment * alignment)
+
+
+class SessionJournal:
+    """
+    SQLite journal of in-flight chunked uploads, keyed by object name.
+
+    Rows for a file are only reused if its size and mtime are unchanged.
+    Safe to share between the worker threads of one run.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS parts (
+                object_name TEXT NOT NULL,
+                part_index INTEGER NOT NULL,
+                part_name TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                file_mtime INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                session TEXT,
+                bytes_sent INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0,
+                crc32c INTEGER DEFAULT 0,
+                updated_at INTEGER,
+                PRIMARY KEY (object_name, part_index)
+            )
+        ''')
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(parts)')]
+        if 'crc32c' not in columns:
+            # Journal from before checksums were tracked; existing rows get NULL (unknown)
+            self.conn.execute('ALTER TABLE parts ADD COLUMN crc32c INTEGER')
+        self.conn.commit()
+
+    @classmethod
+    def for_log_directory(cls, log_directory: str) -> 'SessionJournal':
+        return cls(os.path.join(log_directory, JOURNAL_FILENAME))
+
+    def load(self, object_name: str, size: int, mtime: int) -> List[PartState]:
+        """Return the saved parts for this file version, discarding stale ones."""
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT part_index, part_name, file_size, file_mtime, offset, length, session, bytes_sent, done, crc32c '
+                'FROM parts WHERE object_name = ? ORDER BY part_index', (object_name,)
+            ).fetchall()
+        if rows and any(r[2] != size or r[3] != mtime for r in rows):
+            self.clear(object_name)
+            return []
+        return [PartState(object_name, r[0], r[1], r[4], r[5], r[6], r[7], bool(r[8]), r[9]) for r in rows]
+
+    def save_plan(self, object_name: str, size: int, mtime: int, parts: List[PartState]):
+        with self._lock:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO parts (object_name, part_index, part_name, file_size, file_mtime, offset, length, session, bytes_sent, done, crc32c, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(object_name, p.part_index, p.part_name, size, mtime, p.offset, p.length, p.session, p.bytes_sent, int(p.done), p.crc32c, int(time.time()))
+                 for p in parts]
+            )
+            self.conn.commit()
+
+    def update(self, part: PartState):
+        """Persist a part's session, confirmed offset and running checksum."""
+        with self._lock:
+            self.conn.execute(
+                'UPDATE parts SET session = ?, bytes_sent = ?, done = ?, crc32c = ?, updated_at = ? WHERE object_name = ? AND part_index = ?',
+                (part.session, part.bytes_sent, int(part.done), part.crc32c, int(time.time()), part.object_name, part.part_index)
+            )
+            self.conn.commit()
+
+    def clear(self, object_name: str):
+        with self._lock:
+            self.conn.execute('DELETE FROM parts WHERE object_name = ?', (object_name,))
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class ChunkedUploader:
+    """
+    Upload one large file as parallel resumable parts plus a final compose.
+
+    Each part's CRC32C is extended as its chunks are confirmed and journaled
+    with the offset, so the composed object's checksum can be verified
+    without reading the file again, even across restarts.
+
+    Args:
+        backend: A ``StorageBackend`` with resumable session and compose support
+        journal: Where session URIs and offsets are persisted
+        chunk_size: Bytes sent per resumable request (rounded up to 256 KiB)
+        part_size: Minimum bytes per part; raised so no file needs more than 32 parts
+        parallel_parts: Parts of one file uploaded at the same time
+    """
+
+    def __init__(self, backend, journal: SessionJournal, chunk_size: int = 16 * 1024 * 1024,
+                 part_size: int = 256 * 1024 * 1024, parallel_parts: int = 4):
+        self.backend = backend
+        self.journal = journal
+        self.chunk_size = align_up(chunk_size)
+        self.part_size = align_up(part_size)
+        self.parallel_parts = max(1, parallel_parts)
+
+    def plan_parts(self, object_name: str, size: int) -> List[PartState]:
+        part_size = max(self.part_size, align_up(-(-size // MAX_COMPOSE_PARTS)))
+        parts = []
+        for index, offset in enumerate(range(0, size, part_size)):
+            parts.append(PartState(
+                object_name=object_name,
+                part_index=index,
+                part_name=f"{object_name}.jetstream-part-{index:02d}",
+                offset=offset,
+                length=min(part_size, size - offset),
+                session=None,
+                bytes_sent=0,
+                done=False
+            ))
+        return parts
+
+    def _upload_part(self, local_path: str, part: PartState):
+        try:
+            self._send_part(local_path, part)
+        except SessionExpired:
+            logging.warning("Upload session for %s expired; restarting that part", part.part_name)
+            part.session = None
+            self._send_part(local_path, part)
+
+    def _hash_range(self, f, part: PartState, start: int, end: int, crc: int) -> int:
+        """Extend ``crc`` over bytes ``start``-``end`` of the part (only needed when resuming)."""
+        f.seek(part.offset + start)
+        remaining = end - start
+        while remaining > 0:
+            data = f.read(min(self.chunk_size, remaining))
+            if not data:
+                break
+            crc = crc32c_extend(crc, data)
+            remaining -= len(data)
+        return crc
+
+    def _send_part(self, local_path: str, part: PartState):
+        with open(local_path, 'rb') as f:
+            if part.session is None:
+                part.session = self.backend.start_resumable(part.part_name, part.length)
+                part.bytes_sent = 0
+                part.crc32c = 0
+                self.journal.update(part)
+            else:
+                # Ask the server how much it has; it may be ahead of the journal
+                confirmed = self.backend.resumable_offset(part.session, part.length)
+                if confirmed >= part.bytes_sent and part.crc32c is not None:
+                    part.crc32c = self._hash_range(f, part, part.bytes_sent, confirmed, part.crc32c)
+                else:
+                    part.crc32c = self._hash_range(f, part, 0, confirmed, 0)
+                part.bytes_sent = confirmed
+            while part.bytes_sent < part.length:
+                f.seek(part.offset + part.bytes_sent)
+                data = f.read(min(self.chunk_size, part.length - part.bytes_sent))
+                confirmed = self.backend.upload_chunk(part.session, data, part.bytes_sent, part.length)
+                accepted = confirmed - part.bytes_sent
+                if 0 <= accepted <= len(data):
+                    part.crc32c = crc32c_extend(part.crc32c, data[:accepted])
+                else:
+                    part.crc32c = self._hash_range(f, part, 0, confirmed, 0)
+                part.bytes_sent = confirmed
+                self.journal.update(part)
+        part.done = True
+        self.journal.update(part)
+
+    def upload(self, local_path: str, object_name: str, size: int, mtime: int):
+        """Upload ``local_path`` to ``object_name``, resuming any journaled progress."""
+        parts = self.journal.load(object_name, size, mtime)
+        if parts:
+            resumed = sum(p.bytes_sent for p in parts)
+            logging.info("Resuming %s: %d of %d bytes already sent", object_name, resumed, size)
+        else:
+            parts = self.plan_parts(object_name, size)
+            self.journal.save_plan(object_name, size, mtime, parts)
+
+        pending = [p for p in parts if not p.done]
+        with ThreadPoolExecutor(max_workers=min(self.parallel_parts, max(1, len(pending)))) as pool:
+            for future in [pool.submit(self._upload_part, local_path, p) for p in pending]:
+                future.result()
+
+        part_names = [p.part_name for p in parts]
+        remote = self.backend.compose(part_names, object_name, mtime)
+        unknown = [p for p in parts if p.crc32c is None]
+        if unknown:
+            with open(local_path, 'rb') as f:
+                for p in unknown:
+                    p.crc32c = self._hash_range(f, p, 0, p.length, 0)
+        crc = parts[0].crc32c
+        for p in parts[1:]:
+            crc = crc32c_combine(crc, p.crc32c, p.length)
+        expected = encode_crc32c(crc)
+        self.backend.delete_objects(part_names)
+        self.journal.clear(object_name)
+        if remote.crc32c is not None and remote.crc32c != expected:
+            self.backend.delete_objects([object_name])
+            raise ChecksumMismatch(f"Checksum mismatch after composing {object_name}")
+        remote.crc32c = remote.crc32c or expected
+        return remote
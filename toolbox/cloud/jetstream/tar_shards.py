@@ -0,0 +1,242 @@
+"""
+Small-file packing for NOAA Jetstream.
+
+Uploading hundreds of thousands of tiny files is dominated by per-object
+request overhead. ``ShardPacker`` packs files below a size threshold into
+~1 GB tar shards as they are walked; each shard is uploaded with a sidecar
+index (``<shard>.index.json``) mapping member name -> data offset, length
+and checksums. ``ShardReader`` uses that index to fetch a single member with
+a ranged read, without downloading the whole shard.
+
+Shards live under ``<prefix>/_jetstream_shards/``. Member names are paths
+relative to ``<prefix>``, the same names the files would have as objects.
+
+Usage (reader):
+    python tar_shards.py list gs://bucket/prefix
+    python tar_shards.py extract gs://bucket/prefix some/file.txt --output-dir out
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import tarfile
+import argparse
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from checksums import HashingReader, crc32c_extend, encode_crc32c
+from upload_engine import LocalFile, RemoteObject, join_object_name, make_backend, split_bucket_path
+
+SHARD_FOLDER = '_jetstream_shards'
+INDEX_SUFFIX = '.index.json'
+TAR_BLOCK = 512
+
+
+@dataclass
+class ShardMember:
+    """Where one packed file's bytes sit inside a shard."""
+    name: str
+    offset: int
+    length: int
+    mtime: int
+    md5: Optional[str] = None
+    crc32c: Optional[str] = None
+
+
+@dataclass
+class Shard:
+    """A finished tar shard waiting to be uploaded; ``rel_path`` is relative to the destination prefix."""
+    path: str
+    rel_path: str
+    members: List[ShardMember] = field(default_factory=list)
+    files: List[LocalFile] = field(default_factory=list)
+
+    @property
+    def index_rel_path(self) -> str:
+        return self.rel_path + INDEX_SUFFIX
+
+    def write_index(self, index_path: str):
+        with open(index_path, 'w') as f:
+            json.dump({'shard': self.rel_path, 'members': [m.__dict__ for m in self.members]}, f)
+
+
+def shard_prefix(prefix: str) -> str:
+    return join_object_name(prefix, SHARD_FOLDER)
+
+
+class ShardPacker:
+    """
+    Pack small files into tar shards of about ``shard_size`` bytes.
+
+    Args:
+        prefix: Destination prefix inside the bucket
+        threshold: Files smaller than this many bytes are packed
+        shard_size: A shard is closed once it reaches this size
+        spool_dir: Where shards are staged before upload (system temp by default)
+    """
+
+    def __init__(self, prefix: str, threshold: int = 256 * 1024, shard_size: int = 1024 ** 3,
+                 spool_dir: Optional[str] = None):
+        self.prefix = prefix
+        self.threshold = threshold
+        self.shard_size = shard_size
+        self.spool_dir = spool_dir
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self._count = 0
+        self._shard: Optional[Shard] = None
+        self._tar: Optional[tarfile.TarFile] = None
+
+    def accepts(self, local: LocalFile) -> bool:
+        return local.size < self.threshold
+
+    def _open(self):
+        self._count += 1
+        fd, path = tempfile.mkstemp(suffix='.tar', prefix='jetstream_shard_', dir=self.spool_dir)
+        os.close(fd)
+        self._shard = Shard(path, f"{SHARD_FOLDER}/{self.run_id}-{self._count:05d}.tar")
+        self._tar = tarfile.open(path, 'w', format=tarfile.PAX_FORMAT)
+
+    def add(self, local: LocalFile) -> Optional[Shard]:
+        """Pack ``local``; returns the shard it filled up, if any."""
+        if self._tar is None:
+            self._open()
+        info = tarfile.TarInfo(local.rel_path)
+        info.size = local.size
+        info.mtime = local.mtime
+        start = self._tar.offset
+        try:
+            with open(local.path, 'rb') as f:
+                reader = HashingReader(f)
+                self._tar.addfile(info, reader)
+        except Exception:
+            # Cut off the half-written member so the shard stays a valid tar
+            self._tar.fileobj.seek(start)
+            self._tar.fileobj.truncate()
+            self._tar.offset = start
+            raise
+        # Data sits right before the padding that ends at the tar's current offset
+        offset = self._tar.offset - -(-local.size // TAR_BLOCK) * TAR_BLOCK
+        self._shard.members.append(ShardMember(local.rel_path, offset, local.size, local.mtime,
+                                               reader.md5_b64, reader.crc32c_b64))
+        self._shard.files.append(local)
+        if self._tar.offset >= self.shard_size:
+            return self.flush()
+        return None
+
+    def remote_objects(self, backend, listing: Dict[str, RemoteObject]) -> Dict[str, RemoteObject]:
+        """Files already packed under this prefix, for comparing against local files."""
+        return packed_remote_objects(backend, self.prefix, listing)
+
+    def flush(self) -> Optional[Shard]:
+        """Close the current shard and return it (None if nothing is packed)."""
+        if self._tar is None:
+            return None
+        self._tar.close()
+        shard = self._shard
+        self._tar = None
+        self._shard = None
+        return shard if shard.members else None
+
+    def discard(self):
+        """Drop a partly filled shard (e.g. after an error)."""
+        shard = self.flush()
+        if shard is not None:
+            os.remove(shard.path)
+
+
+def load_shard_indexes(backend, prefix: str, remote_objects: Optional[Dict[str, RemoteObject]] = None
+                       ) -> Dict[str, Tuple[str, ShardMember]]:
+    """
+    Read every shard index under ``prefix``.
+
+    Returns member name -> (shard object name, member). Shards are read in
+    name order (oldest run first), so a file packed again later wins.
+    """
+    if remote_objects is None:
+        remote_objects = backend.list_objects(shard_prefix(prefix))
+    folder = shard_prefix(prefix) + '/'
+    members = {}
+    for name in sorted(n for n in remote_objects if n.startswith(folder) and n.endswith(INDEX_SUFFIX)):
+        data = json.loads(backend.read_object(name))
+        shard_name = join_object_name(prefix, data['shard'])
+        for entry in data['members']:
+            members[entry['name']] = (shard_name, ShardMember(**entry))
+    return members
+
+
+def packed_remote_objects(backend, prefix: str, remote_objects: Optional[Dict[str, RemoteObject]] = None
+                          ) -> Dict[str, RemoteObject]:
+    """Shard members as ``RemoteObject``s named as if they had been uploaded individually."""
+    return {
+        join_object_name(prefix, name): RemoteObject(join_object_name(prefix, name), member.length, member.mtime,
+                                                     member.md5, member.crc32c)
+        for name, (_, member) in load_shard_indexes(backend, prefix, remote_objects).items()
+    }
+
+
+class ShardReader:
+    """Fetch single files out of the shards under a bucket prefix with ranged reads."""
+
+    def __init__(self, backend, prefix: str):
+        self.backend = backend
+        self.prefix = prefix
+        self.members = load_shard_indexes(backend, prefix)
+
+    def names(self) -> Iterator[str]:
+        return iter(sorted(self.members))
+
+    def read(self, name: str) -> bytes:
+        """Return the bytes of member ``name``, checked against its CRC32C."""
+        if name not in self.members:
+            raise KeyError(f"{name} is not in any shard under {self.prefix}")
+        shard_name, member = self.members[name]
+        data = self.backend.read_object(shard_name, member.offset, member.length)
+        if member.crc32c is not None and encode_crc32c(crc32c_extend(0, data)) != member.crc32c:
+            raise ValueError(f"Checksum mismatch reading {name} from {shard_name}")
+        return data
+
+    def extract(self, name: str, output_dir: str) -> str:
+        """Write member ``name`` under ``output_dir`` (keeping its relative path) and return the path."""
+        data = self.read(name)
+        _, member = self.members[name]
+        target = os.path.join(output_dir, *name.split('/'))
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+        os.utime(target, (member.mtime, member.mtime))
+        return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List or extract files packed into Jetstream tar shards')
+    parser.add_argument('command', choices=['list', 'extract'])
+    parser.add_argument('bucket_path', help='Bucket path the shards were uploaded to (gs://bucket/prefix)')
+    parser.add_argument('names', nargs='*', help='Files to extract (paths relative to the bucket path)')
+    parser.add_argument('--output-dir', default='.', help='Where extracted files are written')
+    parser.add_argument('--fake-bucket', default=None, help='Local folder standing in for the bucket (offline testing)')
+    args = parser.parse_args()
+
+    _, prefix = split_bucket_path(args.bucket_path)
+    backend = make_backend(args.bucket_path, workers=4, fake_bucket_root=args.fake_bucket)
+    try:
+        reader = ShardReader(backend, prefix)
+        if args.command == 'list':
+            for name in reader.names():
+                print(f"{reader.members[name][1].length:>12}  {name}")
+            return 0
+        missing = 0
+        for name in args.names:
+            if name not in reader.members:
+                print(f"Error: {name} not found in any shard under {args.bucket_path}")
+                missing += 1
+                continue
+            print(reader.extract(name, args.output_dir))
+        return 1 if missing else 0
+    finally:
+        backend.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
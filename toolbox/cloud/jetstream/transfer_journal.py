@@ -0,0 +1,193 @@
+"""
+Crash-safe write-ahead transfer journal for NOAA Jetstream.
+
+The change index, checksum cache and listing cache are SQLite databases that
+are committed in batches, so a run that dies (laptop sleep, VPN drop, power)
+loses the record of everything it finished since the last commit, and the
+next run has to compare those files against the bucket again. The journal is
+an append-only file, one per destination, in the log directory:
+
+    {"journal": 1, "dest": "gs://bucket/prefix"}
+    ["I", "site1/img_0001.jpg"]                          upload started
+    ["C", "site1/img_0001.jpg", "/data/site1/img_0001.jpg", 4718592, 1693526400,
+     "<md5>", "<crc32c>", 1693526400123456]              upload finished
+    ["P", "notes/a.txt", "/data/notes/a.txt", 812, 1693526400, "<md5>", "<crc32c>", null]
+                                                        packed into a shard
+
+Records are buffered and flushed with ``fsync`` every ``batch_size`` records
+and at every checkpoint, so a crash loses at most one batch of completions
+(those files are simply uploaded again). On the next start ``replay`` returns
+the completions and the files that were mid-upload; the engine applies the
+completions to its stores and skips those files. A checkpoint commits the
+stores and rewrites the journal with only the uploads still in flight, which
+keeps it small however long a campaign runs.
+"""
+import os
+import json
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+JOURNAL_VERSION = 1
+STARTED, COMPLETED, PACKED = 'I', 'C', 'P'
+
+
+@dataclass
+class JournalCompletion:
+    """A finished upload as recorded in the journal."""
+    rel_path: str
+    path: str
+    size: int
+    mtime: int
+    md5: Optional[str]
+    crc32c: Optional[str]
+    generation: Optional[int]
+    packed: bool = False
+
+
+def journal_path_for(log_directory: str, dest_path: str) -> str:
+    digest = hashlib.sha1(dest_path.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(log_directory, f'jetstream_journal_{digest}.jsonl')
+
+
+def _fsync_directory(path: str):
+    """Make a rename in ``path`` durable (not supported on Windows, where it isn't needed)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class TransferJournal:
+    """
+    Append-only record of upload intent and completion for one destination.
+
+    Args:
+        path: Journal file
+        dest_path: Destination the journal belongs to (checked on open)
+        batch_size: Records buffered between fsyncs
+        checkpoint_every: Records after which the engine should checkpoint
+    """
+
+    def __init__(self, path: str, dest_path: str, batch_size: int = 100, checkpoint_every: int = 10000):
+        self.path = path
+        self.dest_path = dest_path
+        self.batch_size = max(1, batch_size)
+        self.checkpoint_every = checkpoint_every
+        self.in_flight: Set[str] = set()
+        self._buffer: List[str] = []
+        self._records = 0
+        if os.path.exists(path) and self._read_header() != dest_path:
+            raise ValueError(f"{path} is a journal for a different destination")
+        self._file = open(path, 'a', encoding='utf-8')
+        if self._file.tell() == 0:
+            self._file.write(self._header())
+            self._sync()
+
+    @classmethod
+    def for_log_directory(cls, log_directory: str, dest_path: str, **kwargs) -> 'TransferJournal':
+        return cls(journal_path_for(log_directory, dest_path), dest_path, **kwargs)
+
+    def _header(self) -> str:
+        return json.dumps({'journal': JOURNAL_VERSION, 'dest': self.dest_path}) + '\n'
+
+    def _read_header(self) -> Optional[str]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            line = f.readline()
+        try:
+            return json.loads(line).get('dest')
+        except (ValueError, AttributeError):
+            return None
+
+    def replay(self) -> Tuple[List[JournalCompletion], Set[str]]:
+        """
+        Read back what the journal recorded.
+
+        Returns the completed uploads (latest per file) and the files that
+        were started but never completed. A torn last line from a crash is
+        ignored.
+        """
+        self.flush()
+        completed: Dict[str, JournalCompletion] = {}
+        started: Set[str] = set()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            next(f, None)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logging.warning("Ignoring damaged record in %s", self.path)
+                    continue
+                op, rel_path = record[0], record[1]
+                if op == STARTED:
+                    started.add(rel_path)
+                elif op in (COMPLETED, PACKED):
+                    completed[rel_path] = JournalCompletion(*record[1:8], packed=op == PACKED)
+                    started.discard(rel_path)
+        return list(completed.values()), started
+
+    def _append(self, record: list):
+        self._buffer.append(json.dumps(record, separators=(',', ':')) + '\n')
+        self._records += 1
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def started(self, rel_path: str):
+        self.in_flight.add(rel_path)
+        self._append([STARTED, rel_path])
+
+    def completed(self, rel_path: str, path: str, size: int, mtime: int, md5: Optional[str],
+                  crc32c: Optional[str], generation: Optional[int], packed: bool = False):
+        self.in_flight.discard(rel_path)
+        self._append([PACKED if packed else COMPLETED, rel_path, path, size, mtime, md5, crc32c, generation])
+
+    def failed(self, rel_path: str):
+        """A failed upload needs no record; it is just no longer in flight."""
+        self.in_flight.discard(rel_path)
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def flush(self):
+        """Write buffered records and fsync them (a batch boundary)."""
+        if self._buffer:
+            self._file.write(''.join(self._buffer))
+            self._buffer.clear()
+            self._sync()
+
+    @property
+    def needs_checkpoint(self) -> bool:
+        return self._records >= self.checkpoint_every
+
+    def checkpoint(self):
+        """
+        Rewrite the journal with only the uploads still in flight.
+
+        Call only after the stores that completions are replayed into
+        (change index, checksum and listing caches) have been committed.
+        """
+        self._buffer.clear()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self._header())
+            for rel_path in sorted(self.in_flight):
+                f.write(json.dumps([STARTED, rel_path], separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        _fsync_directory(os.path.dirname(os.path.abspath(self.path)))
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._records = 0
+
+    def close(self):
+        self.flush()
+        self._file.close()
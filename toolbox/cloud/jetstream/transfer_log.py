@@ -0,0 +1,294 @@
+"""
+Streaming transfer events for NOAA Jetstream.
+
+Turns gsutil output (read line by line as it arrives) and native engine
+results into per-file events, keeps live throughput/ETA counters, writes a
+rotating JSON-lines transfer log and prints a throttled progress line.
+"""
+import re
+import sys
+import json
+import time
+import logging
+import logging.handlers
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+
+PROGRESS_PREFIX = 'Progress:'
+# Regex Gooey uses to drive its progress bar from the progress line
+GOOEY_PROGRESS_REGEX = r'^Progress: (?P<percent>\d+)%'
+
+_UNITS = {'B': 1, 'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3, 'TiB': 1024 ** 4,
+          'KB': 1000, 'MB': 1000 ** 2, 'GB': 1000 ** 3, 'TB': 1000 ** 4}
+_COPYING_RE = re.compile(r'^Copying file://(?P<path>.+?)(?: \[Content-Type=[^\]]*\])?\.\.\.$')
+_WOULD_COPY_RE = re.compile(r'^Would copy file://(?P<path>.+) to gs://')
+_SKIPPING_RE = re.compile(r'^Skipping (?:.*?file://(?P<path>.+)|.*)$')
+_PROGRESS_RE = re.compile(
+    r'\[(?P<files>\d+)(?:/(?P<files_total>\d+))? files\]'
+    r'\[\s*(?P<done>[\d.]+ ?[KMGT]?i?B)/\s*(?P<total>[\d.]+ ?[KMGT]?i?B)\]'
+)
+_COMPLETED_RE = re.compile(r'Operation completed over (?P<files>\d+) objects/(?P<size>[\d.]+ ?[KMGT]?i?B)')
+# gsutil's closing count of failures, which is not a failure of its own
+_FAILED_TOTAL_RE = re.compile(r'^CommandException: (?P<count>\d+) files?/objects? could not be transferred')
+_ERROR_RE = re.compile(r'^(?:CommandException|ERROR|\S*(?:Exception|Error)\b)')
+
+
+def parse_size(text: str) -> int:
+    """Convert a gsutil size such as ``'1.5 GiB'`` to bytes."""
+    m = re.match(r'^([\d.]+) ?([KMGT]?i?B)$', text.strip())
+    if not m:
+        return 0
+    return int(float(m.group(1)) * _UNITS.get(m.group(2), 1))
+
+
+def format_size(num_bytes: float) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TiB"
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+@dataclass
+class TransferEvent:
+    """One thing that happened during a transfer."""
+    event: str  # started, copied, would_copy, skipped, failed, failed_total, progress, completed
+    path: Optional[str] = None
+    bytes: int = 0
+    message: Optional[str] = None
+    time: float = field(default_factory=time.time)
+
+
+def parse_gsutil_line(line: str) -> Optional[TransferEvent]:
+    """Parse one line of gsutil rsync output; None if it isn't a known event."""
+    line = line.strip()
+    if not line:
+        return None
+    m = _COPYING_RE.match(line)
+    if m:
+        return TransferEvent('started', m.group('path'))
+    m = _WOULD_COPY_RE.match(line)
+    if m:
+        return TransferEvent('would_copy', m.group('path'))
+    m = _COMPLETED_RE.search(line)
+    if m:
+        return TransferEvent('completed', bytes=parse_size(m.group('size')), message=m.group('files'))
+    m = _PROGRESS_RE.search(line)
+    if m:
+        return TransferEvent('progress', bytes=parse_size(m.group('done')), message=line)
+    m = _SKIPPING_RE.match(line)
+    if m:
+        return TransferEvent('skipped', m.group('path'), message=line)
+    m = _FAILED_TOTAL_RE.match(line)
+    if m:
+        return TransferEvent('failed_total', message=m.group('count'))
+    if _ERROR_RE.match(line):
+        return TransferEvent('failed', message=line)
+    return None
+
+
+class TransferTracker:
+    """
+    Collects transfer events into live counters, a JSON-lines log and a progress line.
+
+    Args:
+        jsonl_path: Transfer log file; rotated at ``max_bytes`` keeping ``backup_count`` files
+        in_place: Redraw the progress line with ``\\r`` (terminal) instead of
+            printing one line per update (Gooey console, which hides them)
+        interval: Minimum seconds between progress updates
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None, in_place: bool = False, interval: float = 1.0,
+                 max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5):
+        self.in_place = in_place
+        self.interval = interval
+        self.start_time = time.time()
+        self.files_started = 0
+        self.files_copied = 0
+        self.files_skipped = 0
+        self.files_failed = 0
+        self.files_total: Optional[int] = None
+        self.bytes_done = 0
+        self.bytes_total: Optional[int] = None
+        self._last_print = 0.0
+        self._line_open = False  # an in-place progress line is on screen without a newline
+        self._copying: List[str] = []  # gsutil files started but not yet logged as copied
+        self.limiter = None  # AdaptiveConcurrency, shown on the progress line when set
+        self._last_log = 0.0
+        self._logger = None
+        if jsonl_path:
+            self._logger = logging.getLogger(f'jetstream.transfer.{id(self)}')
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            handler = logging.handlers.RotatingFileHandler(jsonl_path, maxBytes=max_bytes, backupCount=backup_count)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._logger.addHandler(handler)
+
+    # -- counters -----------------------------------------------------------------
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.start_time
+
+    @property
+    def rate(self) -> float:
+        """Average bytes/sec since the transfer started."""
+        elapsed = self.elapsed
+        return self.bytes_done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        if not self.bytes_total or self.rate <= 0:
+            return None
+        return max(0.0, (self.bytes_total - self.bytes_done) / self.rate)
+
+    @property
+    def percent(self) -> Optional[int]:
+        if self.bytes_total:
+            return min(100, int(self.bytes_done * 100 / self.bytes_total))
+        if self.files_total:
+            return min(100, int((self.files_copied + self.files_skipped) * 100 / self.files_total))
+        return None
+
+    # -- event intake -------------------------------------------------------------
+
+    def _write(self, record: dict):
+        if self._logger is not None:
+            self._logger.info(json.dumps(record))
+
+    def handle(self, event: TransferEvent):
+        """Update counters for ``event`` and log it."""
+        if event.event == 'progress':
+            m = _PROGRESS_RE.search(event.message or '')
+            if m:
+                self.files_copied = int(m.group('files'))
+                if m.group('files_total'):
+                    self.files_total = int(m.group('files_total'))
+                self.bytes_done = parse_size(m.group('done'))
+                self.bytes_total = parse_size(m.group('total')) or None
+            # gsutil redraws its progress line constantly; log snapshots, not every redraw
+            if time.time() - self._last_log >= 10:
+                self._last_log = time.time()
+                self._write(self.snapshot('progress'))
+            self.print_progress()
+            return
+        if event.event == 'started':
+            self.files_started += 1
+        elif event.event in ('copied', 'would_copy'):
+            self.files_copied += 1
+            self.bytes_done += event.bytes
+        elif event.event == 'skipped':
+            self.files_skipped += 1
+        elif event.event == 'failed':
+            self.files_failed += 1
+        elif event.event == 'failed_total':
+            self.files_failed = max(self.files_failed, int(event.message or 0))
+        elif event.event == 'completed':
+            self.files_copied = max(self.files_copied, int(event.message or 0))
+            self.bytes_done = max(self.bytes_done, event.bytes)
+        self._write(asdict(event))
+        self.print_progress()
+
+    def _finish_copying(self):
+        """Log the gsutil files started so far as copied (counters come from gsutil's progress line)."""
+        for path in self._copying:
+            self._write(asdict(TransferEvent('copied', path)))
+        self._copying = []
+
+    def handle_gsutil_line(self, line: str) -> Optional[TransferEvent]:
+        """
+        Parse and handle one gsutil output line; returns the event, if any.
+
+        gsutil prints no line when a file finishes, so a started file is
+        logged as copied once gsutil moves on: at the next ``Copying`` line,
+        progress line or completion line. A failure line is put down to the
+        file started last.
+        """
+        event = parse_gsutil_line(line)
+        if event is None:
+            return None
+        if event.event == 'failed' and self._copying:
+            event.path = self._copying.pop()
+        elif event.event in ('started', 'progress', 'completed'):
+            self._finish_copying()
+        if event.event == 'started':
+            self._copying.append(event.path)
+        self.handle(event)
+        return event
+
+    def note(self, event: str, data: dict):
+        """Log an extra record (e.g. the lane report) alongside the per-file events."""
+        self._write(dict({'event': event, 'time': time.time()}, **data))
+
+    def record(self, status: str, path: str, size: int = 0, error: Optional[str] = None):
+        """Engine callback: report a per-file result."""
+        self.handle(TransferEvent(status, path, size if status in ('copied', 'would_copy') else 0, error))
+
+    # -- output ---------------------------------------------------------------------
+
+    def snapshot(self, event: str = 'summary') -> dict:
+        return {
+            'event': event,
+            'time': time.time(),
+            'elapsed': round(self.elapsed, 3),
+            'files_started': self.files_started,
+            'files_copied': self.files_copied,
+            'files_skipped': self.files_skipped,
+            'files_failed': self.files_failed,
+            'files_total': self.files_total,
+            'bytes_done': self.bytes_done,
+            'bytes_total': self.bytes_total,
+            'bytes_per_sec': round(self.rate, 1),
+        }
+
+    def progress_text(self) -> str:
+        percent = self.percent
+        files = f"{self.files_copied:,}" + (f"/{self.files_total:,}" if self.files_total else '')
+        text = (f"{PROGRESS_PREFIX} {percent if percent is not None else 0}% | {files} files | "
+                f"{format_size(self.bytes_done)} | {format_size(self.rate)}/s")
+        if self.limiter is not None:
+            text += f" | {self.limiter.limit} streams"
+        if self.files_skipped:
+            text += f" | {self.files_skipped:,} skipped"
+        if self.files_failed:
+            text += f" | {self.files_failed:,} failed"
+        eta = self.eta
+        if eta is not None:
+            text += f" | ETA {format_duration(eta)}"
+        return text
+
+    def print_progress(self, force: bool = False):
+        now = time.time()
+        if not force and now - self._last_print < self.interval:
+            return
+        self._last_print = now
+        if self.in_place:
+            sys.stdout.write('\r' + self.progress_text().ljust(100))
+            sys.stdout.flush()
+            self._line_open = True
+        else:
+            print(self.progress_text(), flush=True)
+
+    def end_line(self):
+        """Finish an in-place progress line so the next message starts on a line of its own."""
+        if self._line_open:
+            sys.stdout.write('\n')
+            sys.stdout.flush()
+            self._line_open = False
+
+    def close(self) -> dict:
+        """Print the final progress line, log the summary and close the log."""
+        self.print_progress(force=True)
+        self.end_line()
+        summary = self.snapshot()
+        self._write(summary)
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                handler.close()
+                self._logger.removeHandler(handler)
+        return summary
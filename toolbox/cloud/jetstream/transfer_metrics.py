@@ -0,0 +1,225 @@
+"""
+Per-phase timings and histograms for NOAA Jetstream transfers.
+
+``TransferMetrics`` collects, for every phase of a native-engine run, the
+seconds spent and how many times it ran:
+
+    list     listing the destination (through the listing cache)
+    walk     scanning the source folder, excluded folders pruned
+    filter   deciding whether each file needs uploading (includes hash)
+    hash     reading local files to compare checksums
+    upload   sending a file, from first byte to confirmed (includes verify)
+    retry    failed attempts plus the backoff before the next one
+    verify   checking the stored object's checksums after an upload
+
+Phases running on worker threads are summed over threads, so with 12
+workers ``upload`` can be about 12 times the elapsed time. Successful
+uploads also feed histograms of per-file latency and size. ``report``
+returns everything as a dict (logged as JSON), and ``write_prometheus``
+writes it in the node_exporter textfile format.
+
+``Profiler`` runs cProfile over the main thread and the worker threads and
+saves one combined ``.prof`` file. For sampling without the overhead, run
+Jetstream under ``py-spy`` instead; worker threads are named
+``jetstream-upload`` and ``jetstream-walk`` so they are easy to tell apart.
+"""
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+PHASES = ('list', 'walk', 'filter', 'hash', 'upload', 'retry', 'verify')
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS = (1024, 16 * 1024, 256 * 1024, 1024 ** 2, 16 * 1024 ** 2, 128 * 1024 ** 2, 1024 ** 3, 16 * 1024 ** 3)
+
+
+class Histogram:
+    """Fixed-bucket histogram (bucket bounds are inclusive upper limits)."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[int]:
+        total, out = 0, []
+        for c in self.counts:
+            total += c
+            out.append(total)
+        return out
+
+    def to_dict(self) -> dict:
+        bounds = [str(b) for b in self.buckets] + ['+Inf']
+        return {'count': self.count, 'sum': round(self.sum, 6), 'buckets': dict(zip(bounds, self.counts))}
+
+
+class TransferMetrics:
+    """Thread-safe phase timers, counters and histograms for one run (or one batch)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.phases: Dict[str, List[float]] = {name: [0.0, 0] for name in PHASES}
+        self.counters: Dict[str, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.sizes = Histogram(SIZE_BUCKETS)
+
+    def add_phase(self, name: str, seconds: float, count: int = 1):
+        with self._lock:
+            totals = self.phases.setdefault(name, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += count
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def timed_iter(self, name: str, iterable: Iterable) -> Iterator:
+        """Yield from ``iterable``, charging only the time spent producing items to ``name``."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_phase(name, time.perf_counter() - start, 0)
+                return
+            self.add_phase(name, time.perf_counter() - start)
+            yield item
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe_upload(self, size: int, seconds: float):
+        with self._lock:
+            self.latency.observe(seconds)
+            self.sizes.observe(size)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                'elapsed_seconds': round(time.time() - self.started, 3),
+                'phases': {name: {'seconds': round(seconds, 6), 'count': count}
+                           for name, (seconds, count) in self.phases.items()},
+                'counters': dict(self.counters),
+                'upload_latency_seconds': self.latency.to_dict(),
+                'upload_size_bytes': self.sizes.to_dict(),
+            }
+
+    def summary_line(self) -> str:
+        with self._lock:
+            parts = [f"{name} {seconds:.2f}s" for name, (seconds, count) in self.phases.items() if count]
+        return "Phase times (summed over threads): " + (', '.join(parts) or 'none')
+
+    def prometheus_text(self, labels: Optional[Dict[str, str]] = None) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        def fmt(extra: Optional[Dict[str, str]] = None) -> str:
+            merged = dict(labels or {}, **(extra or {}))
+            if not merged:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in sorted(merged.items())) + '}'
+
+        report = self.report()
+        lines = [
+            '# HELP jetstream_phase_seconds_total Seconds spent per transfer phase, summed over threads.',
+            '# TYPE jetstream_phase_seconds_total counter',
+        ]
+        lines += [f"jetstream_phase_seconds_total{fmt({'phase': name})} {p['seconds']}" for name, p in report['phases'].items()]
+        lines += ['# HELP jetstream_phase_calls_total Times each transfer phase ran.',
+                  '# TYPE jetstream_phase_calls_total counter']
+        lines += [f"jetstream_phase_calls_total{fmt({'phase': name})} {p['count']}" for name, p in report['phases'].items()]
+        for name, value in sorted(report['counters'].items()):
+            lines += [f'# TYPE jetstream_{name}_total counter', f"jetstream_{name}_total{fmt()} {value}"]
+        lines += ['# HELP jetstream_run_elapsed_seconds Wall-clock seconds of the run.',
+                  '# TYPE jetstream_run_elapsed_seconds gauge',
+                  f"jetstream_run_elapsed_seconds{fmt()} {report['elapsed_seconds']}",
+                  '# HELP jetstream_run_timestamp_seconds When the run finished.',
+                  '# TYPE jetstream_run_timestamp_seconds gauge',
+                  f"jetstream_run_timestamp_seconds{fmt()} {int(time.time())}"]
+        for metric, hist in (('jetstream_upload_latency_seconds', self.latency),
+                             ('jetstream_upload_size_bytes', self.sizes)):
+            lines.append(f'# TYPE {metric} histogram')
+            bounds = [str(b) for b in hist.buckets] + ['+Inf']
+            for bound, total in zip(bounds, hist.cumulative()):
+                lines.append(f"{metric}_bucket{fmt({'le': bound})} {total}")
+            lines.append(f"{metric}_sum{fmt()} {round(hist.sum, 6)}")
+            lines.append(f"{metric}_count{fmt()} {hist.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str, labels: Optional[Dict[str, str]] = None):
+        """Write a node_exporter textfile; replaced atomically so it is never read half-written."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text(labels))
+        os.replace(tmp_path, path)
+
+
+class Profiler:
+    """
+    cProfile the main thread and every thread started while it runs.
+
+    Worker threads get their own profiler (started from a ``threading``
+    profile hook) and all of them are merged into ``path`` on exit. Where
+    only one profiler can be active at a time (Python 3.12+), worker threads
+    are left out; use py-spy for those.
+    """
+
+    def __init__(self, path: str, top: int = 30):
+        self.path = path
+        self.top = top
+        self._main = cProfile.Profile()
+        self._threads: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def _start_thread(self, frame, event, arg):
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return
+        with self._lock:
+            self._threads.append(profile)
+
+    def __enter__(self):
+        self._main.enable()
+        try:
+            threading.setprofile(self._start_thread)
+        except Exception:
+            pass
+        return self
+
+    def __exit__(self, *exc):
+        threading.setprofile(None)
+        self._main.disable()
+        stats = pstats.Stats(self._main)
+        with self._lock:
+            for profile in self._threads:
+                profile.disable()
+                stats.add(profile)
+        stats.dump_stats(self.path)
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats('cumulative').print_stats(self.top)
+        logging.info("Profile saved to %s (%d worker threads)\n%s", self.path, len(self._threads), out.getvalue())
+        return False
@@ -0,0 +1,202 @@
+"""
+Plan/execute split for NOAA Jetstream.
+
+``write_plan`` walks the source, compares it with a (cached) listing of the
+destination and writes a compact plan: a gzipped JSON-lines file with one
+``[action, path, size, mtime]`` row per file to upload (``U``), skip (``S``)
+or delete (``D``), plus byte totals. ``execute_plan`` applies a plan exactly
+as written, optionally only one of N shards of it, so a large transfer can be
+reviewed first and then run from several machines or processes.
+
+Plan layout::
+
+    {"plan_version": 1, "source": ..., "destination": ..., "created": ...}
+    ["U", "site1/img_0001.jpg", 4718592, 1693526400]
+    ["S", "site1/notes.txt", 812, 1693526400]
+    ["D", "old/removed.csv", 2048, null]
+    {"totals": {"upload": {"files": 1, "bytes": 4718592}, ...}}
+"""
+import os
+import gzip
+import json
+import time
+import zlib
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tar_shards import SHARD_FOLDER
+from upload_engine import LocalFile, TransferSummary, UploadEngine, join_object_name
+
+PLAN_VERSION = 1
+UPLOAD, SKIP, DELETE = 'U', 'S', 'D'
+_ACTION_NAMES = {UPLOAD: 'upload', SKIP: 'skip', DELETE: 'delete'}
+DELETE_BATCH = 100
+
+
+def shard_of(path: str, shard_count: int) -> int:
+    """Stable shard number for ``path`` (same on every machine and run)."""
+    return zlib.crc32(path.encode('utf-8')) % shard_count
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """Parse ``'2/4'`` (shard 2 of 4, counting from 0) into ``(2, 4)``."""
+    index, _, count = text.partition('/')
+    index, count = int(index), int(count)
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{text}': expected INDEX/COUNT with 0 <= INDEX < COUNT")
+    return index, count
+
+
+def _empty_totals() -> Dict[str, Dict[str, int]]:
+    return {name: {'files': 0, 'bytes': 0} for name in _ACTION_NAMES.values()}
+
+
+def write_plan(plan_path: str, engine: UploadEngine, source_path: str, dest_path: str,
+               delete: bool = False) -> Dict[str, Dict[str, int]]:
+    """
+    Compare ``source_path`` with the destination and write the plan file.
+
+    With ``delete``, objects under the destination that no longer exist
+    locally are planned for deletion (objects the filters would exclude, and
+    packed shards, are left alone). Returns the totals per action.
+    """
+    remote_objects = engine.list_remote()
+    compare_to = engine.with_packed(remote_objects)
+    totals = _empty_totals()
+    seen = set()
+    tmp_path = plan_path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({
+            'plan_version': PLAN_VERSION,
+            'source': os.path.abspath(source_path),
+            'destination': dest_path,
+            'created': time.time(),
+            'include_patterns': engine.path_filter.include_patterns,
+            'exclude_folders': sorted(engine.path_filter.excluded_names),
+            'exclude_patterns': engine.path_filter.exclude_patterns,
+        }) + '\n')
+
+        def add(action: str, path: str, size: int, mtime: Optional[int]):
+            totals[_ACTION_NAMES[action]]['files'] += 1
+            totals[_ACTION_NAMES[action]]['bytes'] += size
+            f.write(json.dumps([action, path, size, mtime], separators=(',', ':')) + '\n')
+
+        for local in engine.scan(source_path):
+            seen.add(join_object_name(engine.prefix, local.rel_path))
+            add(UPLOAD if engine.needs_upload(local, compare_to) else SKIP, local.rel_path, local.size, local.mtime)
+
+        if delete:
+            base = f"{engine.prefix}/" if engine.prefix else ''
+            for name in sorted(set(remote_objects) - seen):
+                rel_path = name[len(base):]
+                if rel_path.split('/', 1)[0] == SHARD_FOLDER or not engine.path_filter.accepts(rel_path):
+                    continue
+                add(DELETE, rel_path, remote_objects[name].size, remote_objects[name].mtime)
+
+        f.write(json.dumps({'totals': totals}) + '\n')
+    os.replace(tmp_path, plan_path)
+    if engine.index is not None:
+        engine.index.commit()
+    return totals
+
+
+def read_plan(plan_path: str) -> Tuple[dict, Iterator[list], Dict[str, Dict[str, int]]]:
+    """
+    Open a plan file.
+
+    Returns ``(header, rows, totals)``; ``rows`` is a generator that re-reads
+    the file, so even very large plans aren't held in memory.
+    """
+    header = None
+    totals = None
+    with gzip.open(plan_path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if header is None:
+                header = record
+            elif isinstance(record, dict):
+                totals = record.get('totals')
+    if header is None or header.get('plan_version') != PLAN_VERSION:
+        raise ValueError(f"{plan_path} is not a Jetstream plan (version {PLAN_VERSION})")
+    if totals is None:
+        raise ValueError(f"{plan_path} is incomplete (no totals line)")
+
+    def rows():
+        with gzip.open(plan_path, 'rt', encoding='utf-8') as f:
+            next(f)
+            for line in f:
+                if line.startswith('['):
+                    yield json.loads(line)
+
+    return header, rows(), totals
+
+
+def format_totals(totals: Dict[str, Dict[str, int]]) -> List[str]:
+    return [f"{name.capitalize()}: {t['files']:,} files ({t['bytes']:,} bytes)" for name, t in totals.items()]
+
+
+def execute_plan(plan_path: str, engine: UploadEngine, shard_index: int = 0, shard_count: int = 1) -> TransferSummary:
+    """
+    Apply a plan: upload its ``U`` rows and delete its ``D`` rows.
+
+    Only rows in shard ``shard_index`` of ``shard_count`` are applied. A file
+    that changed since planning (size or mtime differ, or it's gone) is
+    reported as failed rather than uploaded, so what runs is what was reviewed.
+    """
+    header, rows, _ = read_plan(plan_path)
+    source = header['source']
+    engine.recover()
+    summary = TransferSummary()
+    deletes: List[str] = []
+
+    def fail(rel_path: str, message: str):
+        summary.failed += 1
+        summary.errors.append((rel_path, message))
+        logging.error("%s: %s", rel_path, message)
+        engine._report('failed', LocalFile(os.path.join(source, *rel_path.split('/')), rel_path, 0, 0), message)
+
+    def uploads() -> Iterator[LocalFile]:
+        for action, rel_path, size, mtime in rows:
+            if shard_count > 1 and shard_of(rel_path, shard_count) != shard_index:
+                continue
+            if action == DELETE:
+                deletes.append(rel_path)
+                continue
+            if action != UPLOAD:
+                continue
+            path = os.path.join(source, *rel_path.split('/'))
+            try:
+                st = os.stat(path)
+            except OSError:
+                fail(rel_path, 'missing since the plan was made')
+                continue
+            if st.st_size != size or int(st.st_mtime) != mtime:
+                fail(rel_path, 'changed since the plan was made')
+                continue
+            local = LocalFile(path, rel_path, size, mtime)
+            if engine.resumed(local):
+                summary.skipped += 1
+                engine._report('skipped', local)
+                continue
+            if engine.dry_run:
+                summary.copied += 1
+                summary.bytes_copied += size
+                engine._report('would_copy', local)
+                continue
+            yield local
+
+    engine.run_files(uploads(), summary)
+    if deletes and not engine.dry_run:
+        names = [join_object_name(engine.prefix, rel_path) for rel_path in deletes]
+        for i in range(0, len(names), DELETE_BATCH):
+            engine.backend.delete_objects(names[i:i + DELETE_BATCH])
+        for rel_path in deletes:
+            if engine.index is not None:
+                engine.index.forget(rel_path)
+        if engine.index is not None:
+            engine.index.commit()
+        if engine.listing_cache is not None:
+            engine.listing_cache.forget(engine.bucket_name, names)
+            engine.listing_cache.commit()
+    summary.deleted = len(deletes)
+    return summary
@@ -0,0 +1,992 @@
+"""
+In-process upload engine for NOAA Jetstream.
+
+Replaces the ``gsutil rsync`` subprocess with a bounded worker pool that
+uploads through a pluggable storage backend. ``GCSBackend`` talks to Google
+Cloud Storage via ``google.cloud.storage``; ``FakeBucketBackend`` stores
+objects in a local folder so transfers can be tested and benchmarked offline.
+"""
+import os
+import json
+import importlib.util
+import shutil
+import time
+import logging
+import uuid
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from path_filter import PathFilter
+from parallel_walk import ParallelWalker
+from lanes import DEFAULT_LARGE_THRESHOLD, LaneScheduler
+from concurrency import ThrottledReader, backoff_delay, is_retryable
+from checksums import ChecksumMismatch, HashingReader, hash_file
+from compression import RAW_CRC32C_METADATA_KEY, RAW_MD5_METADATA_KEY, RAW_SIZE_METADATA_KEY
+from transfer_metrics import TransferMetrics
+from credential_cache import mount_connection_pool, shared_storage_client
+try:
+    # Found but not imported: google-cloud-storage takes a noticeable time to
+    # load, and offline (fake bucket) runs never need it
+    GCS_AVAILABLE = importlib.util.find_spec('google.cloud.storage') is not None
+except Exception:
+    GCS_AVAILABLE = False
+
+# Same metadata key gsutil rsync uses, so both paths agree on file mtimes
+MTIME_METADATA_KEY = 'goog-reserved-file-mtime'
+# Large files waiting for the large-file lane before the walk pauses
+MAX_LARGE_BACKLOG = 10000
+
+
+@dataclass
+class LocalFile:
+    """A local file selected for transfer."""
+    path: str
+    rel_path: str
+    size: int
+    mtime: int
+
+
+@dataclass
+class RemoteObject:
+    """
+    Object properties as reported by a storage backend.
+
+    For gzip-encoded objects uploaded by Jetstream, ``size``, ``md5`` and
+    ``crc32c`` describe the original (uncompressed) file, so they can be
+    compared with the local copy directly.
+    """
+    name: str
+    size: int
+    mtime: Optional[int] = None
+    md5: Optional[str] = None
+    crc32c: Optional[str] = None
+    generation: Optional[int] = None
+    content_encoding: Optional[str] = None
+
+
+@dataclass
+class TransferSummary:
+    """Totals for one engine run."""
+    copied: int = 0
+    skipped: int = 0
+    failed: int = 0
+    deleted: int = 0
+    bytes_copied: int = 0
+    elapsed: float = 0.0
+    errors: List[Tuple[str, str]] = field(default_factory=list)
+    lanes: dict = field(default_factory=dict)  # LaneScheduler.report() of the last run
+
+    @property
+    def ok(self) -> bool:
+        return self.failed == 0
+
+
+def split_bucket_path(dest_path: str) -> Tuple[str, str]:
+    """Split ``gs://bucket/some/prefix`` into ``('bucket', 'some/prefix')``."""
+    if dest_path.startswith('gs://'):
+        dest_path = dest_path[5:]
+    dest_path = dest_path.replace('\\', '/').strip('/')
+    bucket, _, prefix = dest_path.partition('/')
+    return bucket, prefix
+
+
+def join_object_name(prefix: str, rel_path: str) -> str:
+    """Join a bucket prefix and a relative posix path into an object name."""
+    return f"{prefix}/{rel_path}" if prefix else rel_path
+
+
+class SessionExpired(Exception):
+    """A resumable upload session is no longer valid and must be restarted."""
+
+
+class StorageBackend:
+    """
+    Interface every upload destination implements.
+
+    Set ``bandwidth_cap`` to a ``BandwidthCap`` to throttle the bytes sent,
+    and ``metrics`` to a ``TransferMetrics`` to time upload verification.
+    """
+
+    bandwidth_cap = None
+    metrics = None
+
+    def _throttled(self, f):
+        return ThrottledReader(f, self.bandwidth_cap) if self.bandwidth_cap is not None else f
+
+    def _throttle(self, nbytes: int):
+        if self.bandwidth_cap is not None:
+            self.bandwidth_cap.consume(nbytes)
+
+    def list_objects(self, prefix: str) -> Dict[str, RemoteObject]:
+        """Return all objects under ``prefix`` keyed by object name."""
+        raise NotImplementedError
+
+    def list_level(self, prefix: str) -> Tuple[Dict[str, RemoteObject], List[str]]:
+        """
+        List one level under ``prefix`` as with a ``/`` delimiter.
+
+        Returns the objects directly under ``prefix`` and the names of the
+        sub-prefixes (without trailing ``/``) that hold further objects.
+        """
+        base = f"{prefix}/" if prefix else ''
+        objects, subprefixes = {}, set()
+        for name, remote in self.list_objects(prefix).items():
+            head, sep, _ = name[len(base):].partition('/')
+            if sep:
+                subprefixes.add(base + head)
+            else:
+                objects[name] = remote
+        return objects, sorted(subprefixes)
+
+    def upload_file(self, local_path: str, object_name: str, mtime: int) -> RemoteObject:
+        """
+        Upload one file and return the stored object's properties.
+
+        The file is hashed as it is sent and the stored object's ``md5`` and
+        ``crc32c`` are checked against it, so the returned hashes are also
+        the local file's.
+        """
+        raise NotImplementedError
+
+    def upload_compressed(self, compressed, object_name: str, mtime: int) -> RemoteObject:
+        """
+        Upload a ``CompressedFile`` as a gzip-encoded object.
+
+        The stored bytes are verified like ``upload_file``; the returned
+        object describes the original file (see ``RemoteObject``).
+        """
+        raise NotImplementedError
+
+    def start_resumable(self, object_name: str, size: int) -> str:
+        """Open a resumable upload session for ``size`` bytes and return its URI."""
+        raise NotImplementedError
+
+    def resumable_offset(self, session: str, size: int) -> int:
+        """Return how many bytes the server has confirmed for ``session``."""
+        raise NotImplementedError
+
+    def upload_chunk(self, session: str, data: bytes, offset: int, size: int) -> int:
+        """Send ``data`` at ``offset``; return the confirmed byte count afterwards."""
+        raise NotImplementedError
+
+    def compose(self, sources: List[str], object_name: str, mtime: int) -> RemoteObject:
+        """Concatenate ``sources`` into ``object_name``."""
+        raise NotImplementedError
+
+    def delete_objects(self, object_names: List[str]):
+        """Delete objects, ignoring ones that don't exist."""
+        raise NotImplementedError
+
+    def read_object(self, object_name: str, start: int = 0, length: Optional[int] = None) -> bytes:
+        """Download ``length`` bytes from ``start`` (the rest of the object if None)."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release any held connections."""
+
+    def _verify(self, reader: HashingReader, local_path: str, remote: RemoteObject) -> RemoteObject:
+        """Check ``remote`` against the hashes ``reader`` computed while uploading."""
+        start = time.perf_counter()
+        try:
+            return self._check_stored(reader, local_path, remote)
+        finally:
+            if self.metrics is not None:
+                self.metrics.add_phase('verify', time.perf_counter() - start)
+
+    def _check_stored(self, reader: HashingReader, local_path: str, remote: RemoteObject) -> RemoteObject:
+        if reader.complete:
+            md5, crc32c = reader.md5_b64, reader.crc32c_b64
+        else:
+            # The upload seeked around mid-file, so the streamed hashes are partial
+            md5, crc32c = hash_file(local_path)
+        if (remote.md5 is not None and remote.md5 != md5) or (remote.crc32c is not None and remote.crc32c != crc32c):
+            self.delete_objects([remote.name])
+            raise ChecksumMismatch(f"Checksum mismatch after uploading {remote.name}")
+        remote.md5 = remote.md5 or md5
+        remote.crc32c = remote.crc32c or crc32c
+        return remote
+
+
+def _compressed_remote(compressed, object_name: str, mtime: int, generation: Optional[int]) -> RemoteObject:
+    """Describe a gzip-encoded upload by its original size and checksums."""
+    return RemoteObject(
+        name=object_name,
+        size=compressed.raw_size,
+        mtime=mtime,
+        md5=compressed.raw_md5,
+        crc32c=compressed.raw_crc32c,
+        generation=generation,
+        content_encoding='gzip'
+    )
+
+
+class GCSBackend(StorageBackend):
+    """
+    Google Cloud Storage backend sharing one pooled client across workers.
+
+    Without an explicit ``client`` the process-wide client from
+    credential_cache.py is used, so every backend (batch jobs, watch waves)
+    shares its warm connections and cached token. The backend never closes
+    its client: one passed in belongs to the caller (who may share it across
+    backends), and the shared one stays open until ``reset_shared_client``.
+    """
+
+    def __init__(self, bucket_name: str, max_connections: int = 12, client=None):
+        if not GCS_AVAILABLE:
+            raise RuntimeError("google-cloud-storage is not installed. Run: pip install google-cloud-storage")
+        if client is not None:
+            self.client = client
+            mount_connection_pool(self.client, max_connections)
+        else:
+            self.client = shared_storage_client(max_connections)
+        self.bucket = self.client.bucket(bucket_name)
+
+    @staticmethod
+    def _to_remote(blob) -> RemoteObject:
+        metadata = blob.metadata or {}
+        mtime = metadata.get(MTIME_METADATA_KEY)
+        remote = RemoteObject(
+            name=blob.name,
+            size=blob.size or 0,
+            mtime=int(mtime) if mtime is not None else None,
+            md5=blob.md5_hash,
+            crc32c=blob.crc32c,
+            generation=blob.generation,
+            content_encoding=blob.content_encoding
+        )
+        if remote.content_encoding == 'gzip' and RAW_SIZE_METADATA_KEY in metadata:
+            remote.size = int(metadata[RAW_SIZE_METADATA_KEY])
+            remote.md5 = metadata.get(RAW_MD5_METADATA_KEY)
+            remote.crc32c = metadata.get(RAW_CRC32C_METADATA_KEY)
+        return remote
+
+    def list_objects(self, prefix: str) -> Dict[str, RemoteObject]:
+        list_prefix = f"{prefix}/" if prefix else None
+        return {blob.name: self._to_remote(blob)
+                for blob in self.client.list_blobs(self.bucket, prefix=list_prefix)}
+
+    def list_level(self, prefix: str) -> Tuple[Dict[str, RemoteObject], List[str]]:
+        iterator = self.client.list_blobs(self.bucket, prefix=f"{prefix}/" if prefix else None, delimiter='/')
+        objects = {blob.name: self._to_remote(blob) for blob in iterator}
+        # prefixes is only filled in once the pages have been read
+        return objects, sorted(p.rstrip('/') for p in iterator.prefixes)
+
+    def upload_file(self, local_path: str, object_name: str, mtime: int) -> RemoteObject:
+        blob = self.bucket.blob(object_name)
+        blob.metadata = {MTIME_METADATA_KEY: str(mtime)}
+        with open(local_path, 'rb') as f:
+            reader = HashingReader(f)
+            # Hashing happens in our reader, so skip the client library's own checksum pass
+            blob.upload_from_file(self._throttled(reader), size=os.fstat(f.fileno()).st_size, checksum=None)
+        return self._verify(reader, local_path, self._to_remote(blob))
+
+    def upload_compressed(self, compressed, object_name: str, mtime: int) -> RemoteObject:
+        blob = self.bucket.blob(object_name)
+        blob.metadata = {
+            MTIME_METADATA_KEY: str(mtime),
+            RAW_SIZE_METADATA_KEY: str(compressed.raw_size),
+            RAW_MD5_METADATA_KEY: compressed.raw_md5,
+            RAW_CRC32C_METADATA_KEY: compressed.raw_crc32c,
+        }
+        blob.content_encoding = 'gzip'
+        blob.content_type = compressed.content_type
+        with open(compressed.path, 'rb') as f:
+            reader = HashingReader(f)
+            blob.upload_from_file(self._throttled(reader), size=compressed.size,
+                                  content_type=compressed.content_type, checksum=None)
+        # Check the stored gzip bytes, then describe the object by the original file
+        self._verify(reader, compressed.path, RemoteObject(object_name, blob.size or 0, mtime,
+                                                           blob.md5_hash, blob.crc32c, blob.generation))
+        return _compressed_remote(compressed, object_name, mtime, blob.generation)
+
+    def start_resumable(self, object_name: str, size: int) -> str:
+        return self.bucket.blob(object_name).create_resumable_upload_session(size=size)
+
+    @staticmethod
+    def _confirmed_bytes(response, size: int) -> int:
+        if response.status_code in (200, 201):
+            return size
+        if response.status_code == 308:
+            # Range header looks like "bytes=0-1048575"; absent means nothing stored yet
+            confirmed = response.headers.get('Range')
+            return int(confirmed.rsplit('-', 1)[1]) + 1 if confirmed else 0
+        if response.status_code in (404, 410):
+            raise SessionExpired(f"Upload session expired ({response.status_code})")
+        response.raise_for_status()
+        raise RuntimeError(f"Unexpected resumable upload response: {response.status_code}")
+
+    def resumable_offset(self, session: str, size: int) -> int:
+        response = self.client._http.put(session, headers={'Content-Range': f'bytes */{size}'})
+        return self._confirmed_bytes(response, size)
+
+    def upload_chunk(self, session: str, data: bytes, offset: int, size: int) -> int:
+        self._throttle(len(data))
+        end = offset + len(data) - 1
+        response = self.client._http.put(session, data=data, headers={'Content-Range': f'bytes {offset}-{end}/{size}'})
+        return self._confirmed_bytes(response, size)
+
+    def compose(self, sources: List[str], object_name: str, mtime: int) -> RemoteObject:
+        blob = self.bucket.blob(object_name)
+        blob.metadata = {MTIME_METADATA_KEY: str(mtime)}
+        blob.compose([self.bucket.blob(name) for name in sources])
+        return self._to_remote(blob)
+
+    def delete_objects(self, object_names: List[str]):
+        self.bucket.delete_blobs([self.bucket.blob(name) for name in object_names], on_error=lambda blob: None)
+
+    def read_object(self, object_name: str, start: int = 0, length: Optional[int] = None) -> bytes:
+        if length == 0:
+            return b''
+        end = start + length - 1 if length is not None else None  # inclusive, like an HTTP Range
+        return self.bucket.blob(object_name).download_as_bytes(start=start, end=end, checksum=None)
+
+
+class FakeBucketBackend(StorageBackend):
+    """
+    Filesystem-backed stand-in for a bucket.
+
+    Object data lives under ``<root>/<bucket>/`` and object properties under
+    ``<root>/.meta/<bucket>/`` as one JSON file per object. In-progress
+    uploads are staged in ``<root>/.sessions/<bucket>/``.
+    """
+
+    def __init__(self, root: str, bucket_name: str):
+        self.data_dir = os.path.join(root, bucket_name)
+        self.meta_dir = os.path.join(root, '.meta', bucket_name)
+        self.session_dir = os.path.join(root, '.sessions', bucket_name)
+        for path in (self.data_dir, self.meta_dir, self.session_dir):
+            os.makedirs(path, exist_ok=True)
+
+    def _meta_path(self, object_name: str) -> str:
+        return os.path.join(self.meta_dir, *object_name.split('/')) + '.json'
+
+    def list_objects(self, prefix: str) -> Dict[str, RemoteObject]:
+        objects = {}
+        base = os.path.join(self.meta_dir, *prefix.split('/')) if prefix else self.meta_dir
+        for dirpath, _, filenames in os.walk(base):
+            for filename in filenames:
+                with open(os.path.join(dirpath, filename), 'r') as f:
+                    remote = RemoteObject(**json.load(f))
+                objects[remote.name] = remote
+        return objects
+
+    def list_level(self, prefix: str) -> Tuple[Dict[str, RemoteObject], List[str]]:
+        base = os.path.join(self.meta_dir, *prefix.split('/')) if prefix else self.meta_dir
+        objects, subprefixes = {}, []
+        if not os.path.isdir(base):
+            return objects, subprefixes
+        for entry in os.scandir(base):
+            if entry.is_dir():
+                subprefixes.append(join_object_name(prefix, entry.name))
+            else:
+                with open(entry.path, 'r') as f:
+                    remote = RemoteObject(**json.load(f))
+                objects[remote.name] = remote
+        return objects, sorted(subprefixes)
+
+    def _data_path(self, object_name: str) -> str:
+        return os.path.join(self.data_dir, *object_name.split('/'))
+
+    def _store(self, tmp_path: str, object_name: str, mtime: Optional[int], composite: bool = False) -> RemoteObject:
+        data_path = self._data_path(object_name)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        os.replace(tmp_path, data_path)
+        # The "server" hashes what it stored; like GCS, composite objects get no MD5
+        md5, crc32c = hash_file(data_path)
+        remote = RemoteObject(
+            name=object_name,
+            size=os.path.getsize(data_path),
+            mtime=mtime,
+            md5=None if composite else md5,
+            crc32c=crc32c,
+            generation=time.time_ns()
+        )
+        self._write_meta(remote)
+        return remote
+
+    def _write_meta(self, remote: RemoteObject):
+        meta_path = self._meta_path(remote.name)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        with open(meta_path, 'w') as f:
+            json.dump(remote.__dict__, f)
+
+    def _copy_into(self, dst, src):
+        src = self._throttled(src)
+        for chunk in iter(lambda: src.read(1024 * 1024), b''):
+            dst.write(chunk)
+
+    def upload_file(self, local_path: str, object_name: str, mtime: int) -> RemoteObject:
+        tmp_path = os.path.join(self.session_dir, f"{uuid.uuid4().hex}.part")
+        with open(local_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            reader = HashingReader(src)
+            self._copy_into(dst, reader)
+        return self._verify(reader, local_path, self._store(tmp_path, object_name, mtime))
+
+    def upload_compressed(self, compressed, object_name: str, mtime: int) -> RemoteObject:
+        tmp_path = os.path.join(self.session_dir, f"{uuid.uuid4().hex}.part")
+        with open(compressed.path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            reader = HashingReader(src)
+            self._copy_into(dst, reader)
+        stored = self._verify(reader, compressed.path, self._store(tmp_path, object_name, mtime))
+        remote = _compressed_remote(compressed, object_name, mtime, stored.generation)
+        self._write_meta(remote)
+        return remote
+
+    # Resumable sessions are a data file plus a JSON file naming the target object
+    def start_resumable(self, object_name: str, size: int) -> str:
+        session = uuid.uuid4().hex
+        with open(os.path.join(self.session_dir, f"{session}.json"), 'w') as f:
+            json.dump({'object_name': object_name, 'size': size}, f)
+        open(os.path.join(self.session_dir, f"{session}.part"), 'wb').close()
+        return session
+
+    def resumable_offset(self, session: str, size: int) -> int:
+        part_path = os.path.join(self.session_dir, f"{session}.part")
+        if os.path.exists(part_path):
+            return os.path.getsize(part_path)
+        if os.path.exists(os.path.join(self.session_dir, f"{session}.json")):
+            return size  # finalized
+        raise SessionExpired(f"Unknown upload session {session}")
+
+    def upload_chunk(self, session: str, data: bytes, offset: int, size: int) -> int:
+        confirmed = self.resumable_offset(session, size)
+        if offset != confirmed or confirmed >= size:
+            return confirmed
+        self._throttle(len(data))
+        part_path = os.path.join(self.session_dir, f"{session}.part")
+        with open(part_path, 'ab') as f:
+            f.write(data)
+        confirmed += len(data)
+        if confirmed >= size:
+            with open(os.path.join(self.session_dir, f"{session}.json"), 'r') as f:
+                object_name = json.load(f)['object_name']
+            self._store(part_path, object_name, None)
+        return confirmed
+
+    def compose(self, sources: List[str], object_name: str, mtime: int) -> RemoteObject:
+        tmp_path = os.path.join(self.session_dir, f"{uuid.uuid4().hex}.part")
+        with open(tmp_path, 'wb') as dst:
+            for name in sources:
+                with open(self._data_path(name), 'rb') as src:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+        return self._store(tmp_path, object_name, mtime, composite=True)
+
+    def delete_objects(self, object_names: List[str]):
+        for name in object_names:
+            for path in (self._data_path(name), self._meta_path(name)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def read_object(self, object_name: str, start: int = 0, length: Optional[int] = None) -> bytes:
+        with open(self._data_path(object_name), 'rb') as f:
+            f.seek(start)
+            return f.read() if length is None else f.read(length)
+
+
+def make_backend(dest_path: str, workers: int = 12, fake_bucket_root: Optional[str] = None) -> StorageBackend:
+    """Build the backend for ``dest_path``; a fake bucket root selects the offline backend."""
+    bucket_name, _ = split_bucket_path(dest_path)
+    if fake_bucket_root:
+        return FakeBucketBackend(fake_bucket_root, bucket_name)
+    return GCSBackend(bucket_name, max_connections=workers)
+
+
+class UploadEngine:
+    """
+    Sync a local folder to a bucket prefix with a bounded pool of upload workers.
+
+    Patterns are applied by a ``PathFilter``: excluded folder names prune
+    whole subtrees, and include/exclude regexes are matched (``re.match``)
+    against the path relative to the source folder, as with gsutil ``-x``.
+    A file is skipped when the remote object has the same size and mtime.
+
+    With a ``ChangeIndex`` the bucket listing is skipped entirely: files whose
+    size and mtime match the index are treated as unchanged. ``full_verify``
+    lists the bucket anyway and re-uploads files whose remote copy is missing
+    or no longer matches the indexed generation.
+
+    With a ``ChecksumCache`` the MD5/CRC32C computed during each upload are
+    remembered. A remote object with the same size but a different or missing
+    mtime is then skipped if its checksum matches the local file (hashed at
+    most once per file version), and ``full_verify`` also catches remote
+    objects whose checksum no longer matches the cached local hashes.
+
+    Files of at least ``large_file_threshold`` bytes go through
+    ``chunked_uploader`` (parallel resumable parts) when one is given.
+
+    With a ``ShardPacker`` (see tar_shards.py), files below its threshold are
+    packed into tar shards instead of uploaded one object each; members of
+    shards already in the bucket count as remote copies.
+
+    A ``ListingCache`` keeps the destination listing between runs and only
+    re-lists the sub-prefixes that are stale; objects this engine uploads are
+    written through to it, so a run never makes its own listing stale.
+
+    With a ``TransferJournal`` every upload's start and completion is logged
+    to an fsync'ed append-only file. ``recover`` replays a journal left by
+    a run that died into the index and caches, and the files it completed
+    are skipped without comparing them again.
+
+    With a ``Compressor`` (see compression.py), text-like files that shrink
+    enough are uploaded gzip-encoded; chunked uploads and shards never are.
+
+    With ``walk_workers`` above 1 the source is walked by a ``ParallelWalker``
+    (several directory listings in flight), which pays off on network shares.
+
+    Time spent per phase (list, walk, filter, hash, upload, retry, verify)
+    and per-file upload latency and size are collected in ``metrics``, a
+    ``TransferMetrics`` that is also handed to the backend and checksum
+    cache; pass one in to share it between engines.
+
+    With ``large_lane_workers`` above 0, files of at least
+    ``large_lane_threshold`` bytes (and tar shards) upload on a separate lane
+    of that many workers (see lanes.py), so a few huge files never hold up
+    the small ones; per-lane throughput ends up in ``TransferSummary.lanes``.
+
+    Retryable errors (429/5xx, dropped connections) are retried with
+    backoff. With an ``AdaptiveConcurrency`` limiter the pool is sized to its
+    maximum and the limiter decides how many uploads are actually in flight.
+    """
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        dest_path: str,
+        include_patterns: List[str] = None,
+        exclude_folders: List[str] = None,
+        exclude_patterns: List[str] = None,
+        workers: int = 12,
+        dry_run: bool = False,
+        recursive: bool = True,
+        on_result: Optional[Callable[[str, LocalFile, Optional[str]], None]] = None,
+        index=None,
+        full_verify: bool = False,
+        chunked_uploader=None,
+        large_file_threshold: Optional[int] = None,
+        limiter=None,
+        max_retries: int = 5,
+        checksum_cache=None,
+        packer=None,
+        listing_cache=None,
+        walk_workers: int = 1,
+        transfer_journal=None,
+        compressor=None,
+        metrics: Optional[TransferMetrics] = None,
+        large_lane_workers: int = 0,
+        large_lane_threshold: int = DEFAULT_LARGE_THRESHOLD
+    ):
+        self.backend = backend
+        self.bucket_name, self.prefix = split_bucket_path(dest_path)
+        self.path_filter = PathFilter(include_patterns, exclude_folders, exclude_patterns)
+        self.workers = max(1, workers)
+        self.dry_run = dry_run
+        self.recursive = recursive
+        self.on_result = on_result
+        self.index = index
+        self.full_verify = full_verify
+        self.chunked_uploader = chunked_uploader
+        self.large_file_threshold = large_file_threshold
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.checksum_cache = checksum_cache
+        self.packer = packer
+        self.listing_cache = listing_cache
+        self.walk_workers = walk_workers
+        self.transfer_journal = transfer_journal
+        self.compressor = compressor
+        self.large_lane_workers = large_lane_workers
+        self.large_lane_threshold = large_lane_threshold
+        self.metrics = metrics if metrics is not None else TransferMetrics()
+        backend.metrics = self.metrics
+        if checksum_cache is not None:
+            checksum_cache.metrics = self.metrics
+        self._resumed: Dict[str, Tuple[int, int]] = {}
+        self._recovered = False
+
+    def scan(self, source_path: str) -> Iterator[LocalFile]:
+        """Yield the local files selected for transfer."""
+        return self.metrics.timed_iter('walk', self._walk(source_path))
+
+    def _walk(self, source_path: str) -> Iterator[LocalFile]:
+        if self.walk_workers > 1:
+            walker = ParallelWalker(self.path_filter, workers=self.walk_workers)
+            for batch in walker.walk_batches(os.path.abspath(source_path), self.recursive):
+                for path, rel_path, size, mtime in batch:
+                    yield LocalFile(path, rel_path, size, mtime)
+            return
+        for path, rel_path, st in self.path_filter.walk(os.path.abspath(source_path), self.recursive):
+            yield LocalFile(path, rel_path, st.st_size, int(st.st_mtime))
+
+    def needs_upload(self, local: LocalFile, remote_objects: Optional[Dict[str, RemoteObject]]) -> bool:
+        """
+        Decide whether ``local`` differs from its remote copy.
+
+        ``remote_objects`` is None when the run relies on the change index alone.
+        """
+        with self.metrics.phase('filter'):
+            return self._needs_upload(local, remote_objects)
+
+    def _needs_upload(self, local: LocalFile, remote_objects: Optional[Dict[str, RemoteObject]]) -> bool:
+        if self.resumed(local):
+            return False
+        if self.index is not None:
+            entry = self.index.lookup(local.rel_path)
+            indexed = entry is not None and entry.size == local.size and entry.mtime == local.mtime
+            if remote_objects is None:
+                return not indexed
+            remote = remote_objects.get(join_object_name(self.prefix, local.rel_path))
+            if indexed and remote is not None:
+                if remote.size != entry.size or (entry.generation is not None and remote.generation != entry.generation):
+                    return True
+                return self._content_matches(local, remote) is False
+        else:
+            remote = remote_objects.get(join_object_name(self.prefix, local.rel_path))
+        if remote is None:
+            return True
+        if remote.size != local.size:
+            return True
+        if remote.mtime != local.mtime:
+            # Same size but the mtime differs or was never set (e.g. uploaded by
+            # another tool): the content decides, using cached hashes when possible
+            if not self._content_matches(local, remote, compute=True):
+                return True
+        elif self._content_matches(local, remote) is False:
+            return True
+        if self.index is not None:
+            # Already in the bucket from an earlier gsutil or unindexed run
+            self.index.record(local.rel_path, local.size, local.mtime, remote.md5, remote.generation)
+        return False
+
+    def resumed(self, local: LocalFile) -> bool:
+        """True if an interrupted earlier run finished uploading this version of ``local``."""
+        return self._resumed.get(local.rel_path) == (local.size, local.mtime)
+
+    def recover(self) -> Tuple[int, int]:
+        """
+        Replay the transfer journal left by an interrupted run (once per engine).
+
+        Completed uploads are written into the index and caches and skipped
+        from now on. Returns (files completed, files that were mid-upload).
+        """
+        if self.transfer_journal is None or self._recovered:
+            return 0, 0
+        self._recovered = True
+        completed, interrupted = self.transfer_journal.replay()
+        for c in completed:
+            self._resumed[c.rel_path] = (c.size, c.mtime)
+            if self.index is not None:
+                self.index.record(c.rel_path, c.size, c.mtime, c.md5, c.generation)
+            if self.checksum_cache is not None:
+                self.checksum_cache.record(c.path, c.size, c.mtime, c.md5, c.crc32c)
+            if self.listing_cache is not None and not c.packed:
+                self.listing_cache.record(self.bucket_name, RemoteObject(
+                    join_object_name(self.prefix, c.rel_path), c.size, c.mtime, c.md5, c.crc32c, c.generation))
+        if completed or interrupted:
+            logging.info("Transfer journal %s: %d uploads completed and %d interrupted in an earlier run",
+                         self.transfer_journal.path, len(completed), len(interrupted))
+        self.checkpoint()
+        return len(completed), len(interrupted)
+
+    def checkpoint(self):
+        """Commit the index and caches, then shrink the journal to the uploads still in flight."""
+        if self.index is not None:
+            self.index.commit()
+        if self.checksum_cache is not None:
+            self.checksum_cache.commit()
+        if self.listing_cache is not None:
+            self.listing_cache.commit()
+        if self.transfer_journal is not None:
+            self.transfer_journal.checkpoint()
+
+    def maybe_checkpoint(self):
+        if self.transfer_journal is not None and self.transfer_journal.needs_checkpoint:
+            self.checkpoint()
+
+    def _content_matches(self, local: LocalFile, remote: RemoteObject, compute: bool = False) -> Optional[bool]:
+        """Compare local and remote checksums; None when there is no checksum cache or nothing to compare."""
+        if self.checksum_cache is None:
+            return None
+        return self.checksum_cache.matches(local.path, local.size, local.mtime, remote.md5, remote.crc32c, compute)
+
+    def _upload_one(self, local: LocalFile, compress: bool = True) -> RemoteObject:
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                remote = self._send(local, compress)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if self.limiter is not None:
+                    self.limiter.release(error=retryable)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                logging.warning("Retrying %s in %.1fs after: %s", local.rel_path, delay, e)
+                time.sleep(delay)
+                # The failed attempt and the wait both count as retry time
+                self.metrics.add_phase('retry', time.monotonic() - start)
+                self.metrics.count('retries')
+                attempt += 1
+                continue
+            latency = time.monotonic() - start
+            if self.limiter is not None:
+                self.limiter.release(nbytes=local.size, latency=latency)
+            self.metrics.add_phase('upload', latency)
+            self.metrics.observe_upload(local.size, latency)
+            return remote
+
+    def _send(self, local: LocalFile, compress: bool = True) -> RemoteObject:
+        object_name = join_object_name(self.prefix, local.rel_path)
+        if self.chunked_uploader is not None and self.large_file_threshold is not None \
+                and local.size >= self.large_file_threshold:
+            return self.chunked_uploader.upload(local.path, object_name, local.size, local.mtime)
+        if compress and self.compressor is not None:
+            compressed = self.compressor.compress(local.path, local.rel_path, local.size)
+            if compressed is not None:
+                try:
+                    return self.backend.upload_compressed(compressed, object_name, local.mtime)
+                finally:
+                    compressed.remove()
+        return self.backend.upload_file(local.path, object_name, local.mtime)
+
+    def _report(self, status: str, local: LocalFile, error: Optional[str] = None):
+        if self.on_result:
+            self.on_result(status, local, error)
+
+    def load_remote(self) -> Optional[Dict[str, RemoteObject]]:
+        """List the destination, unless the change index makes that unnecessary."""
+        if self.index is not None and not self.full_verify and not self.index.is_empty():
+            return None
+        return self.with_packed(self.list_remote())
+
+    def list_remote(self) -> Dict[str, RemoteObject]:
+        """List the objects under the destination prefix, through the listing cache if there is one."""
+        with self.metrics.phase('list'):
+            if self.listing_cache is not None:
+                # Full Verify is about catching changes made behind our back, so it always lists
+                return self.listing_cache.list_objects(self.backend, self.bucket_name, self.prefix,
+                                                       refresh=self.full_verify)
+            return self.backend.list_objects(self.prefix)
+
+    def with_packed(self, remote_objects: Dict[str, RemoteObject]) -> Dict[str, RemoteObject]:
+        """Add files packed into shards to a listing (as a copy) when packing is on."""
+        if self.packer is None:
+            return remote_objects
+        merged = dict(remote_objects)
+        for name, remote in self.packer.remote_objects(self.backend, remote_objects).items():
+            merged.setdefault(name, remote)
+        return merged
+
+    def plan(self, source_path: str, summary: TransferSummary) -> Iterator[LocalFile]:
+        """
+        Yield the files under ``source_path`` that need uploading.
+
+        Unchanged files are counted as skipped in ``summary``; in a dry run the
+        files that would be uploaded are counted too and nothing is yielded.
+        """
+        self.recover()
+        remote_objects = self.load_remote()
+        for local in self.scan(source_path):
+            if not self.needs_upload(local, remote_objects):
+                summary.skipped += 1
+                self._report('skipped', local)
+                continue
+            if self.dry_run:
+                summary.copied += 1
+                summary.bytes_copied += local.size
+                self._report('would_copy', local)
+                continue
+            yield local
+
+    def submit(self, pool, local: LocalFile):
+        """Start uploading ``local`` on ``pool`` and return its future."""
+        self._report('started', local)
+        if self.transfer_journal is not None:
+            self.transfer_journal.started(local.rel_path)
+        return pool.submit(self._upload_one, local)
+
+    def finish(self, future, local: LocalFile, summary: TransferSummary):
+        """Record the outcome of a completed upload future."""
+        try:
+            remote = future.result()
+            if self.index is not None:
+                self.index.record(local.rel_path, local.size, local.mtime, remote.md5, remote.generation)
+            if self.checksum_cache is not None:
+                self.checksum_cache.record(local.path, local.size, local.mtime, remote.md5, remote.crc32c)
+            if self.listing_cache is not None:
+                self.listing_cache.record(self.bucket_name, remote)
+            if self.transfer_journal is not None:
+                self.transfer_journal.completed(local.rel_path, local.path, local.size, local.mtime,
+                                                remote.md5, remote.crc32c, remote.generation)
+            summary.copied += 1
+            summary.bytes_copied += local.size
+            self._report('copied', local)
+        except Exception as e:
+            if self.transfer_journal is not None:
+                self.transfer_journal.failed(local.rel_path)
+            summary.failed += 1
+            summary.errors.append((local.rel_path, str(e)))
+            logging.error("Upload failed for %s: %s", local.rel_path, e)
+            self._report('failed', local, str(e))
+
+    def submit_shard(self, pool, shard):
+        """Start uploading a packed shard and its index on ``pool`` and return the future."""
+        for local in shard.files:
+            self._report('started', local)
+            if self.transfer_journal is not None:
+                self.transfer_journal.started(local.rel_path)
+        return pool.submit(self._upload_shard, shard)
+
+    def _upload_shard(self, shard) -> List[RemoteObject]:
+        """Upload a shard and then its index; returns both stored objects."""
+        index_path = shard.path + '.index'
+        try:
+            # Shards are read back by byte range, so they are never gzip-encoded
+            remote = self._upload_one(LocalFile(shard.path, shard.rel_path, os.path.getsize(shard.path), int(time.time())),
+                                      compress=False)
+            # The index goes up last, so a shard is only ever seen with its index complete
+            try:
+                shard.write_index(index_path)
+                index_remote = self._upload_one(LocalFile(index_path, shard.index_rel_path,
+                                                          os.path.getsize(index_path), int(time.time())), compress=False)
+            except Exception:
+                # Its files are packed again next run, so a shard without an index would be an orphan
+                try:
+                    self.backend.delete_objects([remote.name])
+                except Exception as e:
+                    logging.error("Could not delete shard %s after its index failed: %s", remote.name, e)
+                raise
+            return [remote, index_remote]
+        finally:
+            for path in (shard.path, index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def finish_shard(self, future, shard, summary: TransferSummary):
+        """Record the outcome of a shard upload for every file packed into it."""
+        try:
+            uploaded = future.result()
+        except Exception as e:
+            logging.error("Upload failed for shard %s: %s", shard.rel_path, e)
+            for local in shard.files:
+                if self.transfer_journal is not None:
+                    self.transfer_journal.failed(local.rel_path)
+                summary.failed += 1
+                summary.errors.append((local.rel_path, f"shard {shard.rel_path}: {e}"))
+                self._report('failed', local, str(e))
+            return
+        if self.listing_cache is not None:
+            for remote in uploaded:
+                self.listing_cache.record(self.bucket_name, remote)
+        for local, member in zip(shard.files, shard.members):
+            if self.index is not None:
+                self.index.record(local.rel_path, local.size, local.mtime, member.md5, None)
+            if self.checksum_cache is not None:
+                self.checksum_cache.record(local.path, local.size, local.mtime, member.md5, member.crc32c)
+            if self.transfer_journal is not None:
+                self.transfer_journal.completed(local.rel_path, local.path, local.size, local.mtime,
+                                                member.md5, member.crc32c, None, packed=True)
+            summary.copied += 1
+            summary.bytes_copied += local.size
+            self._report('copied', local)
+
+    def _pack(self, local: LocalFile, summary: TransferSummary):
+        """Add ``local`` to the current shard; returns the shard once it is full and ready to upload."""
+        try:
+            return self.packer.add(local)
+        except Exception as e:
+            summary.failed += 1
+            summary.errors.append((local.rel_path, str(e)))
+            logging.error("Could not pack %s: %s", local.rel_path, e)
+            self._report('failed', local, str(e))
+            return None
+
+    def run(self, source_path: str) -> TransferSummary:
+        """Upload every new or changed file under ``source_path``."""
+        summary = TransferSummary()
+        return self.run_files(self.plan(source_path, summary), summary)
+
+    def lane_scheduler(self, small_queue: int = 0) -> LaneScheduler:
+        """Worker lanes for a run: small files on the main pool, large ones on their own lane."""
+        pool_size = self.limiter.max_limit if self.limiter is not None else self.workers
+        return LaneScheduler(pool_size, self.large_lane_workers, self.large_lane_threshold,
+                             small_queue=small_queue or pool_size)
+
+    def run_files(self, files: Iterable[LocalFile], summary: Optional[TransferSummary] = None) -> TransferSummary:
+        """Upload ``files`` (already selected, e.g. from a plan) on the worker lanes."""
+        summary = summary or TransferSummary()
+        self.recover()
+        start_time = time.time()
+        # Keep the number of queued futures bounded so huge trees don't pile up in memory
+        pool_size = self.limiter.max_limit if self.limiter is not None else self.workers
+        lanes = self.lane_scheduler(small_queue=pool_size * 4)
+        pending = {}
+        # Large files wait here while their lane is full, so small files keep flowing
+        backlog = deque()
+
+        def collect(done):
+            for future in done:
+                item = pending.pop(future)
+                if isinstance(item, LocalFile):
+                    self.finish(future, item, summary)
+                else:
+                    self.finish_shard(future, item, summary)
+            self.maybe_checkpoint()
+
+        def start(lane, local):
+            lane.assign(local.size)
+            pending[self.submit(lane, local)] = local
+
+        def feed_large():
+            while backlog and lanes.large.has_room():
+                start(lanes.large, backlog.popleft())
+
+        def wait_some():
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+            feed_large()
+
+        def start_shard(shard):
+            lanes.large.assign(os.path.getsize(shard.path))
+            pending[self.submit_shard(lanes.large, shard)] = shard
+
+        def make_room_for_shard():
+            # Packed shards sit on disk until uploaded; only pack while the large lane can take one,
+            # so staged shards stay at about the lane's queue size times shard_size
+            while pending and not lanes.large.has_room():
+                wait_some()
+
+        with lanes:
+            try:
+                for local in files:
+                    if self.packer is not None and self.packer.accepts(local):
+                        make_room_for_shard()
+                        shard = self._pack(local, summary)
+                        if shard is not None:
+                            start_shard(shard)
+                    elif lanes.lane_for(local.size) is lanes.small:
+                        start(lanes.small, local)
+                    else:
+                        backlog.append(local)
+                        feed_large()
+                    while pending and (not lanes.small.has_room() or len(backlog) >= MAX_LARGE_BACKLOG):
+                        wait_some()
+                if self.packer is not None:
+                    make_room_for_shard()
+                    shard = self.packer.flush()
+                    if shard is not None:
+                        start_shard(shard)
+            finally:
+                if self.packer is not None:
+                    self.packer.discard()
+            feed_large()
+            while pending:
+                wait_some()
+
+        summary.lanes = lanes.report()
+        self.checkpoint()
+        summary.elapsed = time.time() - start_time
+        return summary
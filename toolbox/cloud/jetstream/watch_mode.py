@@ -0,0 +1,429 @@
+"""
+Watch mode for NOAA Jetstream: keep uploading a live acquisition folder.
+
+After one normal sync run, the source folder is watched for new or changed
+files instead of being rescanned. On Linux ``InotifyWatcher`` gets change
+events from the kernel (through libc with ctypes, no extra packages). Elsewhere,
+or when inotify can't be used, ``PollingWatcher`` re-lists the folders
+whose modified time changed, and every folder every ``RESCAN_INTERVAL`` seconds to
+catch files edited in place. A file is uploaded once its size and modified
+time have not changed for ``stable_seconds``. Stable files go up in waves
+at most every ``wave_seconds``, so the cost of a cycle depends on how many
+files are new, not on the size of the tree.
+
+The engine's ``PathFilter`` applies as in a normal run: excluded folders are
+never watched and include/exclude patterns are checked for every file.
+"""
+import os
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+import ctypes
+import ctypes.util
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from path_filter import PathFilter
+from upload_engine import LocalFile, TransferSummary, UploadEngine
+
+# inotify(7) event bits
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+_EVENT = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+POLL_INTERVAL = 5.0
+
+# Seconds between full re-listings in polling mode (in-place edits don't change a folder's mtime)
+RESCAN_INTERVAL = 300.0
+
+
+class InotifyWatcher:
+    """
+    Report files created or written under ``root`` using Linux inotify.
+
+    One watch is added per folder (excluded folders are skipped); folders
+    created later are watched as they appear. Raises OSError if inotify is
+    unavailable or the per-user watch limit (fs.inotify.max_user_watches)
+    is reached.
+    """
+
+    def __init__(self, root: str, path_filter: PathFilter, recursive: bool = True):
+        self.root = root
+        self.path_filter = path_filter
+        self.recursive = recursive
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        try:
+            self._add_watch = libc.inotify_add_watch
+            init = libc.inotify_init1
+        except AttributeError:
+            raise OSError(errno.ENOSYS, 'inotify is not available on this platform')
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._dirs: Dict[int, str] = {}
+        try:
+            self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(self, top: str) -> Set[str]:
+        """Watch ``top`` and the folders below it; returns the files already in them."""
+        found = set()
+        stack = [top]
+        while stack:
+            dirpath = stack.pop()
+            wd = self._add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR):
+                    continue  # gone again before we got to it
+                raise OSError(err, f"Could not watch {dirpath}: {os.strerror(err)}")
+            self._dirs[wd] = dirpath
+            try:
+                entries = list(os.scandir(dirpath))
+            except OSError as e:
+                logging.warning("Could not list %s: %s", dirpath, e)
+                continue
+            for entry in entries:
+                if entry.name in self.path_filter.excluded_names:
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=True):
+                        if self.recursive:
+                            stack.append(entry.path)
+                    else:
+                        found.add(entry.path)
+                except OSError:
+                    continue
+        return found
+
+    def changes(self, timeout: float) -> Optional[Set[str]]:
+        """
+        Wait up to ``timeout`` seconds and return the paths of files that changed.
+
+        Returns None if the kernel dropped events (queue overflow); the caller
+        should then fall back to a full sync.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, pos)
+                name = os.fsdecode(data[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b'\0'))
+                pos += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                dirpath = self._dirs.get(wd)
+                if dirpath is None or not name or name in self.path_filter.excluded_names:
+                    continue
+                path = os.path.join(dirpath, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and self.recursive:
+                        # Files can land in a new folder before its watch exists, so list it too
+                        changed |= self._watch_tree(path)
+                    continue
+                changed.add(path)
+        return None if overflow else changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """
+    Report new and changed files under ``root`` by polling.
+
+    Every ``interval`` seconds each known folder is stat'ed, and folders
+    whose modified time changed are listed again. Editing a file that is
+    already there doesn't change its folder's modified time, so every
+    ``rescan_interval`` seconds all folders are listed again. A listing
+    reports files that are new or whose size or modified time differ from
+    the last listing.
+    """
+
+    def __init__(self, root: str, path_filter: PathFilter, recursive: bool = True, interval: float = POLL_INTERVAL,
+                 rescan_interval: float = RESCAN_INTERVAL):
+        self.root = root
+        self.path_filter = path_filter
+        self.recursive = recursive
+        self.interval = interval
+        self.rescan_interval = rescan_interval
+        # folder -> (folder mtime_ns, {file name: (size, mtime_ns)})
+        self._dirs: Dict[str, Tuple[int, Dict[str, Tuple[int, int]]]] = {}
+        self._last_poll = self._last_rescan = time.monotonic()
+        self._scan_tree(root)
+
+    def _scan_dir(self, dirpath: str) -> Tuple[Dict[str, Tuple[int, int]], List[str]]:
+        """Record one folder; returns its files' ``(size, mtime_ns)`` by name and its subfolders."""
+        st = os.stat(dirpath)
+        files, subdirs = {}, []
+        for entry in os.scandir(dirpath):
+            if entry.name in self.path_filter.excluded_names:
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=True):
+                    if self.recursive:
+                        subdirs.append(entry.path)
+                else:
+                    entry_st = entry.stat()
+                    files[entry.name] = (entry_st.st_size, entry_st.st_mtime_ns)
+            except OSError:
+                continue
+        self._dirs[dirpath] = (st.st_mtime_ns, files)
+        return files, subdirs
+
+    def _scan_tree(self, top: str) -> Set[str]:
+        found = set()
+        stack = [top]
+        while stack:
+            dirpath = stack.pop()
+            try:
+                files, subdirs = self._scan_dir(dirpath)
+            except OSError as e:
+                logging.warning("Could not list %s: %s", dirpath, e)
+                continue
+            found.update(os.path.join(dirpath, n) for n in files)
+            stack.extend(subdirs)
+        return found
+
+    def changes(self, timeout: float) -> Optional[Set[str]]:
+        """Wait up to ``timeout`` seconds; returns new or changed files once the poll interval has passed."""
+        wait_for = self.interval - (time.monotonic() - self._last_poll)
+        if wait_for > 0:
+            time.sleep(min(timeout, wait_for))
+            if wait_for > timeout:
+                return set()
+        self._last_poll = time.monotonic()
+        rescan = self._last_poll - self._last_rescan >= self.rescan_interval
+        if rescan:
+            self._last_rescan = self._last_poll
+        changed = set()
+        for dirpath, (mtime_ns, files) in list(self._dirs.items()):
+            try:
+                if not rescan and os.stat(dirpath).st_mtime_ns == mtime_ns:
+                    continue
+                current, subdirs = self._scan_dir(dirpath)
+            except OSError:
+                self._dirs.pop(dirpath, None)  # folder removed
+                continue
+            changed.update(os.path.join(dirpath, n) for n, stat in current.items() if files.get(n) != stat)
+            for sub in subdirs:
+                if sub not in self._dirs:
+                    changed |= self._scan_tree(sub)
+        return changed
+
+    def close(self):
+        self._dirs.clear()
+
+
+def make_watcher(root: str, path_filter: PathFilter, recursive: bool = True, polling: bool = False):
+    """Return an ``InotifyWatcher`` where possible, otherwise a ``PollingWatcher``."""
+    if not polling:
+        try:
+            return InotifyWatcher(root, path_filter, recursive)
+        except OSError as e:
+            logging.warning("inotify unavailable (%s); polling %s every %.0fs instead", e, root, POLL_INTERVAL)
+    return PollingWatcher(root, path_filter, recursive)
+
+
+class StabilityTracker:
+    """Hold changed files until their size and mtime stop changing for ``stable_seconds``."""
+
+    def __init__(self, stable_seconds: float):
+        self.stable_seconds = stable_seconds
+        # path -> (size, mtime_ns, monotonic time the file was last seen changing); size -1 = not stat'ed yet
+        self.pending: Dict[str, Tuple[int, int, float]] = {}
+
+    def touch(self, path: str):
+        """Note that ``path`` changed (again)."""
+        self.pending[path] = (-1, -1, time.monotonic())
+
+    def update(self):
+        """Stat every pending file and restart the clock for those that changed."""
+        now = time.monotonic()
+        for path, (size, mtime_ns, _) in list(self.pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self.pending[path]  # deleted or renamed away before it settled
+                continue
+            if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                self.pending[path] = (st.st_size, st.st_mtime_ns, now)
+
+    def ready(self, limit: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """Return (and forget) up to ``limit`` files as ``(path, size, mtime)`` that are stable."""
+        self.update()
+        now = time.monotonic()
+        stable = []
+        for path, (size, mtime_ns, since) in list(self.pending.items()):
+            if size < 0 or now - since < self.stable_seconds:
+                continue
+            del self.pending[path]
+            stable.append((path, size, mtime_ns // 1_000_000_000))
+            if limit is not None and len(stable) >= limit:
+                break
+        return stable
+
+
+def _add_summary(total: TransferSummary, part: TransferSummary):
+    total.copied += part.copied
+    total.skipped += part.skipped
+    total.failed += part.failed
+    total.deleted += part.deleted
+    total.bytes_copied += part.bytes_copied
+    total.errors.extend(part.errors)
+
+
+def watch_folder(
+    engine: UploadEngine,
+    source_path: str,
+    stable_seconds: float = 30,
+    wave_seconds: float = 15,
+    max_wave: int = 1000,
+    max_attempts: int = 3,
+    polling: bool = False,
+    stop: Optional[threading.Event] = None,
+    on_wave: Optional[Callable[[int, TransferSummary], None]] = None
+) -> TransferSummary:
+    """
+    Sync ``source_path`` once, then keep uploading files as they appear.
+
+    Runs until ``stop`` is set or the user presses Ctrl+C. Stable files are
+    uploaded in waves of at most ``max_wave`` files, no more often than every
+    ``wave_seconds``; ``on_wave`` is called after each wave with its number
+    and totals (wave 0 is the initial sync). A file that fails to upload is
+    tried again in the next waves, up to ``max_attempts`` times in all; after
+    that it is left alone until it changes again. Returns totals for the
+    session.
+
+    Args:
+        engine: Engine to upload with (its filter, index and caches apply)
+        source_path: Folder to watch
+        stable_seconds: How long a file must stay unchanged before upload
+        wave_seconds: Minimum time between upload waves
+        max_wave: Most files uploaded in one wave
+        max_attempts: Uploads tried per file version before giving up on it
+        polling: Poll folder modified times even where inotify is available
+    """
+    root = os.path.abspath(source_path)
+    stop = stop or threading.Event()
+    total = TransferSummary()
+    start_time = time.time()
+    # Start watching before the first sync so nothing written during it is missed
+    watcher = make_watcher(root, engine.path_filter, engine.recursive, polling)
+    tracker = StabilityTracker(stable_seconds)
+    uploaded: Dict[str, Tuple[int, int]] = {}
+    # rel_path -> ((size, mtime) of the version that failed, attempts so far)
+    failures: Dict[str, Tuple[Tuple[int, int], int]] = {}
+    wave = 0
+
+    def sync_all():
+        on_result = engine.on_result
+
+        def record(status: str, local: LocalFile, error: Optional[str] = None):
+            # Files the sync found in the bucket or just uploaded are in sync, so
+            # a later event that doesn't change them (e.g. chmod) is ignored
+            if status in ('copied', 'skipped'):
+                uploaded[local.rel_path] = (local.size, local.mtime)
+            if on_result:
+                on_result(status, local, error)
+
+        engine.on_result = record
+        try:
+            summary = engine.run(root)
+        finally:
+            engine.on_result = on_result
+        _add_summary(total, summary)
+        if on_wave:
+            on_wave(wave, summary)
+
+    try:
+        sync_all()
+        last_wave = time.monotonic()
+        while not stop.is_set():
+            changed = watcher.changes(timeout=1.0)
+            if changed is None:
+                logging.warning("Watch events were lost; running a full sync of %s", root)
+                wave += 1
+                sync_all()
+                continue
+            for path in changed:
+                tracker.touch(path)
+            if not tracker.pending:
+                continue
+            if time.monotonic() - last_wave < wave_seconds:
+                tracker.update()
+                continue
+            files = []
+            for path, size, mtime in tracker.ready(max_wave):
+                rel_path = os.path.relpath(path, root).replace(os.sep, '/')
+                if not engine.path_filter.accepts(rel_path):
+                    continue
+                local = LocalFile(path, rel_path, size, mtime)
+                if uploaded.get(rel_path) == (local.size, local.mtime):
+                    continue  # event without a content change (e.g. chmod)
+                version, attempts = failures.get(rel_path, (None, 0))
+                if version == (local.size, local.mtime) and attempts >= max_attempts:
+                    continue  # given up on this version; a new write starts over
+                files.append(local)
+            if not files:
+                continue
+            last_wave = time.monotonic()
+            wave += 1
+            summary = TransferSummary()
+            if engine.dry_run:
+                for local in files:
+                    summary.copied += 1
+                    summary.bytes_copied += local.size
+                    engine._report('would_copy', local)
+            else:
+                summary = engine.run_files(files, summary)
+            failed = {rel_path for rel_path, _ in summary.errors}
+            for local in files:
+                version = (local.size, local.mtime)
+                if local.rel_path not in failed:
+                    uploaded[local.rel_path] = version
+                    failures.pop(local.rel_path, None)
+                    continue
+                previous, attempts = failures.get(local.rel_path, (None, 0))
+                attempts = attempts + 1 if previous == version else 1
+                failures[local.rel_path] = (version, attempts)
+                if attempts < max_attempts:
+                    tracker.touch(local.path)  # try again next wave
+                else:
+                    logging.warning("Giving up on %s after %d failed uploads; it is retried if it changes",
+                                    local.rel_path, attempts)
+            _add_summary(total, summary)
+            if on_wave:
+                on_wave(wave, summary)
+    except KeyboardInterrupt:
+        logging.info("Watch of %s stopped by user", root)
+    finally:
+        watcher.close()
+    total.elapsed = time.time() - start_time
+    return total